@@ -1,13 +1,16 @@
 import streamlit as st
 from mistralai import Mistral
 import os
-import json
 from dotenv import load_dotenv
-from chat2JSON import llm_to_json, json_to_llm
-from star_calc import Query
-from user_state import user
+from chat2JSON import llm_to_json, json_to_llm_stream
+from query_client import client as query_service
+from compact_results import compact_results
+from fast_intents import stats as fast_path_stats
+from sky_chart import highlights
+from user_info import UserInfo, BORTLE_LIMITING_MAGNITUDE
 from datetime import datetime
 import pytz
+import tracing
 
 # Load API key
 load_dotenv()
@@ -16,6 +19,11 @@ if not api_key:
     st.error("MISTRAL_API_KEY not set in .env")
     st.stop()
 
+# each browser session has its own observer; nothing about the user is global
+if "observer" not in st.session_state:
+    st.session_state.observer = UserInfo()
+observer = st.session_state.observer
+
 with st.sidebar:
     with st.sidebar:
         latitude = st.text_input("Latitude", placeholder="e.g. 35.2828")
@@ -31,9 +39,17 @@ with st.sidebar:
         local_dt_with_tz = local_tz.localize(local_datetime)
         time_utc = local_dt_with_tz.astimezone(pytz.utc).isoformat()
 
+        # light pollution: how faint a star the user can actually see
+        bortle = st.select_slider("Sky darkness (Bortle class)", options=["Any"] + list(BORTLE_LIMITING_MAGNITUDE),
+                                  value="Any", help="1 = pristine dark sky, 9 = inner city")
+        limiting_magnitude = None if bortle == "Any" else BORTLE_LIMITING_MAGNITUDE[bortle]
+
+        show_chart = st.checkbox("Show sky chart", value=True)
+        show_timing = st.checkbox("Show timing breakdown", value=False)
+
     if longitude and latitude:
         try:
-            user.set_info(longitude, latitude, time_utc)
+            observer.set_info(longitude, latitude, time_utc, limiting_magnitude)
         except ValueError:
             st.error("Invalid input. Please enter valid numeric values for latitude and longitude.")
     else:
@@ -52,6 +68,8 @@ if "messages" not in st.session_state:
 for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
+        if msg.get("chart"):
+            st.image(msg["chart"])
 
 # User input
 user_input = st.chat_input("Ask about stars, planets, or constellations...")
@@ -61,37 +79,80 @@ if user_input:
     with st.chat_message("user"):
         st.markdown(user_input)
 
-    # ────────────────────────────────────────────────────────────────
-    # allow multiple intents in one prompt
-    # ────────────────────────────────────────────────────────────────
-    try:
-        data, _ = llm_to_json(user_input)        # expects {"intents":[…]}
-        print("RAW intents JSON:", json.dumps(data, indent=2))
-    except Exception as e:
-        bot_reply = f"❌ API call failed: {e}"
-        st.session_state.messages.append({"role": "assistant", "content": bot_reply})
+    # every stage of the turn is timed into one trace (see tracing.py)
+    with tracing.turn() as trace:
+        # ────────────────────────────────────────────────────────────────
+        # allow multiple intents in one prompt
+        # ────────────────────────────────────────────────────────────────
+        try:
+            with tracing.span('intents') as attrs:
+                data, _ = llm_to_json(user_input)        # expects {"intents":[…]}
+                attrs['intents'] = data.get("intents", [])
+        except Exception as e:
+            bot_reply = f"❌ API call failed: {e}"
+            st.session_state.messages.append({"role": "assistant", "content": bot_reply})
+            with st.chat_message("assistant"):
+                st.markdown(bot_reply)
+            st.stop()
+
+        # Answer each intent object on the query service (concurrently, results in intent order)
+        try:
+            results = query_service.batch(data.get("intents", []), observer)
+        except Exception as e:
+            bot_reply = f"❌ Query service unavailable ({e}). Start it with `python query_service.py`."
+            st.session_state.messages.append({"role": "assistant", "content": bot_reply})
+            with st.chat_message("assistant"):
+                st.markdown(bot_reply)
+            st.stop()
+
+        # Compact the results to fit the token budget before they go into the prompt
+        with tracing.span('compact') as attrs:
+            context, compaction = compact_results(results)
+            attrs.update(compaction)
+        st.session_state.last_compaction = compaction
+
+        # Send the LIST of results back to the LLM and stream the natural-language reply
+        # (the finished reply is appended to the history once, after streaming)
+        # ────────────────────────────────────────────────────────────────
+        # Display assistant message as it is generated
+        # ────────────────────────────────────────────────────────────────
         with st.chat_message("assistant"):
-            st.markdown(bot_reply)
-        st.stop()
-
-    # Build and execute a Query for each intent object
-    results = []
-    for intent in data.get("intents", []):
-        query = Query()
-        query.update_from_json(intent)
-        query_output = query.handle_query()      # may return None
-        if query_output is not None:
-            results.append(query_output)
-
-    # Send the LIST of results back to the LLM for natural-language reply
-    try:
-        bot_reply, _ = json_to_llm(user_input, results)
-    except Exception as e:
-        bot_reply = f"❌ API call failed: {e}"
-
-    # ────────────────────────────────────────────────────────────────
-    # Display assistant message
-    # ────────────────────────────────────────────────────────────────
-    st.session_state.messages.append({"role": "assistant", "content": bot_reply})
-    with st.chat_message("assistant"):
-        st.markdown(bot_reply)
\ No newline at end of file
+            reply_stream = json_to_llm_stream(user_input, context)
+            try:
+                with tracing.span('answer'):
+                    st.write_stream(reply_stream)
+                bot_reply = reply_stream.text
+                st.session_state.last_reply_timing = {
+                    "first_token_seconds": reply_stream.first_token_seconds,
+                    "total_seconds": reply_stream.total_seconds,
+                }
+            except Exception as e:
+                bot_reply = f"❌ API call failed: {e}"
+                st.markdown(bot_reply)
+
+            # where it is: the sky right now, with whatever the message asked about highlighted
+            chart = None
+            if show_chart and longitude and latitude:
+                try:
+                    with tracing.span('chart'):
+                        chart = query_service.chart(observer, **highlights(data.get("intents", [])))
+                    st.image(chart)
+                except Exception:
+                    chart = None  # the answer stands on its own; never fail a turn over the picture
+
+    st.session_state.messages.append({"role": "assistant", "content": bot_reply, "chart": chart})
+    st.session_state.last_trace = trace
+
+# per-turn timing breakdown of the last answer
+if show_timing and st.session_state.get("last_trace") is not None:
+    last = st.session_state.last_trace
+    with st.sidebar:
+        st.caption(f"Last turn: {last.seconds:.2f} s")
+        st.dataframe([{"stage": name, "seconds": round(entry["seconds"], 4), "calls": entry["count"]}
+                      for name, entry in last.breakdown().items()], hide_index=True)
+        for stage, usage in last.usage.items():
+            st.caption(f"{stage}: {usage['prompt_tokens']} prompt + {usage['completion_tokens']} completion tokens")
+        # how often intents were parsed locally instead of by the LLM (this process, since start)
+        fast = fast_path_stats.report()
+        st.caption(f"Intent fast path: {fast['fast_path']} local, {fast['llm_fallback']} LLM "
+                   f"({fast['fast_path_fraction']:.0%} local)")
@@ -0,0 +1,202 @@
+"""
+Apparent places: catalog J2000 positions carried to the true equator and
+equinox of a date.
+
+The catalog stores J2000 RA/Dec. By now precession alone has moved them by about a
+third of a degree, and more for historical or future dates. For every star at once,
+this module applies:
+
+    proper motion   linear, from the catalog's pm_ra / pm_dec (arcsec/yr)
+    precession      IAU 1976 angles
+    nutation        the main terms of IAU 1980 (about 0.5")
+    aberration      annual, from the Sun's longitude (up to 20")
+
+Together that is one 3x3 rotation plus a vector add over the whole catalog. The
+result for each (catalog, UTC day) pair is cached, and the least recently used
+days are evicted, so a query on a warm day costs nothing extra. A day's positions
+are taken at noon UTC; the drift within one day is below 0.2".
+
+The sidereal time used with these coordinates has to be apparent sidereal time:
+GMST plus the equation of the equinoxes (visibility.calculate_lst adds it).
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+
+UNIX_EPOCH_JD = 2440587.5
+J2000_JD = 2451545.0
+J2000_UNIX = (J2000_JD - UNIX_EPOCH_JD) * 86400.0
+ARCSEC = np.pi / (180 * 3600)
+ABERRATION = 20.49552 * ARCSEC  # constant of annual aberration
+DEFAULT_EPOCHS = int(os.getenv("STARGAZER_APPARENT_EPOCHS", "8"))
+
+
+def _seconds(when):
+    return when.timestamp() if isinstance(when, datetime) else float(when)
+
+
+def julian_centuries(seconds):
+    return (np.asarray(seconds, dtype=float) - J2000_UNIX) / (86400.0 * 36525.0)
+
+
+def mean_obliquity(t):
+    """Mean obliquity of the ecliptic (radians) at t Julian centuries from J2000."""
+    return (84381.448 - 46.8150 * t - 0.00059 * t ** 2 + 0.001813 * t ** 3) * ARCSEC
+
+
+def nutation(t):
+    """Nutation in longitude and in obliquity (radians); broadcasts over t."""
+    omega = np.radians(125.04452 - 1934.136261 * t)
+    sun = np.radians(2 * (280.4665 + 36000.7698 * t))
+    moon = np.radians(2 * (218.3165 + 481267.8813 * t))
+    dpsi = -17.20 * np.sin(omega) - 1.32 * np.sin(sun) - 0.23 * np.sin(moon) + 0.21 * np.sin(2 * omega)
+    deps = 9.20 * np.cos(omega) + 0.57 * np.cos(sun) + 0.10 * np.cos(moon) - 0.09 * np.cos(2 * omega)
+    return dpsi * ARCSEC, deps * ARCSEC
+
+
+def equation_of_equinoxes(seconds):
+    """Apparent minus mean sidereal time, in degrees, for unix seconds (scalar or array)."""
+    t = julian_centuries(seconds)
+    dpsi, _ = nutation(t)
+    return np.degrees(dpsi * np.cos(mean_obliquity(t)))
+
+
+def precession_matrix(t):
+    """Rotation from the J2000 mean equator and equinox to the mean equator and equinox of date."""
+    zeta = (2306.2181 * t + 0.30188 * t ** 2 + 0.017998 * t ** 3) * ARCSEC
+    z = (2306.2181 * t + 1.09468 * t ** 2 + 0.018203 * t ** 3) * ARCSEC
+    theta = (2004.3109 * t - 0.42665 * t ** 2 - 0.041833 * t ** 3) * ARCSEC
+    cz, sz, ct, st, cs, ss = np.cos(z), np.sin(z), np.cos(theta), np.sin(theta), np.cos(zeta), np.sin(zeta)
+    return np.array([
+        [cz * ct * cs - sz * ss, -cz * ct * ss - sz * cs, -cz * st],
+        [sz * ct * cs + cz * ss, -sz * ct * ss + cz * cs, -sz * st],
+        [st * cs, -st * ss, ct],
+    ])
+
+
+def nutation_matrix(t):
+    """Rotation from the mean equator and equinox of date to the true ones."""
+    eps = mean_obliquity(t)
+    dpsi, deps = nutation(t)
+    eps_true = eps + deps
+    ce, se, ct, st = np.cos(eps), np.sin(eps), np.cos(eps_true), np.sin(eps_true)
+    cp, sp = np.cos(dpsi), np.sin(dpsi)
+    return np.array([
+        [cp, -sp * ce, -sp * se],
+        [sp * ct, cp * ce * ct + se * st, cp * se * ct - ce * st],
+        [sp * st, cp * ce * st - se * ct, cp * se * st + ce * ct],
+    ])
+
+
+def frame_matrix(seconds):
+    """J2000 mean equatorial -> true equatorial of date (precession, then nutation), at one time."""
+    t = float(julian_centuries(_seconds(seconds)))
+    return nutation_matrix(t) @ precession_matrix(t)
+
+
+def _earth_velocity(t):
+    # Earth's orbital velocity in units of c, true equatorial frame of date (circular orbit)
+    n = t * 36525.0
+    g = np.radians(357.528 + 0.9856003 * n)
+    sun_longitude = np.radians(280.460 + 0.9856474 * n + 1.915 * np.sin(g) + 0.020 * np.sin(2 * g))
+    eps = mean_obliquity(t)
+    return ABERRATION * np.array([np.sin(sun_longitude),
+                                  -np.cos(sun_longitude) * np.cos(eps),
+                                  -np.cos(sun_longitude) * np.sin(eps)])
+
+
+def apparent(ra, dec, pm_ra, pm_dec, seconds):
+    """
+    Apparent RA/Dec (radians) at `seconds` for J2000 RA/Dec (radians) with proper
+    motions in arcsec/yr (pm_ra includes the cos(dec) factor), in one vectorized pass.
+    """
+    seconds = _seconds(seconds)
+    t = float(julian_centuries(seconds))
+    years = t * 100.0
+
+    # proper motion, linear over the years since J2000
+    dec = np.asarray(dec, dtype=float) + np.asarray(pm_dec, dtype=float) * (years * ARCSEC)
+    cos_dec = np.cos(dec)
+    ra = np.asarray(ra, dtype=float) + np.asarray(pm_ra, dtype=float) * (years * ARCSEC) / np.maximum(cos_dec, 1e-9)
+
+    vectors = np.stack([cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)])
+    vectors = frame_matrix(seconds) @ vectors
+    vectors += _earth_velocity(t)[:, None]
+    vectors /= np.linalg.norm(vectors, axis=0)
+
+    apparent_ra = np.arctan2(vectors[1], vectors[0]) % (2 * np.pi)
+    apparent_dec = np.arcsin(np.clip(vectors[2], -1.0, 1.0))
+    return apparent_ra, apparent_dec
+
+
+def mean_place(ra, dec, seconds):
+    """
+    J2000 RA/Dec (radians) of a direction given in the true equator and equinox of
+    `seconds`. Only precession and nutation are undone; aberration (up to 20") and
+    proper motion are left in, so callers matching against catalog positions allow for them.
+    """
+    vector = np.array([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)])
+    x, y, z = frame_matrix(seconds).T @ vector
+    return float(np.arctan2(y, x) % (2 * np.pi)), float(np.arcsin(np.clip(z, -1.0, 1.0)))
+
+
+def epoch_day(when):
+    """UTC day number (days since the unix epoch) that `when` (datetime or unix seconds) falls in."""
+    return int(np.floor(_seconds(when) / 86400.0))
+
+
+class ApparentPlaceCache:
+    """Apparent RA/Dec of a whole compiled catalog per UTC day, least recently used days evicted."""
+
+    def __init__(self, max_epochs=DEFAULT_EPOCHS):
+        self.max_epochs = max_epochs
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, compiled, when):
+        key = (compiled.source_hash, epoch_day(when))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            # computed under the lock, so concurrent queries for a new day do the work once
+            ra, dec = apparent(compiled.ra, compiled.dec, compiled.pm_ra, compiled.pm_dec,
+                               (key[1] + 0.5) * 86400.0)
+            ra.setflags(write=False)
+            dec.setflags(write=False)
+            self._entries[key] = (ra, dec)
+            while len(self._entries) > self.max_epochs:
+                self._entries.popitem(last=False)
+            return ra, dec
+
+    def get_rows(self, compiled, when, rows):
+        """
+        Apparent RA/Dec of some rows: from the day's table if it is cached, otherwise
+        computed for just those rows (same epoch, nothing cached), so a lookup
+        touching a few stars doesn't pay for the whole catalog on a new day.
+        """
+        key = (compiled.source_hash, epoch_day(when))
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            return entry[0][rows], entry[1][rows]
+        return apparent(compiled.ra[rows], compiled.dec[rows], compiled.pm_ra[rows], compiled.pm_dec[rows],
+                        (key[1] + 0.5) * 86400.0)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'epochs': len(self._entries), 'max_epochs': self.max_epochs, 'hits': self.hits, 'misses': self.misses}
+
+
+# shared by every session in this process
+apparent_places = ApparentPlaceCache()
@@ -0,0 +1,171 @@
+"""
+Batch visibility for many observers at once, without Streamlit or the LLM.
+
+Scheduled jobs ("what's visible tonight at each of our club sites") pass arrays
+of observers (latitude, longitude, time) and a target set: named stars,
+constellations, or the whole catalog. Altitude/azimuth for every observer x
+star pair comes from one broadcast computation. The grid is cut into chunks so
+that no chunk's working arrays go over `memory_mb`. Results stream out as one
+row per (observer, star), chunk by chunk, so the output never has to fit in
+memory either.
+
+    python batch_visibility.py sites.csv --constellations Orion,Lyra > tonight.csv
+
+sites.csv has columns lat, lon, time (ISO 8601 or unix seconds) and an optional id.
+"""
+import argparse
+import csv
+import json
+import sys
+from datetime import datetime
+import numpy as np
+from catalog import catalog
+from visibility import alt_az_observers, to_datetime
+
+# float64 working arrays per (observer, star) cell in _alt_az_from_lst (ha, trig terms, alt, az, mask)
+BYTES_PER_CELL = 8 * 10
+DEFAULT_MEMORY_MB = 64
+
+FIELDS = ('observer', 'latitude', 'longitude', 'time', 'name', 'bayer', 'constellation',
+          'magnitude', 'altitude', 'azimuth', 'visible')
+
+
+def to_seconds(times):
+    """Unix seconds from datetimes, ISO strings or numbers."""
+    seconds = []
+    for t in times:
+        if isinstance(t, str):
+            try:
+                t = float(t)
+            except ValueError:
+                t = datetime.fromisoformat(t)
+        seconds.append(t.timestamp() if isinstance(t, datetime) else float(t))
+    return np.array(seconds, dtype=float)
+
+
+def target_rows(cat, stars=None, constellations=None, limiting_magnitude=None):
+    """
+    Catalog rows to compute: the named stars plus the members of the named
+    constellations, or the whole catalog if neither is given. Unknown names are
+    reported on stderr and skipped.
+    """
+    if not stars and not constellations:
+        return np.asarray(cat.brighter_than(limiting_magnitude), dtype=np.intp)
+
+    rows = []
+    for name in stars or ():
+        row = cat.resolve_star(name)
+        if row is None:
+            print(f"Star '{name}' not found in the database.", file=sys.stderr)
+        else:
+            rows.append(row)
+    for name in constellations or ():
+        members = cat.constellation_range(name, limiting_magnitude)
+        if members is None:
+            print(f"Constellation '{name}' not found in the database.", file=sys.stderr)
+        else:
+            rows.extend(range(*members))
+    return np.array(list(dict.fromkeys(rows)), dtype=np.intp)
+
+
+def chunk_shape(n_observers, n_stars, memory_mb=DEFAULT_MEMORY_MB):
+    """(observers, stars) per chunk so one chunk's working set stays under memory_mb."""
+    cells = max(1, int(memory_mb * 2**20) // BYTES_PER_CELL)
+    stars = max(1, min(n_stars, cells))
+    observers = max(1, min(n_observers, cells // stars))
+    return observers, stars
+
+
+def iter_visibility(latitudes, longitudes, times, stars=None, constellations=None, ids=None,
+                    min_altitude=0.0, limiting_magnitude=None, only_visible=True,
+                    memory_mb=DEFAULT_MEMORY_MB):
+    """
+    Yields one dict (see FIELDS) per observer x target star, computed chunk by
+    chunk. Rows come out observer by observer within each chunk. With
+    only_visible (the default) stars below min_altitude are skipped.
+    """
+    catalog.ensure_loaded()
+    cat = catalog.snapshot()
+
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    seconds = to_seconds(times)
+    if not len(latitudes) == len(longitudes) == len(seconds):
+        raise ValueError("latitudes, longitudes and times must have the same length")
+    ids = list(ids) if ids is not None else list(range(len(latitudes)))
+
+    rows = target_rows(cat, stars, constellations, limiting_magnitude)
+    # apparent places at the middle of the requested times (one epoch for the whole batch)
+    ra, dec = cat.apparent(float(np.median(seconds)) if len(seconds) else 0.0)
+    ra, dec = ra[rows], dec[rows]
+    labels = [(cat.display_name(row), cat.bayer[row], cat.constellations[row], cat.magnitude_of(row))
+              for row in rows]
+    iso_times = [to_datetime(t).isoformat(timespec='minutes') for t in seconds]
+
+    obs_step, star_step = chunk_shape(len(latitudes), len(rows), memory_mb)
+    for o in range(0, len(latitudes), obs_step):
+        observers = slice(o, o + obs_step)
+        for s in range(0, len(rows), star_step):
+            targets = slice(s, s + star_step)
+            alt, az = alt_az_observers(ra[targets], dec[targets], longitudes[observers],
+                                       latitudes[observers], seconds[observers])
+            visible = alt > min_altitude
+            cells = visible.nonzero() if only_visible else np.indices(alt.shape).reshape(2, -1)
+            for i, j in zip(*cells):
+                name, bayer, constellation, magnitude = labels[s + j]
+                yield {
+                    'observer': ids[o + i],
+                    'latitude': float(latitudes[o + i]),
+                    'longitude': float(longitudes[o + i]),
+                    'time': iso_times[o + i],
+                    'name': name,
+                    'bayer': bayer,
+                    'constellation': constellation,
+                    'magnitude': magnitude,
+                    'altitude': round(float(alt[i, j]), 3),
+                    'azimuth': round(float(az[i, j]), 3),
+                    'visible': bool(visible[i, j]),
+                }
+
+
+def read_observers(path):
+    """(ids, latitudes, longitudes, times) from a CSV with lat, lon, time and optional id columns."""
+    with open(path, newline='', encoding='utf-8') as f:
+        records = list(csv.DictReader(f))
+    ids = [r.get('id') or n for n, r in enumerate(records)]
+    return (ids, [float(r['lat']) for r in records], [float(r['lon']) for r in records],
+            [r['time'] for r in records])
+
+
+def _names(text):
+    return [name.strip() for name in text.split(',') if name.strip()] if text else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Visibility of stars for many observers at once.")
+    parser.add_argument('observers', help="CSV with lat, lon, time (ISO or unix seconds) and optional id columns")
+    parser.add_argument('--stars', help="comma separated star names")
+    parser.add_argument('--constellations', help="comma separated constellation names")
+    parser.add_argument('--min-altitude', type=float, default=0.0)
+    parser.add_argument('--limiting-magnitude', type=float)
+    parser.add_argument('--all', action='store_true', help="also emit rows for stars below the horizon")
+    parser.add_argument('--memory-mb', type=float, default=DEFAULT_MEMORY_MB)
+    parser.add_argument('--format', choices=('csv', 'jsonl'), default='csv')
+    args = parser.parse_args(argv)
+
+    ids, latitudes, longitudes, times = read_observers(args.observers)
+    rows = iter_visibility(latitudes, longitudes, times, _names(args.stars), _names(args.constellations),
+                           ids=ids, min_altitude=args.min_altitude, limiting_magnitude=args.limiting_magnitude,
+                           only_visible=not args.all, memory_mb=args.memory_mb)
+
+    if args.format == 'jsonl':
+        for row in rows:
+            sys.stdout.write(json.dumps(row) + '\n')
+    else:
+        writer = csv.DictWriter(sys.stdout, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+Benchmarks for the catalog, query, visibility and ingestion hot paths.
+
+    python benchmarks/run_benchmarks.py                       # 3k and 100k stars
+    python benchmarks/run_benchmarks.py --sizes 3k,100k,1m
+    python benchmarks/run_benchmarks.py --save-baseline       # record the current numbers
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json
+
+Every catalog size runs in its own process, pointed at a synthetic catalog
+(see synthetic_catalog.py) through the STARGAZER_* path variables, so peak RSS
+is per size and nothing leaks between runs. Per size it measures:
+
+    load        compiling the .dlpy facts, then mapping + indexing the binary catalog
+    query.*     the four catalog query types (result cache bypassed), a cached lookup,
+                and spatial-index cone (5 degrees around a point) and 5-nearest-star searches
+    sweep       full-sky visibility for one observer (batch_visibility.iter_visibility)
+    chart       rendering + PNG-encoding a full-sky chart (chart cache bypassed)
+    ingest      vectorized coordinate formatting of a 1000-record TAP page
+
+and reports p50/p99 latency (ms), throughput (ops/s) and peak RSS (MB). Results
+are written as JSON. With a baseline, any p50/p99/load time or peak RSS that is
+more than --tolerance worse is reported and the exit status is 1.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DATA_DIR = os.path.join(REPO_DIR, '.cache', 'benchmarks')
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results', 'latest.json')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+SIZES = {'3k': 3_000, '100k': 100_000, '1m': 1_000_000}
+
+
+def summarize(samples):
+    samples = np.asarray(samples, dtype=float)
+    return {
+        'n': int(len(samples)),
+        'p50_ms': float(np.percentile(samples, 50) * 1000),
+        'p99_ms': float(np.percentile(samples, 99) * 1000),
+        'mean_ms': float(samples.mean() * 1000),
+        'ops_per_second': float(len(samples) / samples.sum()) if samples.sum() else None,
+    }
+
+
+def timed(func, args_list):
+    samples = []
+    # the query functions print their results; keep that I/O out of the numbers
+    with contextlib.redirect_stdout(io.StringIO()):
+        for args in args_list:
+            start = time.perf_counter()
+            func(*args)
+            samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def run_size(iterations, seed=480):
+    """Runs in the child process: the STARGAZER_* variables already point at the synthetic catalog."""
+    sys.path.insert(0, REPO_DIR)
+    from catalog_file import compile_catalog, STAR_FACTS, CONSTELLATION_FACTS, CATALOG_PATH
+    from parse_data import format_coordinates
+    import star_calc
+    import sky_chart
+    from batch_visibility import iter_visibility
+    from star_calc import catalog, initialize_catalog
+    from user_info import UserInfo
+
+    results = {}
+    start = time.perf_counter()
+    compile_catalog(STAR_FACTS, CONSTELLATION_FACTS, CATALOG_PATH)
+    results['load.compile'] = {'seconds': time.perf_counter() - start}
+    initialize_catalog()
+    results['load.open_and_index'] = {'seconds': catalog.stats()['cold_load_seconds']}
+
+    rng = np.random.default_rng(seed)
+    cat = catalog.snapshot()
+    rows = rng.integers(0, len(cat), iterations)
+    star_names = [cat.display_name(row) for row in rows]
+    constellations = [cat.constellation_names[i]
+                      for i in rng.integers(0, len(cat.constellation_names), iterations)]
+
+    def observer():
+        o = UserInfo(longitude=float(rng.uniform(-180, 180)), latitude=float(rng.uniform(-60, 60)))
+        o.time = o.time.fromtimestamp(float(rng.uniform(1.7e9, 1.8e9)), o.time.tzinfo)
+        return o
+    observers = [observer() for _ in range(iterations)]
+
+    # __wrapped__ skips the result cache, so these time the engine itself
+    results['query.star_visible'] = timed(star_calc.is_star_visible.__wrapped__, zip(star_names, observers))
+    results['query.constellation_visible'] = timed(star_calc.is_constellation_visible.__wrapped__,
+                                                   zip(constellations, observers))
+    results['query.constellation_stars'] = timed(star_calc.get_constellation_stars.__wrapped__,
+                                                 [(c,) for c in constellations])
+    results['query.star_constellation'] = timed(star_calc.get_star_constellation.__wrapped__,
+                                                [(s,) for s in star_names])
+    points = [{'altitude': float(rng.uniform(10, 90)), 'azimuth': float(rng.uniform(0, 360))} for _ in range(iterations)]
+    results['query.cone'] = timed(lambda o, p: star_calc.get_region_stars(o, 5.0, **p), zip(observers, points))
+    results['query.nearest'] = timed(lambda o, p: star_calc.get_nearest_stars(o, 5, **p), zip(observers, points))
+    fixed = observers[0]
+    star_calc.is_star_visible(star_names[0], fixed)
+    results['query.star_visible_cached'] = timed(star_calc.is_star_visible, [(star_names[0], fixed)] * iterations)
+
+    sweeps = max(5, iterations // 20)
+    def full_sky(o):
+        return sum(1 for _ in iter_visibility([o.latitude], [o.longitude], [o.time]))
+    results['sweep.full_sky'] = timed(full_sky, [(o,) for o in observers[:sweeps]])
+    results['sweep.full_sky']['stars_per_second'] = len(cat) * results['sweep.full_sky']['ops_per_second']
+
+    def full_chart(o):
+        return sky_chart.encode_png(sky_chart.render(o, constellations=[constellations[0]]))
+    results['chart.full_sky'] = timed(full_chart, [(o,) for o in observers[:sweeps]])
+
+    page_ra, page_dec = rng.uniform(0, 360, 1000), rng.uniform(-90, 90, 1000)
+    results['ingest.format_page'] = timed(format_coordinates, [(page_ra, page_dec)] * max(10, iterations // 10))
+
+    results['peak_rss_mb'] = peak_rss_mb()
+    results['stars'] = len(cat)
+    return results
+
+
+def run_child(label, n_stars, iterations):
+    sys.path.insert(0, BENCH_DIR)
+    from synthetic_catalog import write
+    directory = os.path.join(DATA_DIR, label)
+    star_path, constellation_path = write(directory, n_stars)
+    env = dict(os.environ,
+               STARGAZER_STAR_FACTS=star_path,
+               STARGAZER_CONSTELLATION_FACTS=constellation_path,
+               STARGAZER_CATALOG=os.path.join(directory, 'star_catalog.bin'))
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', str(iterations)],
+                         env=env, cwd=REPO_DIR, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """[(size, metric, field, baseline, current)] for everything that got worse than tolerance allows."""
+    regressions = []
+    for size, metrics in results['sizes'].items():
+        for metric, values in metrics.items():
+            base = baseline.get('sizes', {}).get(size, {}).get(metric)
+            if base is None:
+                continue
+            if not isinstance(values, dict):
+                values, base = {'value': values}, {'value': base}
+            for field in ('p50_ms', 'p99_ms', 'seconds', 'value'):
+                old, new = base.get(field), values.get(field)
+                if isinstance(old, (int, float)) and isinstance(new, (int, float)) and old > 0 \
+                        and metric != 'stars' and new > old * (1 + tolerance):
+                    regressions.append((size, metric, field, old, new))
+    return regressions
+
+
+def print_report(results):
+    for size, metrics in results['sizes'].items():
+        print(f"\n== {size} ({metrics['stars']} stars, peak RSS {metrics['peak_rss_mb']:.0f} MB)")
+        for metric, values in metrics.items():
+            if not isinstance(values, dict):
+                continue
+            if 'seconds' in values:
+                print(f"  {metric:32s} {values['seconds'] * 1000:10.1f} ms")
+            else:
+                print(f"  {metric:32s} p50 {values['p50_ms']:8.3f} ms   p99 {values['p99_ms']:8.3f} ms"
+                      f"   {values['ops_per_second']:10.1f} ops/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='3k,100k', help=f"comma separated, from {', '.join(SIZES)}")
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', help=f"compare against this results file (e.g. {DEFAULT_BASELINE})")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown before flagging, 0.25 = 25%%")
+    parser.add_argument('--save-baseline', action='store_true', help=f"also write the results to {DEFAULT_BASELINE}")
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_size(args.child)))
+        return 0
+
+    results = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'iterations': args.iterations, 'sizes': {}}
+    for label in args.sizes.split(','):
+        label = label.strip().lower()
+        print(f"benchmarking {label}...", file=sys.stderr)
+        results['sizes'][label] = run_child(label, SIZES[label], args.iterations)
+    print_report(results)
+
+    for path in [args.output] + ([DEFAULT_BASELINE] if args.save_baseline else []):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nwrote {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for size, metric, field, old, new in regressions:
+            print(f"REGRESSION {size} {metric} {field}: {old:.3f} -> {new:.3f}")
+        if regressions:
+            return 1
+        print(f"no regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Synthetic star catalogs in star_facts.dlpy format, for benchmarking.
+
+    python benchmarks/synthetic_catalog.py 100000 /tmp/stars_100k
+
+writes star_facts.dlpy and constellation_facts.dlpy into the directory. Stars are
+spread uniformly over the sphere, assigned to one of the 88 constellations,
+given magnitudes with roughly the real distribution (about 3x more stars per
+magnitude fainter) and a proper name for the brightest few percent, like the
+real catalog. The output is deterministic for a given size and seed.
+"""
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from parse_data import IAU_CONSTELLATION_MAP, format_coordinates  # noqa: E402
+
+SPECTRAL_TYPES = ['O9V', 'B2IV', 'B8V', 'A0V', 'A2V', 'F0IV', 'F5V', 'G2V', 'G8III', 'K0III', 'K5III', 'M2III']
+GREEK = ['Alp', 'Bet', 'Gam', 'Del', 'Eps', 'Zet', 'Eta', 'The', 'Iot', 'Kap', 'Lam', 'Mu', 'Nu', 'Xi',
+         'Omi', 'Pi', 'Rho', 'Sig', 'Tau', 'Ups', 'Phi', 'Chi', 'Psi', 'Ome']
+NAMED_FRACTION = 0.05
+
+
+def generate(n_stars, seed=480):
+    """Star fact tuples (name, bayer, constellation, ra, dec, vmag, sptype) and the constellation names."""
+    rng = np.random.default_rng(seed)
+    codes = list(IAU_CONSTELLATION_MAP)
+
+    ra = rng.uniform(0, 360, n_stars)
+    dec = np.degrees(np.arcsin(rng.uniform(-1, 1, n_stars)))
+    constellation = rng.integers(0, len(codes), n_stars)
+    # N(<m) ~ 10^(0.5 m): magnitudes from -1.5 up to a limit that grows with the catalog size
+    faint_limit = 6.5 + 2 * np.log10(max(n_stars, 1) / 9000)
+    vmag = np.log10(rng.uniform(10 ** (0.5 * -1.5), 10 ** (0.5 * faint_limit), n_stars)) / 0.5
+    sptype = rng.integers(0, len(SPECTRAL_TYPES), n_stars)
+    ra_strs, dec_strs = format_coordinates(ra, dec)
+
+    named = vmag <= np.quantile(vmag, NAMED_FRACTION) if n_stars else vmag.astype(bool)
+    stars = []
+    per_constellation = np.zeros(len(codes), dtype=int)
+    for i in range(n_stars):
+        code = codes[constellation[i]]
+        k = per_constellation[constellation[i]]
+        per_constellation[constellation[i]] += 1
+        greek = GREEK[k] if k < len(GREEK) else ''
+        bayer = f"{k + 1}{greek:<3} {code}" if greek else f"{k + 1:<5} {code}"
+        name = f"Synth {code} {k + 1}" if named[i] else 'None'
+        stars.append((name, bayer, IAU_CONSTELLATION_MAP[code], ra_strs[i], dec_strs[i],
+                      f"{vmag[i]:.2f}", SPECTRAL_TYPES[sptype[i]]))
+    return stars, [IAU_CONSTELLATION_MAP[code] for code in codes]
+
+
+def write(directory, n_stars, seed=480):
+    """Write the facts files into directory (skipped if already there). Returns (star path, constellation path)."""
+    os.makedirs(directory, exist_ok=True)
+    star_path = os.path.join(directory, 'star_facts.dlpy')
+    constellation_path = os.path.join(directory, 'constellation_facts.dlpy')
+    if os.path.exists(star_path) and os.path.exists(constellation_path):
+        return star_path, constellation_path
+
+    stars, constellations = generate(n_stars, seed)
+    with open(star_path + '.tmp', 'w', encoding='utf-8') as f:
+        for row in stars:
+            f.write("+ star(" + ", ".join(f"'{arg}'" for arg in row) + ")\n")
+    os.replace(star_path + '.tmp', star_path)
+    with open(constellation_path, 'w', encoding='utf-8') as f:
+        for name in constellations:
+            f.write(f"+ constellation('{name}')\n")
+    return star_path, constellation_path
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1])
+    print(write(sys.argv[2], n))
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from catalog_file import CATALOG_PATH, STAR_FACTS, CONSTELLATION_FACTS, open_catalog
+from star_store import StarStore
+import tracing
+
+
+class CatalogEngine:
+    """
+    Process-wide star knowledge base.
+
+    The catalog is memory-mapped from the compiled star_catalog.bin (rebuilt from
+    the .dlpy sources when they change) and indexed by a StarStore once. Both are
+    read-only, so every Streamlit session/thread shares them. The sources are only
+    reloaded when their mtime/size changes AND their content hash differs.
+    """
+
+    def __init__(self, star_path=STAR_FACTS, constellation_path=CONSTELLATION_FACTS, catalog_path=CATALOG_PATH):
+        self.paths = [star_path, constellation_path]
+        self.catalog_path = catalog_path
+        self._lock = threading.Lock()
+        self._stat_signature = None
+        self.store = None
+
+        # timings (seconds) so we can keep an eye on the cold-start cost
+        self.load_count = 0
+        self.cold_load_seconds = None
+        self.last_load_seconds = None
+        self.total_load_seconds = 0.0
+        self.loaded_at = None
+
+    # the compiled catalog of the current store (swapped in one assignment on reload)
+    @property
+    def compiled(self):
+        return self.store.compiled if self.store is not None else None
+
+    def snapshot(self):
+        """
+        The current StarStore. A query should take one snapshot and read everything
+        from it, so a reload on another thread can't mix rows from two catalogs.
+        """
+        return self.store
+
+    @property
+    def generation(self):
+        """Bumped by every (re)load that swapped in a new store, for keying caches of catalog answers."""
+        return self.load_count
+
+    def _stat_files(self):
+        signature = []
+        for path in self.paths:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    def _load(self):
+        start = time.perf_counter()
+
+        compiled = open_catalog(self.catalog_path, *self.paths)
+        if self.compiled is not None and compiled.source_hash == self.compiled.source_hash:
+            return False  # touched, but the content is the same
+        self.store = StarStore(compiled)
+
+        elapsed = time.perf_counter() - start
+        self.load_count += 1
+        self.last_load_seconds = elapsed
+        self.total_load_seconds += elapsed
+        if self.cold_load_seconds is None:
+            self.cold_load_seconds = elapsed
+        self.loaded_at = time.time()
+        return True
+
+    def ensure_loaded(self):
+        """Load the catalog, or reload it if the sources changed. Returns True if it was (re)loaded."""
+        stat_signature = self._stat_files()
+        if stat_signature == self._stat_signature:
+            return False
+        with self._lock:
+            if stat_signature == self._stat_signature:
+                return False
+            with tracing.span('catalog.load') as attrs:
+                reloaded = attrs['reloaded'] = self._load()
+            self._stat_signature = stat_signature
+            return reloaded
+
+    def stats(self):
+        return {
+            'stars': len(self.compiled) if self.compiled is not None else 0,
+            'load_count': self.load_count,
+            'cold_load_seconds': self.cold_load_seconds,
+            'last_load_seconds': self.last_load_seconds,
+            'total_load_seconds': self.total_load_seconds,
+            'loaded_at': self.loaded_at,
+        }
+
+
+# shared by every session in this process
+catalog = CatalogEngine()
@@ -0,0 +1,297 @@
+"""
+Compiled, memory-mappable star catalog.
+
+Build it from the .dlpy facts with:
+
+    python catalog_file.py            (or: make catalog)
+
+Layout (little endian, every section 8-byte aligned):
+
+    header          magic, version, counts, sha1 of the source .dlpy files, section offsets
+    ra              float64[n_stars]   radians
+    dec             float64[n_stars]   radians
+    constellation   uint16[n_stars]    index into the constellation table
+    name            uint32[n_stars]    string id
+    bayer           uint32[n_stars]    string id
+    magnitude       float32[n_stars]   visual magnitude, NaN if unknown
+    spectral_type   uint32[n_stars]    string id ('' if unknown)
+    pm_ra           float32[n_stars]   proper motion in RA * cos(dec), arcsec/yr (0 if unknown)
+    pm_dec          float32[n_stars]   proper motion in Dec, arcsec/yr (0 if unknown)
+    by_magnitude    uint32[n_stars]    every row, brightest first (unknown magnitudes first)
+    constellations  uint32[n_constellations]  string id of each constellation name
+    slices          uint32[n_constellations + 1]  first row of each constellation (+ end sentinel)
+    string offsets  uint32[n_strings + 1]
+    string blob     utf-8 bytes, every distinct string stored once
+
+Rows are sorted by constellation, so each constellation's members are one
+contiguous slice, and by magnitude within it, so the members brighter than a
+limiting magnitude are a prefix of that slice (found by binary search).
+Stars without a known magnitude sort first and are never cut. Loading maps the file read-only and hands out numpy views onto the mapping, so
+nothing is copied or parsed and worker processes share the pages through the
+OS page cache.
+"""
+import hashlib
+import mmap
+import os
+import re
+import struct
+import numpy as np
+from visibility import sexagesimal_to_radians
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# overridable so tools (e.g. the benchmarks) can point the engine at another catalog
+STAR_FACTS = os.getenv('STARGAZER_STAR_FACTS', os.path.join(BASE_DIR, 'star_facts.dlpy'))
+CONSTELLATION_FACTS = os.getenv('STARGAZER_CONSTELLATION_FACTS', os.path.join(BASE_DIR, 'constellation_facts.dlpy'))
+CATALOG_PATH = os.getenv('STARGAZER_CATALOG', os.path.join(BASE_DIR, 'star_catalog.bin'))
+
+MAGIC = b'STARCAT\0'
+VERSION = 4
+SECTIONS = ('ra', 'dec', 'constellation', 'name', 'bayer', 'magnitude', 'spectral_type', 'pm_ra', 'pm_dec',
+            'by_magnitude', 'constellations', 'slices', 'string_offsets', 'string_blob')
+# magic, version, n_stars, n_constellations, n_strings, source sha1, one u64 offset per section, blob length
+HEADER = struct.Struct(f'<8sIIII40s{len(SECTIONS)}QQ')
+
+_FACT_RE = re.compile(r"^\s*\+\s*(star|constellation)\s*\((.*)\)\s*$")
+_ARG_RE = re.compile(r"'((?:[^'\\]|\\.)*)'")
+
+
+def source_hash(paths=(STAR_FACTS, CONSTELLATION_FACTS)):
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def read_facts(star_path=STAR_FACTS, constellation_path=CONSTELLATION_FACTS):
+    """
+    Read the .dlpy fact files as plain data (no exec). Returns (star rows, constellation names).
+    Star rows are (name, bayer, constellation, ra, dec, magnitude, spectral type,
+    proper motion in RA, proper motion in Dec); the last four are optional in the
+    facts and '' when missing.
+    """
+    stars = []
+    constellations = []
+    for path in (star_path, constellation_path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                match = _FACT_RE.match(line)
+                if not match:
+                    continue
+                args = [a.replace("\\'", "'") for a in _ARG_RE.findall(match.group(2))]
+                if match.group(1) == 'star' and 5 <= len(args) <= 9:
+                    stars.append(tuple(args + [''] * (9 - len(args))))
+                elif match.group(1) == 'constellation' and len(args) == 1:
+                    constellations.append(args[0])
+    return stars, constellations
+
+
+def parse_magnitude(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def parse_proper_motion(text):
+    # arcsec/yr; an unknown proper motion is taken as none
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def magnitude_key(magnitude):
+    # sort/search key for magnitudes: unknown (NaN) counts as brightest, so no cut ever drops it
+    if np.ndim(magnitude) == 0:
+        return -np.inf if np.isnan(magnitude) else magnitude
+    return np.where(np.isnan(magnitude), -np.inf, magnitude)
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def compile_catalog(star_path=STAR_FACTS, constellation_path=CONSTELLATION_FACTS, out_path=CATALOG_PATH):
+    stars, constellation_names = read_facts(star_path, constellation_path)
+
+    # identical facts collapse to a single row (a relation is a set)
+    stars = list(dict.fromkeys(stars))
+
+    strings = {}
+    def intern(s):
+        return strings.setdefault(s, len(strings))
+
+    constellation_ids = {}
+    for name in constellation_names + [row[2] for row in stars]:
+        if name not in constellation_ids:
+            constellation_ids[name] = len(constellation_ids)
+
+    # group rows by constellation, brightest first within each (unknown magnitudes first, never cut)
+    magnitudes = {row: parse_magnitude(row[5]) for row in stars}
+    stars.sort(key=lambda row: (constellation_ids[row[2]], magnitude_key(magnitudes[row])))
+    member_counts = np.bincount([constellation_ids[row[2]] for row in stars], minlength=len(constellation_ids))
+    slices = np.zeros(len(constellation_ids) + 1, dtype='<u4')
+    np.cumsum(member_counts, out=slices[1:])
+
+    ra, dec = sexagesimal_to_radians([row[3] for row in stars], [row[4] for row in stars])
+    magnitude = np.array([magnitudes[row] for row in stars], dtype='<f4')
+    columns = {
+        'ra': ra.astype('<f8'),
+        'dec': dec.astype('<f8'),
+        'constellation': np.array([constellation_ids[row[2]] for row in stars], dtype='<u2'),
+        'name': np.array([intern(row[0]) for row in stars], dtype='<u4'),
+        'bayer': np.array([intern(row[1]) for row in stars], dtype='<u4'),
+        'magnitude': magnitude,
+        'spectral_type': np.array([intern(row[6]) for row in stars], dtype='<u4'),
+        'pm_ra': np.array([parse_proper_motion(row[7]) for row in stars], dtype='<f4'),
+        'pm_dec': np.array([parse_proper_motion(row[8]) for row in stars], dtype='<f4'),
+        'by_magnitude': np.argsort(magnitude_key(magnitude), kind='stable').astype('<u4'),
+        'constellations': np.array([intern(name) for name in constellation_ids], dtype='<u4'),
+        'slices': slices,
+    }
+
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    columns['string_offsets'] = offsets
+    blob = b''.join(encoded)
+
+    payload = [columns[name].tobytes() for name in SECTIONS[:-1]] + [blob]
+    section_offsets = []
+    position = _align(HEADER.size)
+    for chunk in payload:
+        section_offsets.append(position)
+        position = _align(position + len(chunk))
+
+    header = HEADER.pack(MAGIC, VERSION, len(stars), len(constellation_ids), len(encoded),
+                         source_hash((star_path, constellation_path)).encode('ascii'),
+                         *section_offsets, len(blob))
+
+    # write to a temp file and swap it in, so readers never see a half-written catalog
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        for offset, chunk in zip(section_offsets, payload):
+            f.seek(offset)
+            f.write(chunk)
+        f.truncate(_align(position))
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+class StringTable:
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+        self._decoded = {}
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        i = int(i)
+        s = self._decoded.get(i)
+        if s is None:
+            s = self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes().decode('utf-8')
+            self._decoded[i] = s
+        return s
+
+
+class StringColumn:
+    """Read-only sequence of strings backed by an id column and the string table."""
+    def __init__(self, ids, table):
+        self.ids = ids
+        self._table = table
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._table[j] for j in self.ids[i]]
+        return self._table[self.ids[i]]
+
+    def __iter__(self):
+        for j in self.ids:
+            yield self._table[j]
+
+
+class CompiledCatalog:
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        fields = HEADER.unpack_from(self._mmap, 0)
+        magic, version, n_stars, n_constellations, n_strings, sha = fields[:6]
+        offsets = dict(zip(SECTIONS, fields[6:6 + len(SECTIONS)]))
+        blob_length = fields[-1]
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} star catalog")
+        self.source_hash = sha.decode('ascii')
+
+        def view(section, dtype, count):
+            return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offsets[section])
+
+        # zero-copy views onto the mapping
+        self.ra = view('ra', '<f8', n_stars)
+        self.dec = view('dec', '<f8', n_stars)
+        self.constellation_ids = view('constellation', '<u2', n_stars)
+        self.name_ids = view('name', '<u4', n_stars)
+        self.bayer_ids = view('bayer', '<u4', n_stars)
+        self.magnitude = view('magnitude', '<f4', n_stars)
+        self.spectral_type_ids = view('spectral_type', '<u4', n_stars)
+        self.pm_ra = view('pm_ra', '<f4', n_stars)
+        self.pm_dec = view('pm_dec', '<f4', n_stars)
+        self.by_magnitude = view('by_magnitude', '<u4', n_stars)
+        self.constellation_name_ids = view('constellations', '<u4', n_constellations)
+        self.constellation_slices = view('slices', '<u4', n_constellations + 1)
+        self.strings = StringTable(view('string_offsets', '<u4', n_strings + 1),
+                                   view('string_blob', 'u1', blob_length))
+
+        self.names = StringColumn(self.name_ids, self.strings)
+        self.bayer = StringColumn(self.bayer_ids, self.strings)
+        self.spectral_types = StringColumn(self.spectral_type_ids, self.strings)
+        self.constellation_names = StringColumn(self.constellation_name_ids, self.strings)
+        self.constellations = StringColumn(self.constellation_name_ids[self.constellation_ids], self.strings)
+
+    def __len__(self):
+        return len(self.ra)
+
+
+def format_ra(ra):
+    # radians -> 'HH MM SS.s'
+    tenths = int(round(np.degrees(ra) / 15 * 36000)) % (24 * 36000)
+    h, rem = divmod(tenths, 36000)
+    m, rem = divmod(rem, 600)
+    return f"{h:02d} {m:02d} {rem / 10:04.1f}"
+
+
+def format_dec(dec):
+    # radians -> '+DD MM SS.s'
+    deg = np.degrees(dec)
+    sign = '-' if deg < 0 else '+'
+    tenths = int(round(abs(deg) * 36000))
+    d, rem = divmod(tenths, 36000)
+    m, rem = divmod(rem, 600)
+    return f"{sign}{d:02d} {m:02d} {rem / 10:04.1f}"
+
+
+def open_catalog(path=CATALOG_PATH, star_path=STAR_FACTS, constellation_path=CONSTELLATION_FACTS):
+    """Map the compiled catalog, rebuilding it first if it is missing or older than the .dlpy sources."""
+    current = source_hash((star_path, constellation_path))
+    try:
+        compiled = CompiledCatalog(path)
+        if compiled.source_hash == current:
+            return compiled
+    except (OSError, ValueError, struct.error):
+        pass
+    compile_catalog(star_path, constellation_path, path)
+    return CompiledCatalog(path)
+
+
+if __name__ == '__main__':
+    path = compile_catalog()
+    compiled = CompiledCatalog(path)
+    print(f"✅ Compiled {len(compiled)} stars and {len(compiled.constellation_name_ids)} constellations to {path}")
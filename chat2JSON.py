@@ -4,21 +4,21 @@ import time
 from pathlib import Path
 
 from dotenv import load_dotenv
-from mistralai import Mistral
+from intent_cache import IntentCache, prompt_hash
+from fast_intents import fast_intents
+from compact_results import compact_results
+import llm_client
+import tracing
 
 load_dotenv()
 api_key = os.getenv("MISTRAL_API_KEY")
 if not api_key:
     raise RuntimeError("Missing MISTRAL_API_KEY in .env")
-client = Mistral(api_key=api_key)
+# one rate-limited client shared by every session in this process
+llm = llm_client.from_env(api_key)
 MODEL  = "mistral-large-latest" # model selection
 
-# Define a helper that always returns JSON + usage
-def llm_to_json(user_prompt: str, **chat_kwargs):
-    messages = [
-        {
-            "role": "system",
-            "content": """
+INTENT_SYSTEM_PROMPT = """
             You are a JSON generator.
             **Output format**  
             Return ONE top-level JSON object with exactly one key: **"intents"**.  
@@ -31,14 +31,27 @@ def llm_to_json(user_prompt: str, **chat_kwargs):
             |----------------|--------|-------------------------------------------------------------|
             | "Constellation"| string | Name of the constellation the user mentioned, lowercase; empty string "" if not applicable. |
             | "Star"         | string | Common name of the star mentioned, lowercase; empty string "" if not applicable. |
+            | "Planet"       | string | "sun", "moon", "mercury", "venus", "mars", "jupiter" or "saturn" if the user mentioned one; empty string "" if not applicable. |
             | "ASKCONVIS"    | 0 or 1 | 1 → user asks about the VISIBILITY of a constellation.      |
             | "ASKSTAVIS"    | 0 or 1 | 1 → user asks about the VISIBILITY of a star.               |
             | "ASKSTAPAR"    | 0 or 1 | 1 → user asks **which constellation** a star belongs to.    |
             | "ASKCONCHI"    | 0 or 1 | 1 → user asks for the **stars contained in** a constellation. |
+            | "ASKSTATIM"    | 0 or 1 | 1 → user asks **when** a star rises, sets or is best seen.  |
+            | "ASKCONTIM"    | 0 or 1 | 1 → user asks **when** a constellation rises, sets or is best seen. |
+            | "ASKCONSEA"    | 0 or 1 | 1 → user asks which **months / season of the year** a constellation is best seen. |
+            | "ASKPLAVIS"    | 0 or 1 | 1 → user asks whether a planet, the Sun or the Moon is up, where it is, how bright, or when it rises/sets. |
+            | "ASKCONE"      | 0 or 1 | 1 → user asks what stars are in a **region of the sky**: around a star, planet or the Moon, overhead, or at a direction/height above the horizon. |
+            | "ASKNEAR"      | 0 or 1 | 1 → user asks which star(s) are **nearest to / next to** a star, planet, the Moon or a point in the sky (e.g. "that bright star near the Moon"). |
 
-            Include **all six fields** in every intent.  
+            Include **all thirteen fields** in every intent.  
+            For ASKCONE / ASKNEAR, name the object in "Star" or "Planet" when there is one. Otherwise add the point of the sky as
+            "Altitude" (degrees above the horizon, 90 = overhead) and "Azimuth" (degrees, N = 0, E = 90, S = 180, W = 270),
+            or as "Ra" / "Dec" (J2000, in degrees). Optionally add "Radius" (degrees, ASKCONE) or "Count" (how many stars, ASKNEAR)
+            when the user gives one. Leave these extra fields out of every other intent.
             Set a flag to 1 when you are confident OR uncertain it applies; set to 0 when it clearly does not.
             If the user asks 'where is x star' flag both ASKSTAVIS and ASKSTAPAR.
+            If the user asks 'which stars are visible in x constellation' flag ASKCONVIS, not ASKCONCHI.
+            If the user asks about "the planets" in general, create one ASKPLAVIS intent per planet listed above.
 
             **Multiple questions in one sentence**  
             If the user's input contains several separate questions relating to more than one object (star/constellation), create **one
@@ -48,6 +61,30 @@ def llm_to_json(user_prompt: str, **chat_kwargs):
             **Constraints**
             * The top level MUST be: `{ "intents": [ {...}, {...}, ... ] }`
             """
+
+# repeated questions are answered from disk; entries written under an older
+# version of the system prompt are dropped at startup
+INTENT_PROMPT_HASH = prompt_hash(INTENT_SYSTEM_PROMPT)
+intent_cache = IntentCache()
+intent_cache.invalidate_stale(INTENT_PROMPT_HASH)
+
+# Define a helper that always returns JSON + usage
+def llm_to_json(user_prompt: str, **chat_kwargs):
+    # common question shapes are parsed locally; the LLM only sees the rest
+    with tracing.span('intents.fast'):
+        fast = fast_intents(user_prompt)
+    if fast is not None:
+        return fast, None
+
+    with tracing.span('intents.cache'):
+        cached = intent_cache.get(user_prompt, MODEL, INTENT_PROMPT_HASH, chat_kwargs)
+    if cached is not None:
+        return cached, None  # no API call, so no usage
+
+    messages = [
+        {
+            "role": "system",
+            "content": INTENT_SYSTEM_PROMPT
         },
         {
             "role": "user",
@@ -55,9 +92,8 @@ def llm_to_json(user_prompt: str, **chat_kwargs):
         },
     ]
 
-    time.sleep(1.1) # important, this prevents exceeding rate limit
-
-    response = client.chat.complete(
+    # the shared token bucket keeps us under the rate limit
+    response = llm.complete(
         model=MODEL,
         messages=messages,
         response_format={"type": "json_object"},   #KEY LINE
@@ -67,21 +103,23 @@ def llm_to_json(user_prompt: str, **chat_kwargs):
     # The SDK guarantees valid JSON when that flag is set
     data  = json.loads(response.choices[0].message.content)
     usage = response.usage                      # prompt_tokens
+    tracing.record_usage('intents', usage)
+    intent_cache.put(user_prompt, MODEL, INTENT_PROMPT_HASH, data, chat_kwargs)
     return data, usage
 
-# instructs llm to turn json with output info into natural language
-def json_to_llm(user_prompt: str, info, **chat_kwargs):
-    """
-    user_prompt : the exact text the user typed
-    info        : dict OR list of dicts with the calculated answers
-    """
-    messages = [
+def answer_messages(user_prompt: str, info):
+    # info may already be compacted (app.py does it to keep the report); otherwise compact it here
+    context = info if isinstance(info, str) else compact_results(info)[0]
+    return [
         {
             "role": "system",
             "content": (
                 "You are an astronomy assistant.  Answer the user's question(s) in a conversational tone"
                 "using ONLY the information provided in the second message. "
-                "If the information is insufficient, make it briefly clear that you don't have information for part of the question."
+                "If the information is insufficient, make it briefly clear that you don't have information for part of the question. "
+                "Star lists are tables: 'columns' names the fields of each entry in 'rows'. "
+                "'<list>_count' is the full number of stars, '<list>_unnamed_omitted' how many unnamed ones were left out "
+                "and 'rows_trimmed' how many were cut for length."
             ),
         },
         {   # user’s original question for context
@@ -90,13 +128,64 @@ def json_to_llm(user_prompt: str, info, **chat_kwargs):
         },
         {   # structured data you must base your answer on
             "role": "system",
-            "content": json.dumps(info, indent=2),
+            "content": context,
         },
     ]
 
-    response = client.chat.complete(
+# instructs llm to turn json with output info into natural language
+def json_to_llm(user_prompt: str, info, **chat_kwargs):
+    """
+    user_prompt : the exact text the user typed
+    info        : dict OR list of dicts with the calculated answers,
+                  or the context string from compact_results
+    """
+    response = llm.complete(
         model=MODEL,
-        messages=messages,
+        messages=answer_messages(user_prompt, info),
         **chat_kwargs,
     )
-    return response.choices[0].message.content, response.usage
\ No newline at end of file
+    tracing.record_usage('answer', response.usage)
+    return response.choices[0].message.content, response.usage
+
+class ReplyStream:
+    """
+    Iterates over the text chunks of a streamed answer. Once exhausted, `text`
+    holds the full reply and `usage` the token usage (also added to the current
+    trace); `first_token_seconds` and `total_seconds` time the request from the
+    first next() call.
+    """
+    def __init__(self, events):
+        self._events = events
+        self.text = ""
+        self.usage = None
+        self.first_token_seconds = None
+        self.total_seconds = None
+
+    def __iter__(self):
+        start = time.perf_counter()
+        parts = []
+        for event in self._events:
+            chunk = event.data
+            if chunk.usage is not None:
+                self.usage = chunk.usage
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if not isinstance(content, str) or not content:
+                continue
+            if self.first_token_seconds is None:
+                self.first_token_seconds = time.perf_counter() - start
+                tracing.record('answer.first_token', self.first_token_seconds)
+            parts.append(content)
+            yield content
+        self.total_seconds = time.perf_counter() - start
+        self.text = "".join(parts)
+        tracing.record_usage('answer', self.usage)
+
+# same as json_to_llm, but yields the reply as it is generated
+def json_to_llm_stream(user_prompt: str, info, **chat_kwargs):
+    return ReplyStream(llm.stream(
+        model=MODEL,
+        messages=answer_messages(user_prompt, info),
+        **chat_kwargs,
+    ))
@@ -0,0 +1,121 @@
+"""
+Compaction of query results before they are sent to the LLM.
+
+Query results are lists of dicts, often with long lists of stars (every visible
+member of a constellation, every catalog member with full-precision floats,
+most of them called 'None'). Sending them as indented JSON wastes prompt tokens.
+This stage
+- drops unnamed stars from star lists (their count is kept)
+- rounds floats and collapses padding whitespace
+- ranks star lists (brightest first when magnitudes are known, else highest first;
+  region answers keep their own order)
+- encodes star lists as a column header plus rows instead of repeated keys
+- trims the lowest-ranked rows until the whole context fits the token budget
+and returns a report of what it saved.
+"""
+import json
+import os
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("STARGAZER_RESULT_TOKEN_BUDGET", "1500"))
+CHARS_PER_TOKEN = 4  # rough estimate for JSON-ish English text, good enough for budgeting
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _round(value, precision):
+    if isinstance(value, float):
+        return round(value, precision)
+    if isinstance(value, str):
+        return " ".join(value.split())  # catalog designations are space-padded ('53Xi  UMa')
+    if isinstance(value, dict):
+        return {k: _round(v, precision) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_round(v, precision) for v in value]
+    return value
+
+
+def _is_star_list(value):
+    return isinstance(value, list) and value and all(isinstance(v, dict) for v in value)
+
+
+def _rank(rows):
+    # cone and nearest-star answers come ranked already (brightest or nearest first): keep their order
+    if any("separation" in r for r in rows):
+        return rows
+    if all(isinstance(r.get("magnitude"), (int, float)) for r in rows):
+        return sorted(rows, key=lambda r: r["magnitude"])
+    if all(isinstance(r.get("altitude"), (int, float)) for r in rows):
+        return sorted(rows, key=lambda r: -r["altitude"])
+    return rows
+
+
+def _table(rows):
+    columns = []
+    for row in rows:
+        for key in row:
+            if key not in columns:
+                columns.append(key)
+    return {"columns": columns, "rows": [[row.get(c) for c in columns] for row in rows]}
+
+
+def _compact_one(result, drop_unnamed, precision, report):
+    if not isinstance(result, dict):
+        return _round(result, precision)
+    compact = {}
+    for key, value in result.items():
+        if _is_star_list(value):
+            rows = value
+            if drop_unnamed:
+                named = [r for r in rows if r.get("name") not in (None, "None", "")]
+                if len(named) < len(rows):
+                    compact[f"{key}_unnamed_omitted"] = len(rows) - len(named)
+                    report["unnamed_dropped"] += len(rows) - len(named)
+                rows = named
+            compact[key] = _table(_round(_rank(rows), precision))
+            compact[f"{key}_count"] = len(value)
+        else:
+            compact[key] = _round(value, precision)
+    return compact
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def compact_results(results, token_budget=DEFAULT_TOKEN_BUDGET, drop_unnamed=True, precision=1):
+    """
+    results: dict or list of dicts from Query.handle_query.
+    Returns (context string for the LLM, report dict).
+    """
+    original = json.dumps(results, indent=2)
+    report = {
+        "original_tokens": estimate_tokens(original),
+        "unnamed_dropped": 0,
+        "rows_trimmed": 0,
+    }
+
+    single = isinstance(results, dict)
+    items = [results] if single else list(results)
+    compact = [_compact_one(r, drop_unnamed, precision, report) for r in items]
+
+    # over budget: trim the lowest-ranked row from the longest table until it fits
+    text = _dumps(compact[0] if single else compact)
+    while estimate_tokens(text) > token_budget:
+        tables = [(len(t["rows"]), t) for item in compact if isinstance(item, dict)
+                  for t in item.values() if isinstance(t, dict) and "rows" in t]
+        tables = [entry for entry in tables if entry[0] > 1]
+        if not tables:
+            break
+        _, longest = max(tables, key=lambda entry: entry[0])
+        drop = max(1, len(longest["rows"]) // 10)
+        del longest["rows"][-drop:]
+        longest["rows_trimmed"] = longest.get("rows_trimmed", 0) + drop
+        report["rows_trimmed"] += drop
+        text = _dumps(compact[0] if single else compact)
+
+    report["compact_tokens"] = estimate_tokens(text)
+    report["tokens_saved"] = report["original_tokens"] - report["compact_tokens"]
+    report["token_budget"] = token_budget
+    return text, report
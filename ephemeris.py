@@ -0,0 +1,385 @@
+"""
+Low-precision ephemeris for the Sun, the Moon and the naked-eye planets.
+
+Positions come from closed-form series, with no network and no astropy:
+- the Sun and the Moon from the Astronomical Almanac's low-precision formulae
+  (about 0.01 deg and 0.3 deg)
+- the planets from JPL's Keplerian elements for 1800-2050 (Standish), with
+  Earth taken as the Earth-Moon barycenter (a few arcminutes)
+
+That is plenty for "is Jupiter up" and "how bright is the Moon". The series are
+evaluated once per body per UTC day, at the 25 whole hours. The table is kept in
+an LRU cache, and any time inside the day is linearly interpolated from it, so a
+query is a cache hit plus a few numpy ops, for one time or for an array of times.
+Coordinates are geocentric RA/Dec in radians, referred to the true equator and
+equinox of date like the apparent star places (apparent_place.py), so they go
+through the same visibility code. The Moon's altitude
+is corrected for parallax.
+
+The module also has the sky-brightness model that star_calc uses: how far the
+Sun is below the horizon (twilight) and how much the Moon washes out the sky.
+"""
+from functools import lru_cache
+import numpy as np
+from visibility import calculate_lst_array, _alt_az_from_lst
+from apparent_place import frame_matrix, mean_obliquity, nutation
+
+PLANETS = ('mercury', 'venus', 'mars', 'jupiter', 'saturn')
+BODIES = ('sun', 'moon') + PLANETS
+
+UNIX_EPOCH_JD = 2440587.5
+J2000_JD = 2451545.0
+OBLIQUITY = np.radians(23.43928)  # J2000 mean obliquity of the ecliptic
+EARTH_RADIUS_AU = 4.2635e-5
+
+# JPL approximate Keplerian elements, J2000 ecliptic: a (AU), e, I, L, long. perihelion, long. node (deg),
+# then their rates per Julian century
+ELEMENTS = {
+    'mercury': ((0.38709927, 0.20563593, 7.00497902, 252.25032350, 77.45779628, 48.33076593),
+                (0.00000037, 0.00001906, -0.00594749, 149472.67411175, 0.16047689, -0.12534081)),
+    'venus': ((0.72333566, 0.00677672, 3.39467605, 181.97909950, 131.60246718, 76.67984255),
+              (0.00000390, -0.00004107, -0.00078890, 58517.81538729, 0.00268329, -0.27769418)),
+    'earth': ((1.00000261, 0.01671123, -0.00001531, 100.46457166, 102.93768193, 0.0),
+              (0.00000562, -0.00004392, -0.01294668, 35999.37244981, 0.32327364, 0.0)),
+    'mars': ((1.52371034, 0.09339410, 1.84969142, -4.55343205, -23.94362959, 49.55953891),
+             (0.00001847, 0.00007882, -0.00813131, 19140.30268499, 0.44441088, -0.29257343)),
+    'jupiter': ((5.20288700, 0.04838624, 1.30439695, 34.39644051, 14.72847983, 100.47390909),
+                (-0.00011607, -0.00013253, -0.00183714, 3034.74612775, 0.21252668, 0.20469106)),
+    'saturn': ((9.53667594, 0.05386179, 2.48599187, 49.95424423, 92.59887831, 113.66242448),
+               (-0.00125060, -0.00050991, 0.00193609, 1222.49362201, -0.41897216, -0.28867794)),
+}
+
+# visual magnitude: V(1,0) and phase-angle polynomial (per degree), as in the Astronomical Almanac
+MAGNITUDE = {
+    'mercury': (-0.42, (0.0380, -0.000273, 0.000002)),
+    'venus': (-4.40, (0.0009, 0.000239, -0.00000065)),
+    'mars': (-1.52, (0.016,)),
+    'jupiter': (-9.40, (0.005,)),
+    'saturn': (-8.88, (0.044,)),  # rings ignored
+}
+
+# altitude (deg) of the center at rise/set: refraction plus semi-diameter for the Sun and Moon
+HORIZON = {'sun': -0.833, 'moon': -0.833}
+PLANET_HORIZON = -0.567
+
+# sun altitude (deg) where each stage of twilight ends, and roughly the faintest
+# magnitude the naked eye reaches in it (None: a dark sky, no cut)
+TWILIGHT = [(-0.833, 'day', -4.0), (-6.0, 'civil twilight', 1.0), (-12.0, 'nautical twilight', 3.5),
+            (-18.0, 'astronomical twilight', 5.5)]
+NIGHT = 'night'
+DARK_SKY_MAGNITUDE = 6.5
+# a full Moon above the horizon costs about this many magnitudes across the sky
+MOON_SKY_PENALTY = 2.0
+# close to a bright Moon only the brightest stars show through its glare
+MOON_GLARE_DEGREES = 10.0
+MOON_GLARE_ILLUMINATION = 0.25
+MOON_GLARE_MAGNITUDE = 1.5
+
+_HOURS = np.arange(25) * 3600.0
+
+
+def julian_centuries(seconds):
+    return (np.asarray(seconds, dtype=float) / 86400.0 + UNIX_EPOCH_JD - J2000_JD) / 36525.0
+
+
+def _unit(x, y, z):
+    r = np.sqrt(x * x + y * y + z * z)
+    return x / r, y / r, z / r, r
+
+
+def _ecliptic_to_equatorial(x, y, z, obliquity=OBLIQUITY):
+    c, s = np.cos(obliquity), np.sin(obliquity)
+    return x, y * c - z * s, y * s + z * c
+
+
+def _of_date(x, y, z, t):
+    # ecliptic of date -> true equator of date: nutation in longitude, then the true obliquity
+    dpsi, deps = nutation(t)
+    c, s = np.cos(dpsi), np.sin(dpsi)
+    return _ecliptic_to_equatorial(x * c - y * s, x * s + y * c, z, mean_obliquity(t) + deps)
+
+
+def _sun(t):
+    # geocentric ecliptic position of the Sun, AU
+    n = t * 36525.0
+    g = np.radians(357.528 + 0.9856003 * n)
+    lon = np.radians(280.460 + 0.9856474 * n + 1.915 * np.sin(g) + 0.020 * np.sin(2 * g))
+    r = 1.00014 - 0.01671 * np.cos(g) - 0.00014 * np.cos(2 * g)
+    return r * np.cos(lon), r * np.sin(lon), np.zeros_like(lon)
+
+
+def _moon(t):
+    # geocentric ecliptic position of the Moon, AU
+    def s(a, b):
+        return np.sin(np.radians(a + b * t))
+
+    def c(a, b):
+        return np.cos(np.radians(a + b * t))
+
+    lon = (218.32 + 481267.881 * t + 6.29 * s(135.0, 477198.87) - 1.27 * s(259.3, -413335.36)
+           + 0.66 * s(235.7, 890534.22) + 0.21 * s(269.9, 954397.74) - 0.19 * s(357.5, 35999.05)
+           - 0.11 * s(186.5, 966404.03))
+    lat = (5.13 * s(93.3, 483202.02) + 0.28 * s(228.2, 960400.89) - 0.28 * s(318.3, 6003.15)
+           - 0.17 * s(217.6, -407332.21))
+    parallax = (0.9508 + 0.0518 * c(135.0, 477198.87) + 0.0095 * c(259.3, -413335.36)
+                + 0.0078 * c(235.7, 890534.22) + 0.0028 * c(269.9, 954397.74))
+    r = EARTH_RADIUS_AU / np.sin(np.radians(parallax))
+    lon, lat = np.radians(lon), np.radians(lat)
+    return r * np.cos(lat) * np.cos(lon), r * np.cos(lat) * np.sin(lon), r * np.sin(lat)
+
+
+def _heliocentric(planet, t):
+    # heliocentric J2000 ecliptic position from the Keplerian elements, AU
+    base, rate = ELEMENTS[planet]
+    a, e, incl, mean_lon, peri, node = (b + r * t for b, r in zip(base, rate))
+    incl, node = np.radians(incl), np.radians(node)
+    omega = np.radians(peri) - node
+    m = np.radians((mean_lon - peri + 180.0) % 360.0 - 180.0)
+
+    ecc_anomaly = m + e * np.sin(m)
+    for _ in range(6):  # Newton's method; e <= 0.21 converges in a few steps
+        ecc_anomaly -= (ecc_anomaly - e * np.sin(ecc_anomaly) - m) / (1 - e * np.cos(ecc_anomaly))
+    xp = a * (np.cos(ecc_anomaly) - e)
+    yp = a * np.sqrt(1 - e * e) * np.sin(ecc_anomaly)
+
+    cw, sw, cn, sn, ci, si = np.cos(omega), np.sin(omega), np.cos(node), np.sin(node), np.cos(incl), np.sin(incl)
+    x = (cw * cn - sw * sn * ci) * xp + (-sw * cn - cw * sn * ci) * yp
+    y = (cw * sn + sw * cn * ci) * xp + (-sw * sn + cw * cn * ci) * yp
+    z = sw * si * xp + cw * si * yp
+    return x, y, z
+
+
+def _series(body, seconds):
+    """(N, 5) array: equatorial unit vector, geocentric distance and heliocentric distance (AU)."""
+    # everything ends up in the true equator and equinox of date, like the apparent star places
+    t = julian_centuries(seconds)
+    if body == 'sun':
+        x, y, z = _sun(t)
+        helio = np.zeros_like(t)
+        ux, uy, uz, r = _unit(*_of_date(x, y, z, t))
+    elif body == 'moon':
+        x, y, z = _moon(t)
+        sx, sy, sz = _sun(t)
+        helio = np.sqrt((x - sx) ** 2 + (y - sy) ** 2 + (z - sz) ** 2)
+        ux, uy, uz, r = _unit(*_of_date(x, y, z, t))
+    else:
+        # the elements are J2000: precess and nutate with one matrix for the (short) span of times
+        px, py, pz = _heliocentric(body, t)
+        ex, ey, ez = _heliocentric('earth', t)
+        x, y, z = px - ex, py - ey, pz - ez
+        helio = np.sqrt(px * px + py * py + pz * pz)
+        equatorial = frame_matrix(float(np.mean(seconds))) @ np.stack(_ecliptic_to_equatorial(x, y, z))
+        ux, uy, uz, r = _unit(*equatorial)
+    return np.column_stack([ux, uy, uz, r, helio])
+
+
+@lru_cache(maxsize=512)
+def _day_table(body, day):
+    # the series at every whole hour of one UTC day (day = unix seconds // 86400), 25 rows
+    table = _series(body, day * 86400.0 + _HOURS)
+    table.setflags(write=False)
+    return table
+
+
+def _state(body, seconds):
+    """(N, 5) interpolated from the per-day hourly tables, for any array of unix times."""
+    if body not in BODIES:
+        raise KeyError(body)
+    seconds = np.atleast_1d(np.asarray(seconds, dtype=float))
+    days = np.floor(seconds / 86400.0).astype(np.int64)
+    out = np.empty((len(seconds), 5))
+    for day in (days[:1] if len(days) == 1 else np.unique(days)):
+        rows = days == day
+        table = _day_table(body, int(day))
+        offset = seconds[rows] - day * 86400.0
+        hour = np.minimum((offset // 3600).astype(int), 23)
+        frac = ((offset - hour * 3600.0) / 3600.0)[:, None]
+        out[rows] = table[hour] * (1 - frac) + table[hour + 1] * frac
+    out[:, :3] /= np.linalg.norm(out[:, :3], axis=1)[:, None]
+    return out
+
+
+def radec(body, seconds):
+    """Geocentric RA, Dec (radians) and distance (AU) of a body, as arrays over `seconds`."""
+    state = _state(body, seconds)
+    ra = np.arctan2(state[:, 1], state[:, 0]) % (2 * np.pi)
+    dec = np.arcsin(np.clip(state[:, 2], -1.0, 1.0))
+    return ra, dec, state[:, 3]
+
+
+def alt_az(body, longitude, latitude, seconds):
+    """Altitude and azimuth (degrees) of a body from one place at each of `seconds`."""
+    ra, dec, distance = radec(body, seconds)
+    lst = np.radians(calculate_lst_array(longitude, seconds))
+    alt, az = _alt_az_from_lst(ra, dec, lst, latitude)
+    if body == 'moon':
+        # topocentric: the Moon is about a degree lower than seen from the Earth's center
+        alt = alt - np.degrees(np.arcsin(EARTH_RADIUS_AU / distance)) * np.cos(np.radians(alt))
+    return alt, az
+
+
+def separation(ra1, dec1, ra2, dec2):
+    """Angular separation (degrees) between RA/Dec positions in radians; broadcasts."""
+    cos_sep = np.sin(dec1) * np.sin(dec2) + np.cos(dec1) * np.cos(dec2) * np.cos(ra1 - ra2)
+    return np.degrees(np.arccos(np.clip(cos_sep, -1.0, 1.0)))
+
+
+def elongation(body, seconds):
+    """Angle (degrees) between a body and the Sun, as seen from the Earth."""
+    ra, dec, _ = radec(body, seconds)
+    sun_ra, sun_dec, _ = radec('sun', seconds)
+    return separation(ra, dec, sun_ra, sun_dec)
+
+
+def moon_illumination(seconds):
+    """Illuminated fraction of the Moon's disk (0 new, 1 full)."""
+    return (1 - np.cos(np.radians(elongation('moon', seconds)))) / 2
+
+
+def moon_phase(seconds):
+    """Name of the Moon's phase at one time."""
+    illumination = float(moon_illumination(seconds)[0])
+    moon_ra, sun_ra = radec('moon', seconds)[0][0], radec('sun', seconds)[0][0]
+    waxing = (moon_ra - sun_ra) % (2 * np.pi) < np.pi
+    if illumination < 0.03:
+        return 'new moon'
+    if illumination > 0.97:
+        return 'full moon'
+    if abs(illumination - 0.5) < 0.04:
+        return 'first quarter' if waxing else 'last quarter'
+    shape = 'crescent' if illumination < 0.5 else 'gibbous'
+    return f"{'waxing' if waxing else 'waning'} {shape}"
+
+
+def phase_angle(body, seconds):
+    """Sun-body-Earth angle (degrees)."""
+    state = _state(body, seconds)
+    delta, r = state[:, 3], state[:, 4]
+    earth_sun = radec('sun', seconds)[2]
+    cos_alpha = (r * r + delta * delta - earth_sun * earth_sun) / (2 * r * delta)
+    return np.degrees(np.arccos(np.clip(cos_alpha, -1.0, 1.0)))
+
+
+def magnitude(body, seconds):
+    """Apparent visual magnitude."""
+    seconds = np.atleast_1d(np.asarray(seconds, dtype=float))
+    if body == 'sun':
+        return np.full(len(seconds), -26.74)
+    alpha = phase_angle(body, seconds)
+    if body == 'moon':
+        return -12.73 + 0.026 * alpha + 4e-9 * alpha ** 4
+    state = _state(body, seconds)
+    v0, coefficients = MAGNITUDE[body]
+    return v0 + 5 * np.log10(state[:, 4] * state[:, 3]) + sum(k * alpha ** (i + 1) for i, k in enumerate(coefficients))
+
+
+def horizon(body):
+    return HORIZON.get(body, PLANET_HORIZON)
+
+
+def rise_transit_set(body, longitude, latitude, start, hours=24.0, step=600.0):
+    """
+    Next rise, transit and set (unix seconds, None if it doesn't happen) within `hours`
+    of `start`, from one altitude curve sampled every `step` seconds and interpolated
+    at the crossings; the body moves too much in a day for the fixed-star formula.
+    """
+    seconds = np.arange(start, start + hours * 3600.0 + step / 2, step)
+    alt, _ = alt_az(body, longitude, latitude, seconds)
+    above = alt - horizon(body)
+
+    def crossing(rising):
+        sign = np.signbit(above)
+        idx = np.nonzero(sign[:-1] & ~sign[1:] if rising else ~sign[:-1] & sign[1:])[0]
+        if not len(idx):
+            return None
+        i = idx[0]
+        return float(seconds[i] + step * above[i] / (above[i] - above[i + 1]))
+
+    # transit: the highest point, refined with a parabola through its neighbours
+    i = int(np.argmax(alt))
+    transit = None
+    if 0 < i < len(alt) - 1:
+        denom = alt[i - 1] - 2 * alt[i] + alt[i + 1]
+        transit = float(seconds[i] + (0.5 * step * (alt[i - 1] - alt[i + 1]) / denom if denom else 0.0))
+    return {
+        'rise': crossing(True),
+        'transit': transit,
+        'set': crossing(False),
+        'max_altitude': float(alt.max()),
+        'always_up': bool((above > 0).all()),
+        'never_up': bool((above <= 0).all()),
+    }
+
+
+def darkness(sun_altitude):
+    """'day', 'civil twilight', ..., 'night' for a sun altitude (degrees)."""
+    for limit, name, _ in TWILIGHT:
+        if sun_altitude > limit:
+            return name
+    return NIGHT
+
+
+def twilight_magnitude(sun_altitude):
+    """Faintest magnitude the twilight sky allows, or None at night."""
+    for limit, _, faintest in TWILIGHT:
+        if sun_altitude > limit:
+            return faintest
+    return None
+
+
+def sun_altitude(longitude, latitude, seconds):
+    return alt_az('sun', longitude, latitude, seconds)[0]
+
+
+def sky(longitude, latitude, seconds, limiting_magnitude=None):
+    """
+    Sky conditions at one place and time: sun altitude and twilight, the Moon's
+    position, altitude and phase, and the effective limiting magnitude after the
+    twilight and moonlight cuts (None if nothing cuts, like a dark moonless sky
+    with no limit given).
+    """
+    # one pass for both bodies: this runs for every visibility query
+    sun_ra, sun_dec, _ = radec('sun', seconds)
+    moon_ra, moon_dec, moon_distance = radec('moon', seconds)
+    lst = np.radians(calculate_lst_array(longitude, seconds))
+    alt, _ = _alt_az_from_lst(np.concatenate([sun_ra, moon_ra]), np.concatenate([sun_dec, moon_dec]), lst, latitude)
+    sun_alt = float(alt[0])
+    moon_alt = float(alt[1] - np.degrees(np.arcsin(EARTH_RADIUS_AU / moon_distance[0])) * np.cos(np.radians(alt[1])))
+    illumination = float((1 - np.cos(np.radians(separation(moon_ra, moon_dec, sun_ra, sun_dec)[0]))) / 2)
+
+    limits = [limiting_magnitude, twilight_magnitude(sun_alt)]
+    if moon_alt > 0:
+        limits.append(DARK_SKY_MAGNITUDE - MOON_SKY_PENALTY * illumination)
+    limits = [limit for limit in limits if limit is not None]
+    return {
+        'sun_altitude': sun_alt,
+        'darkness': darkness(sun_alt),
+        'moon_altitude': moon_alt,
+        'moon_illumination': illumination,
+        'moon_ra': float(moon_ra[0]),
+        'moon_dec': float(moon_dec[0]),
+        'limiting_magnitude': min(limits) if limits else None,
+    }
+
+
+def moon_glare(sky_conditions, ra, dec):
+    """Boolean mask of positions lost in the glare of a bright Moon above the horizon."""
+    ra, dec = np.asarray(ra, dtype=float), np.asarray(dec, dtype=float)
+    if sky_conditions['moon_altitude'] <= 0 or sky_conditions['moon_illumination'] < MOON_GLARE_ILLUMINATION:
+        return np.zeros(ra.shape, dtype=bool)
+    return separation(ra, dec, sky_conditions['moon_ra'], sky_conditions['moon_dec']) < MOON_GLARE_DEGREES
+
+
+def washed_out(magnitude, sky_conditions, ra, dec):
+    """
+    Boolean mask of stars the sky hides whatever the limiting magnitude says: every star
+    by day, stars not known to be bright in civil twilight (unknown (NaN) magnitudes
+    included), and stars fainter than MOON_GLARE_MAGNITUDE near a bright Moon.
+    """
+    magnitude = np.asarray(magnitude, dtype=float)
+    if sky_conditions['darkness'] == 'day':
+        return np.ones(magnitude.shape, dtype=bool)
+    lost = moon_glare(sky_conditions, ra, dec) & (magnitude > MOON_GLARE_MAGNITUDE)
+    if sky_conditions['darkness'] == 'civil twilight':
+        lost |= np.isnan(magnitude)
+    return lost
@@ -0,0 +1,201 @@
+"""
+Deterministic fast path for intent extraction.
+
+Most traffic is one of a handful of question shapes ("is X visible", "what stars
+are in X", "which stars are visible in X", "what constellation is X in", "where
+is X", "when can I see X", "what months is X best seen", "what's near X", "what's
+overhead"). This parser recognises those shapes with regexes, finds the objects by
+matching word n-grams against the catalog's star and constellation indexes (and
+the ephemeris' Sun, Moon and planets), and emits exactly the {"intents": [...]}
+schema llm_to_json returns.
+When it is not confident it returns None and the caller asks the LLM instead.
+"""
+import re
+import threading
+from catalog import catalog
+from ephemeris import BODIES
+
+FLAGS = ('ASKCONVIS', 'ASKSTAVIS', 'ASKSTAPAR', 'ASKCONCHI', 'ASKSTATIM', 'ASKCONTIM', 'ASKCONSEA', 'ASKPLAVIS',
+         'ASKCONE', 'ASKNEAR')
+
+# question shapes, checked in this order; earlier shapes win over later ones
+SHAPES = [
+    ('NEAR', re.compile(r"\b(near|nearest|close to|closest to|next to|beside)\b")),
+    # needs no object: a cone around the zenith
+    ('OVERHEAD', re.compile(r"\b(overhead|zenith|straight up|directly above( me| us)?)\b")),
+    ('SEASON', re.compile(r"\b(months?|seasons?|time of (the )?year|summer|winter|spring|autumn|fall)\b")),
+    ('TIME', re.compile(r"\b(when|what time|best time|rises?|rising|sets?|setting|transits?)\b")),
+    # both a members and a visibility question ("which stars are visible in Orion", "can I see the stars of
+    # Lyra") asks which members are visible; the "up" of "make up" is a members phrase, not visibility
+    ('VISIBLE_MEMBERS', re.compile(r"^(?=.*(\b(visible|see|seen|observable|out|above the horizon)\b|(?<!make )\bup\b))"
+                                   r"(?=.*(\b(what|which)\s+stars?\b|\bstars\s+(are\s+)?(in|of|make up|form)\b))")),
+    ('MEMBERS', re.compile(r"\b(what|which)\s+stars?\b|\bstars\s+(are\s+)?(in|of|make up|form)\b|\bmembers?\s+of\b|\blist\b.*\bstars\b")),
+    ('PARENT', re.compile(r"\b(what|which)\s+constellation\b|\bbelongs?\s+to\b|\bpart\s+of\s+(what|which)\b")),
+    ('WHERE', re.compile(r"\bwhere\b")),
+    ('VISIBLE', re.compile(r"\b(visible|see|seen|observable|up|out|above the horizon)\b")),
+]
+
+# which intent flags each shape sets, per object type (None = the shape makes no sense for that type)
+FLAGS_FOR = {
+    'star': {
+        'VISIBLE': ['ASKSTAVIS'], 'WHERE': ['ASKSTAVIS', 'ASKSTAPAR'], 'PARENT': ['ASKSTAPAR'],
+        'TIME': ['ASKSTATIM'], 'SEASON': None, 'MEMBERS': None, 'VISIBLE_MEMBERS': None, 'NEAR': ['ASKNEAR'],
+        'OVERHEAD': None,
+    },
+    'constellation': {
+        'VISIBLE': ['ASKCONVIS'], 'WHERE': ['ASKCONVIS'], 'MEMBERS': ['ASKCONCHI'], 'VISIBLE_MEMBERS': ['ASKCONVIS'],
+        'TIME': ['ASKCONTIM'], 'SEASON': ['ASKCONSEA'], 'PARENT': None, 'NEAR': None, 'OVERHEAD': None,
+    },
+    # the Sun, the Moon and the planets have one query answering visibility, position and rise/set
+    'planet': {
+        'VISIBLE': ['ASKPLAVIS'], 'WHERE': ['ASKPLAVIS'], 'TIME': ['ASKPLAVIS'],
+        'SEASON': None, 'MEMBERS': None, 'VISIBLE_MEMBERS': None, 'PARENT': None, 'NEAR': ['ASKNEAR'],
+        'OVERHEAD': None,
+    },
+}
+
+# anything about objects neither the catalog nor the ephemeris knows goes to the LLM
+# ("planets" in general too: the LLM expands it into one intent per planet)
+OUT_OF_SCOPE = re.compile(r"\b(planets|uranus|neptune|pluto|galaxy|nebula|comet|meteor|satellite|iss)\b")
+
+STOPWORDS = set("""
+a an the is are was be can could i we you me my our it its this that these those what which where when who how
+in of to from for on at by with and or but also then tonight today now right there here please tell show
+visible see seen up out stars star constellation constellations best time month months season year rise rises set sets
+hi hello hey thanks thank cheers ok okay
+""".split())
+
+_CLAUSE_RE = re.compile(r"[?.!;\n]+")
+_PART_RE = re.compile(r",|\b(?:and|but|or|also|plus)\b")
+_WORD_RE = re.compile(r"[\w*'-]+")
+MAX_NGRAM = 4
+
+DEFAULT_MIN_CONFIDENCE = 1.0
+
+
+class FastPathStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fast = 0
+        self.fallback = 0
+
+    def record(self, handled):
+        with self._lock:
+            if handled:
+                self.fast += 1
+            else:
+                self.fallback += 1
+
+    def report(self):
+        total = self.fast + self.fallback
+        return {'fast_path': self.fast, 'llm_fallback': self.fallback,
+                'fast_path_fraction': self.fast / total if total else 0.0}
+
+
+stats = FastPathStats()
+
+
+def _find_objects(text):
+    """[(position, kind, name)] for catalog objects mentioned in text, longest match first."""
+    catalog.ensure_loaded()
+    store = catalog.snapshot()
+    words = [(m.start(), m.group()) for m in _WORD_RE.finditer(text)]
+    found = []
+    i = 0
+    while i < len(words):
+        for n in range(min(MAX_NGRAM, len(words) - i), 0, -1):
+            span = words[i:i + n]
+            phrase = ' '.join(w for _, w in span)
+            if n == 1 and (len(phrase) < 3 or phrase.lower() in STOPWORDS):
+                continue
+            if phrase.lower() in BODIES:
+                found.append((span[0][0], 'planet', phrase.lower()))
+            elif store.constellation_id(phrase, fuzzy=False) is not None:
+                found.append((span[0][0], 'constellation', store.constellation(phrase).lower()))
+            elif store.star_names.lookup(phrase):
+                found.append((span[0][0], 'star', phrase.lower()))
+            else:
+                continue
+            i += n
+            break
+        else:
+            i += 1
+    return found
+
+
+def _shapes(text):
+    return [name for name, pattern in SHAPES if pattern.search(text)]
+
+
+def _content_words(text):
+    return [w for w in _WORD_RE.findall(text) if w.lower() not in STOPWORDS]
+
+
+def _parts(clause):
+    """Split a clause on conjunctions, gluing pieces without a question shape onto a neighbour."""
+    pieces = [p for p in _PART_RE.split(clause) if p and p.strip()]
+    merged = []
+    for piece in pieces:
+        if merged and not _shapes(merged[-1]):
+            merged[-1] = merged[-1] + ' and ' + piece
+        elif merged and not _shapes(piece):
+            merged[-1] = merged[-1] + ' and ' + piece
+        else:
+            merged.append(piece)
+    return merged
+
+
+def _intent(kind, name, flags):
+    intent = {'Constellation': name if kind == 'constellation' else '',
+              'Star': name if kind == 'star' else '',
+              'Planet': name if kind == 'planet' else ''}
+    for flag in FLAGS:
+        intent[flag] = 1 if flag in flags else 0
+    return intent
+
+
+def parse_intents(user_prompt):
+    """Returns ({"intents": [...]}, confidence in [0, 1])."""
+    text = user_prompt.lower()
+    if OUT_OF_SCOPE.search(text):
+        return {'intents': []}, 0.0
+
+    intents = []
+    meaningful = understood = 0
+    for clause in _CLAUSE_RE.split(text):
+        for part in _parts(clause):
+            objects = _find_objects(part)
+            shapes = _shapes(part)
+            if not objects and not _content_words(part):
+                continue  # filler ("thanks", "hi")
+            meaningful += 1
+            if not objects and 'OVERHEAD' in shapes:
+                intent = _intent('region', '', ['ASKCONE'])
+                intent['Altitude'] = 90
+                intents.append(intent)
+                understood += 1
+                continue
+            if not objects or not shapes:
+                continue
+
+            # the first (most specific) shape that applies to each object decides its flags
+            ok = True
+            for _, kind, name in objects:
+                flags = next((FLAGS_FOR[kind][s] for s in shapes if FLAGS_FOR[kind][s] is not None), None)
+                if flags is None:
+                    ok = False
+                    continue
+                intents.append(_intent(kind, name, flags))
+            understood += ok
+
+    if not intents or not meaningful:
+        return {'intents': intents}, 0.0
+    return {'intents': intents}, understood / meaningful
+
+
+def fast_intents(user_prompt, min_confidence=DEFAULT_MIN_CONFIDENCE):
+    """Intents from the local parser, or None if the LLM should handle this prompt."""
+    data, confidence = parse_intents(user_prompt)
+    handled = confidence >= min_confidence
+    stats.record(handled)
+    return data if handled else None
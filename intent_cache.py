@@ -0,0 +1,111 @@
+"""
+Disk-backed cache for llm_to_json intent extraction.
+
+Entries are keyed by the user prompt with case, whitespace and punctuation
+folded, plus the model name, a hash of the system prompt and any extra chat
+arguments. A repeated question therefore skips both the rate-limit sleep and
+the API call. The cache keeps at most `max_entries` rows (least recently used
+rows are evicted first), and rows written under a different system prompt are
+dropped by `invalidate_stale`.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_PATH = os.getenv(
+    "STARGAZER_INTENT_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "intents.sqlite"),
+)
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_prompt(text):
+    """'Is  VEGA visible?!' -> 'is vega visible'"""
+    text = _PUNCTUATION.sub(" ", text.casefold())
+    return " ".join(text.split())
+
+
+def prompt_hash(system_prompt):
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+
+
+class IntentCache:
+    def __init__(self, path=DEFAULT_PATH, max_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                """CREATE TABLE IF NOT EXISTS intents (
+                       key TEXT PRIMARY KEY,
+                       prompt TEXT NOT NULL,
+                       model TEXT NOT NULL,
+                       system_hash TEXT NOT NULL,
+                       data TEXT NOT NULL,
+                       created REAL NOT NULL,
+                       last_used REAL NOT NULL)"""
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS intents_last_used ON intents (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=5.0)
+        try:
+            with db:  # commits, or rolls back on error
+                yield db
+        finally:
+            db.close()
+
+    def key(self, user_prompt, model, system_hash, chat_kwargs=None):
+        extra = json.dumps(chat_kwargs or {}, sort_keys=True, default=str)
+        raw = "\0".join([normalize_prompt(user_prompt), model, system_hash, extra])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, user_prompt, model, system_hash, chat_kwargs=None):
+        key = self.key(user_prompt, model, system_hash, chat_kwargs)
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT data FROM intents WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE intents SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, user_prompt, model, system_hash, data, chat_kwargs=None):
+        key = self.key(user_prompt, model, system_hash, chat_kwargs)
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO intents VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, normalize_prompt(user_prompt), model, system_hash, json.dumps(data), now, now),
+            )
+            # size bound: drop the least recently used rows
+            db.execute(
+                """DELETE FROM intents WHERE key IN (
+                       SELECT key FROM intents ORDER BY last_used DESC LIMIT -1 OFFSET ?)""",
+                (self.max_entries,),
+            )
+
+    def invalidate_stale(self, system_hash):
+        """Drop every entry written under a different system prompt. Returns the number removed."""
+        with self._lock, self._connect() as db:
+            return db.execute("DELETE FROM intents WHERE system_hash != ?", (system_hash,)).rowcount
+
+    def clear(self):
+        with self._lock, self._connect() as db:
+            db.execute("DELETE FROM intents")
+
+    def stats(self):
+        with self._connect() as db:
+            size = db.execute("SELECT COUNT(*) FROM intents").fetchone()[0]
+        return {"size": size, "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,184 @@
+"""
+Process-wide asyncio layer in front of the Mistral API.
+
+Every Streamlit session shares one LLMClient, which runs its own event loop in a
+background thread. Requests from any thread go through:
+- a token-bucket limiter sized to the API quota, so callers only wait when the
+  shared budget is actually used up (no unconditional sleeps)
+- a concurrency cap on in-flight API calls
+- coalescing: identical requests already in flight share one API call
+- retries with jittered exponential backoff on 429 (and 5xx), honouring Retry-After
+
+Streaming requests share the same limiter and are bridged to a plain generator
+so the Streamlit script thread can render chunks as they arrive.
+"""
+import asyncio
+import json
+import os
+import queue
+import random
+import threading
+import time
+from mistralai import Mistral
+import tracing
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+_DONE = object()
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `capacity`. Must be used from a single event loop."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens=1.0):
+        # the lock keeps waiters in FIFO order
+        async with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                delay = (tokens - self._tokens) / self.rate
+                self.waited_seconds += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self._tokens -= tokens
+
+    def penalize(self, seconds):
+        """Drain the bucket after a 429 so other callers back off too."""
+        self._refill()
+        self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class LLMClient:
+    def __init__(self, api_key=None, client=None, requests_per_second=1.0, burst=1,
+                 max_concurrency=4, max_retries=5, backoff_base=0.5, backoff_cap=20.0):
+        self._client = client or Mistral(api_key=api_key)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='llm-client', daemon=True)
+        self._thread.start()
+
+        async def setup():
+            self._bucket = TokenBucket(requests_per_second, burst)
+            self._semaphore = asyncio.Semaphore(max_concurrency)
+            self._inflight = {}
+        self._run(setup())
+
+        self.calls = 0
+        self.coalesced = 0
+        self.retries = 0
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _call(self, attempt_call):
+        # attempt_call(retryable) runs one attempt; a stream clears retryable[0] once it has produced output
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                with tracing.span('llm.rate_limit_wait'):
+                    await self._bucket.acquire()
+                retryable = [True]
+                try:
+                    self.calls += 1
+                    with tracing.span('llm.network', attempt=attempt):
+                        return await attempt_call(retryable)
+                except Exception as e:
+                    status = getattr(e, 'status_code', None)
+                    if status not in RETRY_STATUS or attempt == self.max_retries or not retryable[0]:
+                        raise
+                    delay = self._retry_delay(e, attempt)
+                    if status == 429:
+                        self._bucket.penalize(delay)
+            self.retries += 1
+            with tracing.span('llm.backoff', status=status):
+                await asyncio.sleep(delay)
+
+    def _retry_delay(self, error, attempt):
+        response = getattr(error, 'raw_response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            # full jitter keeps concurrent sessions from retrying in lockstep
+            return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def complete_async(self, **request):
+        """chat.complete with rate limiting, coalescing and retries (call from the client's loop)."""
+        key = json.dumps(request, sort_keys=True, default=str)
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        async def attempt_call(retryable):
+            return await self._client.chat.complete_async(**request)
+
+        future = asyncio.ensure_future(self._call(attempt_call))
+        self._inflight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._inflight.pop(key, None)
+            else:
+                future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+    def complete(self, **request):
+        """Blocking chat.complete, safe to call from any thread."""
+        return self._run(self.complete_async(**request))
+
+    async def _stream_into(self, request, chunks):
+        async def attempt_call(retryable):
+            events = await self._client.chat.stream_async(**request)
+            async for event in events:
+                retryable[0] = False
+                chunks.put(event)
+
+        try:
+            await self._call(attempt_call)
+            chunks.put(_DONE)
+        except Exception as e:
+            chunks.put(e)
+
+    def stream(self, **request):
+        """Blocking generator over chat.stream events, safe to call from any thread."""
+        chunks = queue.Queue()
+        asyncio.run_coroutine_threadsafe(self._stream_into(request, chunks), self._loop)
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'retries': self.retries,
+            'rate_limit_wait_seconds': self._bucket.waited_seconds,
+        }
+
+
+def from_env(api_key):
+    """LLMClient sized from MISTRAL_REQUESTS_PER_SECOND / MISTRAL_BURST / MISTRAL_MAX_CONCURRENCY."""
+    return LLMClient(
+        api_key=api_key,
+        requests_per_second=float(os.getenv('MISTRAL_REQUESTS_PER_SECOND', '1.0')),
+        burst=float(os.getenv('MISTRAL_BURST', '1')),
+        max_concurrency=int(os.getenv('MISTRAL_MAX_CONCURRENCY', '4')),
+    )
@@ -0,0 +1,211 @@
+"""
+Batched, concurrent and cached SIMBAD name resolution for parse_data.py.
+
+Resolving the ~9,000 BSC designations one `query_object` round trip at a time
+takes hours. Here designations are resolved
+- in batches of `batch_size` with one multi-object SIMBAD query per batch
+- with up to `workers` batches in flight at once
+- through an on-disk SQLite cache: every finished batch is committed straight
+  away, so the cache doubles as the build's checkpoint. An interrupted or
+  repeated build only queries SIMBAD for designations it has never resolved.
+
+"Not in SIMBAD" is cached too (as a NULL name); failed batches are not, and are
+left out of resolve_many's result so callers can tell them apart and retry them. The SIMBAD client is injectable: anything with a
+`query_objects(list_of_names)` method returning a table with `colnames` and
+column access (like astroquery's) works, which is how a local stand-in is
+plugged in.
+"""
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+DEFAULT_PATH = os.getenv(
+    "STARGAZER_NAME_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "simbad_names.sqlite"),
+)
+
+
+def _column(table, name):
+    """Column of an astropy-like table by case-insensitive name, or None."""
+    for col in table.colnames:
+        if col.lower() == name:
+            return table[col]
+    return None
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return str(value)
+
+
+def _key(designation):
+    # SIMBAD may echo a designation with different spacing or case
+    return ' '.join(designation.split()).casefold()
+
+
+def common_name(ids, main_id):
+    """The 'NAME ...' identifier from a SIMBAD ids string, else the main id."""
+    if ids is not None:
+        for group in _text(ids).split('|'):
+            for token in (t.strip() for t in group.split(';')):
+                if token.startswith("NAME "):
+                    return token[5:].strip()
+    return _text(main_id) if main_id is not None else None
+
+
+def default_simbad():
+    from astroquery.simbad import Simbad
+    simbad = Simbad()
+    simbad.add_votable_fields('main_id', 'ids')
+    return simbad
+
+
+class NameCache:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                """CREATE TABLE IF NOT EXISTS names (
+                       designation TEXT PRIMARY KEY,
+                       name TEXT,
+                       fetched REAL NOT NULL)"""
+            )
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=5.0)
+        try:
+            with db:  # commits, or rolls back on error
+                yield db
+        finally:
+            db.close()
+
+    def get_many(self, designations):
+        """{designation: name or None} for the designations that are cached."""
+        found = {}
+        designations = list(designations)
+        with self._lock, self._connect() as db:
+            for i in range(0, len(designations), 500):  # stay under SQLite's parameter limit
+                chunk = designations[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                for designation, name in db.execute(
+                        f"SELECT designation, name FROM names WHERE designation IN ({marks})", chunk):
+                    found[designation] = name
+        return found
+
+    def put_many(self, names):
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.executemany("INSERT OR REPLACE INTO names VALUES (?, ?, ?)",
+                           [(designation, name, now) for designation, name in names.items()])
+
+    def clear(self):
+        with self._lock, self._connect() as db:
+            db.execute("DELETE FROM names")
+
+    def __len__(self):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM names").fetchone()[0]
+
+
+class SimbadResolver:
+    def __init__(self, simbad=None, cache=None, batch_size=200, workers=4, max_retries=3, backoff=2.0):
+        self._simbad = simbad
+        self._simbad_lock = threading.Lock()
+        self.cache = cache if cache is not None else NameCache()
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.cache_hits = 0
+        self.queried = 0
+        self.failed_batches = 0
+
+    @property
+    def simbad(self):
+        # astroquery is only needed (and imported) once something has to be fetched
+        with self._simbad_lock:
+            if self._simbad is None:
+                self._simbad = default_simbad()
+            return self._simbad
+
+    def query_batch(self, designations):
+        """{designation: name or None} from one multi-object SIMBAD query."""
+        result = self.simbad.query_objects(designations)
+        names = dict.fromkeys(designations)
+        if result is None or len(result) == 0:
+            return names
+
+        main_ids = _column(result, 'main_id')
+        ids = _column(result, 'ids')
+        # newer astroquery echoes the requested name, older versions number the script lines from 1
+        requested = _column(result, 'user_specified_id')
+        numbers = _column(result, 'script_number_id')
+        by_key = {_key(d): d for d in designations}
+        for i in range(len(result)):
+            if requested is not None:
+                designation = by_key.get(_key(_text(requested[i])))
+            elif numbers is not None:
+                designation = designations[int(numbers[i]) - 1]
+            else:
+                designation = designations[i]
+            if designation in names and names[designation] is None:
+                names[designation] = common_name(ids[i] if ids is not None else None,
+                                                 main_ids[i] if main_ids is not None else None)
+        return names
+
+    def _query_with_retries(self, designations):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.query_batch(designations)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                print(f"SIMBAD batch failed ({e}), retrying")
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def resolve_many(self, designations, progress=None):
+        """
+        {designation: common name or None} for every designation. Cached names are
+        used as is; the rest are fetched in concurrent batches and cached as each
+        batch finishes. Designations in a batch that keeps failing are left out (and
+        not cached), so a missing key means "lookup failed", None means "no name".
+        """
+        wanted = list(dict.fromkeys(d for d in designations if d))
+        names = self.cache.get_many(wanted)
+        self.cache_hits += len(names)
+        missing = [d for d in wanted if d not in names]
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='simbad') as pool:
+            futures = {pool.submit(self._query_with_retries, batch): batch for batch in batches}
+            for done, future in enumerate(as_completed(futures), 1):
+                batch = futures[future]
+                try:
+                    resolved = future.result()
+                except Exception as e:
+                    print(f"SIMBAD batch of {len(batch)} failed for good ({e}); rerun to retry it")
+                    self.failed_batches += 1
+                    resolved = None
+                if resolved is not None:
+                    self.cache.put_many(resolved)  # checkpoint
+                    self.queried += len(batch)
+                    names.update(resolved)
+                if progress:
+                    progress(done, len(batches))
+
+        return {d: names[d] for d in wanted if d in names}
+
+    def resolve(self, designation):
+        return self.resolve_many([designation]).get(designation)
+
+    def stats(self):
+        return {'cache_hits': self.cache_hits, 'queried': self.queried,
+                'failed_batches': self.failed_batches, 'cached': len(self.cache)}
@@ -1,8 +1,9 @@
-from pyvo import registry  # Access astronomical databases version >=1.6
-from astropy.coordinates import SkyCoord # Coordinates manipulation
-import astropy.units as u
-from astroquery.simbad import Simbad
+import hashlib
+import json
+import os
 import re
+import numpy as np
+from name_resolver import SimbadResolver
 
 IAU_CONSTELLATION_MAP = {
     "And": "Andromeda", "Ant": "Antlia", "Aps": "Apus", "Aql": "Aquila", "Aqr": "Aquarius", "Ara": "Ara",
@@ -27,91 +28,75 @@ IAU_CONSTELLATION_MAP = {
 # RETRIEVE STAR RECORDS
 CATALOGUE = "V/50" # the catalogue name in VizieR
 
-# each resource in the VO has an identifier, called ivoid. For vizier catalogs,
-# the VO ids can be constructed like this:
-catalogue_ivoid = f"ivo://CDS.VizieR/{CATALOGUE}"
-# the actual query to the registry
-voresource = registry.search(ivoid=catalogue_ivoid)[0]
-
-# We can print metadata information about the catalogue
-# voresource.describe(verbose=True)
-
-tables = voresource.get_tables()
-print(f"In this catalogue, we have {len(tables)} tables.")
-for table_name, table in tables.items():
-    print(f"{table_name}: {table.description}")
-
-# We can also extract the tables names for later use
-tables_names = list(tables.keys())
-tables_names
-
-voresource.access_modes()
-
-# get the first table of the catalogue
-first_table_name = tables_names[0]
-
-# execute a synchronous ADQL query
-tap_service = voresource.get_service("tap")
-tap_records = tap_service.search(
-    f'''
-    SELECT Name, RAJ2000, DEJ2000
-    FROM "{first_table_name}"
-    '''
-)
-
-custom_simbad = Simbad()
-custom_simbad.add_votable_fields('main_id', 'ids')
+# Output file
+output_path = "star_facts.dlpy"
+# what the last build wrote, per record: lets the next build skip everything that didn't change
+manifest_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "star_facts.manifest.json")
+
+PAGE_SIZE = 1000
+
+
+def get_tap_service(catalogue=CATALOGUE):
+    from pyvo import registry  # Access astronomical databases version >=1.6 (only needed to fetch)
+
+    # each resource in the VO has an identifier, called ivoid. For vizier catalogs,
+    # the VO ids can be constructed like this:
+    catalogue_ivoid = f"ivo://CDS.VizieR/{catalogue}"
+    # the actual query to the registry
+    voresource = registry.search(ivoid=catalogue_ivoid)[0]
+
+    # We can print metadata information about the catalogue
+    # voresource.describe(verbose=True)
+
+    tables = voresource.get_tables()
+    print(f"In this catalogue, we have {len(tables)} tables.")
+    for table_name, table in tables.items():
+        print(f"{table_name}: {table.description}")
+
+    # the first table of the catalogue holds the stars
+    first_table_name = list(tables.keys())[0]
+    return voresource.get_service("tap"), first_table_name
+
+
+def iter_pages(tap_service=None, table_name=None, page_size=PAGE_SIZE):
+    """
+    Stream the catalogue's records as lists of up to page_size records, paging on
+    the HR number. Pass a tap_service (anything with .search(adql)) to use a stand-in.
+    """
+    if tap_service is None:
+        tap_service, table_name = get_tap_service()
+
+    last_hr = 0
+    while True:
+        # execute a synchronous ADQL query for the next page
+        page = list(tap_service.search(
+            f'''
+            SELECT TOP {page_size} HR, Name, RAJ2000, DEJ2000, Vmag, SpType, pmRA, pmDE
+            FROM "{table_name}"
+            WHERE HR > {last_hr}
+            ORDER BY HR
+            '''
+        ))
+        if not page:
+            return
+        yield page
+        last_hr = int(page[-1].get('HR'))
+        if len(page) < page_size:
+            return
+
+
+# one resolver per build: batched, concurrent and cached in .cache/simbad_names.sqlite
+resolver = None
+
+def get_resolver():
+    global resolver
+    if resolver is None:
+        resolver = SimbadResolver()
+    return resolver
 
 def get_common_name(bsc_name):
-    try:
-        result = custom_simbad.query_object(bsc_name)
-        if result is None:
-            print(f"No result for '{bsc_name}'")
-            return None
-
-        print(f"Columns returned: {result.colnames}")
-
-        # Find 'ids' field case-insensitive
-        ids_field = None
-        for col in result.colnames:
-            if col.lower() == 'ids':
-                ids_field = col
-                break
-
-        if ids_field is None:
-            print("No 'ids' field found in result.")
-            return None
-
-        ids_data = result[ids_field][0]
-
-        # Decode bytes if necessary
-        if isinstance(ids_data, bytes):
-            ids_str = ids_data.decode('utf-8')
-        else:
-            ids_str = ids_data
-
-        print(f"ids string: {ids_str}")
-
-        # Split full string by pipe '|'
-        groups = ids_str.split('|')
-
-        # Look for any token starting with "NAME " and return the name
-        for group in groups:
-            tokens = [t.strip() for t in group.split(';')]
-            for token in tokens:
-                if token.startswith("NAME "):
-                    common_name = token[5:].strip()  # Remove "NAME " prefix
-                    return common_name
-
-        # If no common name found, fallback to main_id
-        main_id = result['main_id'][0]
-        if isinstance(main_id, bytes):
-            main_id = main_id.decode('utf-8')
-        return main_id
-
-    except Exception as e:
-        print(f"Error resolving '{bsc_name}': {e}")
-        return None
+    # single lookups still go through the cache; builds resolve all names up front with resolve_many
+    return get_resolver().resolve(bsc_name)
     
 
 def get_constellation(bsc_name):
@@ -147,37 +132,175 @@ def parse_bayer_designation(name):
     return f"{greek}{number} {constellation}".strip()
 
 
-# Output file
-output_path = "star_facts.dlpy"
-
-
-# Define the record → fact string function
-def record_to_fact(record):
-    bayer_flam = record.get('BayerFlam', record.get('Name', '')).strip()
+def format_coordinates(ra_deg, dec_deg):
+    """Degree arrays -> ('HH MM SS.s', '+DD MM SS.s') string lists, in one array pass per column."""
+    ra_tenths = np.rint(np.asarray(ra_deg) / 15 * 36000).astype(np.int64) % (24 * 36000)
+    ra_h, rem = np.divmod(ra_tenths, 36000)
+    ra_m, ra_t = np.divmod(rem, 600)
+
+    dec_deg = np.asarray(dec_deg)
+    dec_tenths = np.rint(np.abs(dec_deg) * 36000).astype(np.int64)
+    dec_d, rem = np.divmod(dec_tenths, 36000)
+    dec_m, dec_t = np.divmod(rem, 600)
+    signs = np.where(dec_deg < 0, '-', '+')
+
+    ra_strs = [f"{h:02d} {m:02d} {t // 10:02d}.{t % 10}" for h, m, t in zip(ra_h.tolist(), ra_m.tolist(), ra_t.tolist())]
+    dec_strs = [f"{sign}{d:02d} {m:02d} {t // 10:02d}.{t % 10}"
+                for sign, d, m, t in zip(signs.tolist(), dec_d.tolist(), dec_m.tolist(), dec_t.tolist())]
+    return ra_strs, dec_strs
+
+
+def _coordinate(record, *keys):
+    for key in keys:
+        value = record.get(key)
+        if value is not None and not np.ma.is_masked(value):
+            return float(value)
+    return np.nan
+
+
+def record_key(record):
+    hr = record.get('HR')
+    return f"HR {int(hr)}" if hr is not None else record.get('Name', '').strip()
+
+
+def record_hash(bayer_flam, ra_deg, dec_deg, vmag='', sptype='', pm_ra='', pm_dec=''):
+    # identifiers, coordinates, photometry and proper motion: if these are unchanged, so is the fact
+    return hashlib.sha1(f"{bayer_flam}|{ra_deg:.7f}|{dec_deg:.7f}|{vmag}|{sptype}|{pm_ra}|{pm_dec}"
+                        .encode('utf-8')).hexdigest()
+
+
+def _text_field(record, key):
+    value = record.get(key)
+    if value is None or np.ma.is_masked(value):
+        return ''
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    return str(value).strip()
+
+
+def _proper_motion(record, key):
+    value = _coordinate(record, key)
+    return '' if np.isnan(value) else f"{value:+.3f}"
+
+
+def _quote(text):
+    return str(text).replace("'", "\\'")
+
+
+def page_facts(page, previous, name_resolver, counts):
+    """
+    (key, hash, fact) for each usable record of a page. Records whose hash matches
+    the previous build reuse its fact as is; only the rest are name-resolved and formatted.
+    A record whose name lookup failed gets hash None, so the next build retries it.
+    """
+    bayer_flams = [record.get('BayerFlam', record.get('Name', '')).strip() for record in page]
+    ra = np.array([_coordinate(record, 'RA_ICRS', 'RAJ2000') for record in page])
+    dec = np.array([_coordinate(record, 'DE_ICRS', 'DEJ2000') for record in page])
+    vmag = np.array([_coordinate(record, 'Vmag') for record in page])
+    # magnitude and spectral type are optional trailing fact arguments ('' when unknown)
+    vmag_strs = ['' if np.isnan(m) else f"{m:.2f}" for m in vmag.tolist()]
+    sptypes = [_text_field(record, 'SpType') for record in page]
+    # proper motions (arcsec/yr), also optional
+    pm_ras = [_proper_motion(record, 'pmRA') for record in page]
+    pm_decs = [_proper_motion(record, 'pmDE') for record in page]
+    usable = [i for i, bayer_flam in enumerate(bayer_flams)
+              if bayer_flam != '' and not np.isnan(ra[i]) and not np.isnan(dec[i])]
+
+    entries = []
+    changed = []
+    for i in usable:
+        key, digest = record_key(page[i]), record_hash(bayer_flams[i], ra[i], dec[i], vmag_strs[i], sptypes[i],
+                                                   pm_ras[i], pm_decs[i])
+        entry = previous.get(key)
+        if entry is not None and entry['hash'] == digest:
+            entries.append((key, digest, entry['fact']))
+            counts['unchanged'] += 1
+        else:
+            entries.append((key, digest, None))
+            changed.append(i)
+            counts['changed' if entry is not None else 'added'] += 1
+
+    if changed:
+        designations = [parse_bayer_designation(bayer_flams[i]) for i in changed]
+        names = name_resolver.resolve_many(designations)
+        ra_strs, dec_strs = format_coordinates(ra[changed], dec[changed])
+        facts, unresolved = {}, set()
+        for i, designation, ra_str, dec_str in zip(changed, designations, ra_strs, dec_strs):
+            if designation and designation not in names:
+                unresolved.add(i)
+                counts['unresolved'] += 1
+            constellation = get_constellation(designation)
+            facts[i] = (f"+ star('{_quote(names.get(designation))}', '{_quote(bayer_flams[i])}', "
+                        f"'{constellation}', '{ra_str}', '{dec_str}', '{vmag_strs[i]}', '{_quote(sptypes[i])}', "
+                        f"'{pm_ras[i]}', '{pm_decs[i]}')")
+        entries = [(key, None if i in unresolved else digest, fact if fact is not None else facts[i])
+                   for i, (key, digest, fact) in zip(usable, entries)]
+    return entries
+
+
+def iter_facts(pages, previous, name_resolver, manifest, counts):
+    """Fact lines of every page, recording each record's hash and fact in manifest as it goes."""
+    for n, page in enumerate(pages, 1):
+        for key, digest, fact in page_facts(page, previous, name_resolver, counts):
+            manifest[key] = {'hash': digest, 'fact': fact}
+            yield fact
+        print(f"Page {n}: {counts}")
+
+
+def load_manifest(path=manifest_path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'records': {}, 'output_hash': None}
 
-    ra_deg = record.get('RA_ICRS') or record.get('RAJ2000')
-    dec_deg = record.get('DE_ICRS') or record.get('DEJ2000')
 
-    if ra_deg is None or dec_deg is None:
+def _file_hash(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
         return None
 
-    coord = SkyCoord(ra=ra_deg * u.deg, dec=dec_deg * u.deg)
-    ra_str = coord.ra.to_string(unit=u.hour, sep=' ', precision=1, pad=True)
-    dec_str = coord.dec.to_string(sep=' ', precision=1, alwayssign=True, pad=True)
 
-    parse = parse_bayer_designation(bayer_flam)
-    proper_name = get_common_name(parse)
-    constellation = get_constellation(parse)
+def build(pages=None, name_resolver=None, path=output_path, manifest_file=manifest_path):
+    """
+    Incremental rebuild of the facts file. Records are streamed page by page and
+    diffed against the previous build's manifest by record hash: unchanged records
+    keep their old fact line, changed and new ones are name-resolved (batched and
+    cached) and formatted, records that disappeared are dropped. If nothing changed
+    the facts file is left untouched, so the compiled catalog isn't rebuilt either.
+    """
+    pages = iter_pages() if pages is None else pages
+    name_resolver = name_resolver or get_resolver()
+    old = load_manifest(manifest_file)
+    previous = old['records']
+    # a hand-edited or missing facts file means the old facts can't be trusted to be in it
+    file_intact = old['output_hash'] is not None and old['output_hash'] == _file_hash(path)
+
+    counts = {'unchanged': 0, 'changed': 0, 'added': 0, 'unresolved': 0}
+    records = {}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for fact in iter_facts(pages, previous, name_resolver, records, counts):
+            f.write(fact + "\n")
+    counts['removed'] = len(previous.keys() - records.keys())
+
+    if file_intact and not (counts['changed'] or counts['added'] or counts['removed']):
+        os.remove(tmp_path)
+        print(f"✅ {path} is up to date ({counts['unchanged']} records)")
+        return counts
 
-    if bayer_flam != '':
-        return f"+ star('{proper_name}', '{bayer_flam}', '{constellation}', '{ra_str}', '{dec_str}')"
+    os.replace(tmp_path, path)
+    os.makedirs(os.path.dirname(manifest_file) or ".", exist_ok=True)
+    with open(manifest_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({'records': records, 'output_hash': _file_hash(path)}, f)
+    os.replace(manifest_file + ".tmp", manifest_file)
 
-# Write all facts to the output file
-with open(output_path, "w", encoding="utf-8") as f:
-    for record in tap_records:
-        fact = record_to_fact(record)
-        if fact:
-            f.write(fact + "\n")
+    print(f"Name resolution: {name_resolver.stats()}")
+    print(f"✅ Saved star facts to {path}: {counts}")
+    return counts
 
 
-print(f"✅ Saved star facts to {output_path}")
+if __name__ == "__main__":
+    build()
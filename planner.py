@@ -0,0 +1,155 @@
+"""
+Year-round visibility planner: which months are best to observe each constellation
+from a given place.
+
+For every day of the year and every constellation, the planner tabulates
+- the fraction of member stars above `min_altitude` at local midnight
+- the hours per night (local 18:00 -> 06:00) a member star spends above `min_altitude`
+  (averaged over the members)
+
+The first is one day x star altitude grid; the second is solved analytically from
+each star's hour angle, so no per-timestamp loop is needed. Tables are cached per
+quantized location, so repeated "when is Scorpius best seen from here?" questions
+are served from memory.
+"""
+import calendar
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from catalog import catalog
+from visibility import calculate_lst_array, alt_az_grid, SIDEREAL_DAY
+
+# tables are shared by everyone within this many degrees of each other
+LOCATION_PRECISION = 1.0
+DEFAULT_MIN_ALTITUDE = 20.0
+NIGHT_HOURS = 12.0  # local 18:00 -> 06:00 mean solar time
+
+# hours of hour angle per hour of clock time
+_SIDEREAL_RATIO = 86400.0 / SIDEREAL_DAY
+
+# year tables of the current catalog generation, least recently used first
+MAX_TABLES = 64
+_tables = OrderedDict()
+_tables_generation = [None]
+_tables_lock = threading.Lock()
+
+
+def quantize(value, precision=LOCATION_PRECISION):
+    return round(round(value / precision) * precision, 6)
+
+
+def _hours_in_arc(ha_start, length, semi_arc):
+    """
+    Hours of the hour-angle interval [ha_start, ha_start + length] (hours, length < 24)
+    that fall inside the periodic arc |HA| < semi_arc, where the star is above the limit.
+    """
+    a = (ha_start + 12.0) % 24.0 - 12.0
+    b = a + length
+    total = np.zeros(np.broadcast(a, semi_arc).shape)
+    for shift in (-24.0, 0.0, 24.0):
+        lo = np.maximum(a, shift - semi_arc)
+        hi = np.minimum(b, shift + semi_arc)
+        total += np.clip(hi - lo, 0.0, None)
+    return total
+
+
+class YearTable:
+    def __init__(self, store, latitude, longitude, year, min_altitude, days, fraction_up, hours_up, constellations,
+                 counts):
+        self.store = store                    # the catalog snapshot the table was built from
+        self.latitude = latitude
+        self.longitude = longitude
+        self.year = year
+        self.min_altitude = min_altitude
+        self.days = days                      # list of dates
+        self.fraction_up = fraction_up        # (days, constellations) fraction of members up at midnight
+        self.hours_up = hours_up              # (days, constellations) mean hours per night above min_altitude
+        self.constellations = constellations  # canonical names, column order
+        self.member_counts = counts
+        self._columns = {name: i for i, name in enumerate(constellations)}
+
+    def column(self, constellation):
+        name = self.store.constellation(constellation)
+        return self._columns.get(name)
+
+    def monthly(self, constellation):
+        """Per-month averages for one constellation: [(month name, fraction at midnight, hours per night)]."""
+        col = self.column(constellation)
+        if col is None:
+            return None
+        months = np.array([d.month for d in self.days])
+        rows = []
+        for month in range(1, 13):
+            in_month = months == month
+            rows.append((calendar.month_name[month],
+                         float(self.fraction_up[in_month, col].mean()),
+                         float(self.hours_up[in_month, col].mean())))
+        return rows
+
+
+def _build_table(store, latitude, longitude, year, min_altitude):
+    compiled = store.compiled
+    # apparent places for the middle of the year; they move by well under a minute of arc over it
+    ra, dec = store.apparent(datetime(year, 7, 2, tzinfo=timezone.utc))
+    slices = np.asarray(compiled.constellation_slices, dtype=np.intp)
+    constellations = list(compiled.constellation_names)
+
+    n_days = 366 if calendar.isleap(year) else 365
+    year_start = datetime(year, 1, 1, tzinfo=timezone.utc)
+    days = [(year_start + timedelta(days=d)).date() for d in range(n_days)]
+
+    # local mean midnight at the end of each day
+    midnight = year_start.timestamp() + (np.arange(n_days) + 1) * 86400.0 - longitude * 240.0
+
+    # fraction of members above the limit at midnight: one day x star grid
+    alt, _ = alt_az_grid(ra, dec, longitude, latitude, midnight)
+    up = (alt > min_altitude).astype(np.float32)
+
+    # hours above the limit during the night, from each star's hour angle at dusk
+    lat = np.radians(latitude)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_h0 = (np.sin(np.radians(min_altitude)) - np.sin(lat) * np.sin(dec)) / (np.cos(lat) * np.cos(dec))
+    semi_arc = np.degrees(np.arccos(np.clip(cos_h0, -1.0, 1.0))) / 15.0  # hours; 12 = circumpolar, 0 = never
+
+    lst_midnight = calculate_lst_array(longitude, midnight) / 15.0  # hours
+    ha_dusk = (lst_midnight[:, None] - NIGHT_HOURS / 2 * _SIDEREAL_RATIO) - np.degrees(ra)[None, :] / 15.0
+    hours = _hours_in_arc(ha_dusk, NIGHT_HOURS * _SIDEREAL_RATIO, semi_arc[None, :]) / _SIDEREAL_RATIO
+
+    # per-constellation means over the contiguous member slices
+    counts = np.diff(slices)
+    def member_mean(values):
+        cumulative = np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(values, axis=1)], axis=1)
+        sums = cumulative[:, slices[1:]] - cumulative[:, slices[:-1]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(counts > 0, sums / np.maximum(counts, 1), 0.0)
+
+    return YearTable(store, latitude, longitude, year, min_altitude, days,
+                     member_mean(up), member_mean(hours), constellations, counts)
+
+
+def year_table(latitude, longitude, year=None, min_altitude=DEFAULT_MIN_ALTITUDE):
+    """Day x constellation visibility table for the (quantized) location, cached."""
+    catalog.ensure_loaded()
+    # the generation is read before the snapshot: at worst a newer catalog's table is filed
+    # under the older generation, and dropped with it
+    generation = catalog.generation
+    store = catalog.snapshot()
+    year = year or datetime.now(timezone.utc).year
+    key = (quantize(latitude), quantize(longitude), year, float(min_altitude))
+    with _tables_lock:
+        if generation != _tables_generation[0]:
+            # a reloaded catalog: the old tables (and the store each one holds) are dropped at once
+            _tables.clear()
+            _tables_generation[0] = generation
+        table = _tables.get(key)
+        if table is not None:
+            _tables.move_to_end(key)
+            return table
+    table = _build_table(store, *key)
+    with _tables_lock:
+        if generation == _tables_generation[0]:
+            _tables[key] = table
+            while len(_tables) > MAX_TABLES:
+                _tables.popitem(last=False)
+    return table
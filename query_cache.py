@@ -0,0 +1,105 @@
+"""
+Bounded LRU + TTL cache for query results.
+
+Chat users repeat the same questions within seconds from nearly the same place,
+so visibility answers are keyed on the object, the query type, the observer's
+location rounded to `location_precision` degrees, the time bucketed to
+`time_bucket` seconds and the observer's limiting magnitude. Static lookups (which constellation a star is in, which
+stars a constellation has) are keyed on the object alone and never expire.
+
+A cache over data that can be reloaded (the catalog) is given a `generation`
+callable; its value is part of every key, so answers computed from an older
+catalog are never served again, whoever picked up the reload.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from star_names import normalize
+
+
+class QueryCache:
+    def __init__(self, maxsize=2048, ttl=300.0, location_precision=0.01, time_bucket=60.0, generation=None):
+        self.maxsize = maxsize
+        self.generation = generation
+        self.ttl = ttl
+        self.location_precision = location_precision
+        self.time_bucket = time_bucket
+        self._entries = OrderedDict()  # key -> (expires_at or None, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, kind, name, observer=None):
+        """Cache key; pass an observer (anything with latitude/longitude/time) for time-dependent queries."""
+        key = (kind, normalize(name))
+        if self.generation is not None:
+            key += (self.generation(),)
+        if observer is None:
+            return key
+        p = self.location_precision
+        return key + (round(observer.latitude / p), round(observer.longitude / p),
+                      int(observer.time.timestamp() // self.time_bucket),
+                      getattr(observer, 'limiting_magnitude', None))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value, expires=True):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl if expires else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def cached(self, kind, with_observer=False):
+        """
+        Decorator for a query function taking the object name as its first argument.
+        Time-dependent queries set `with_observer` and take the observer (anything
+        with latitude/longitude/time) as their second argument; it becomes part of
+        the key. Static lookups take the name only and never expire. Cached results
+        are shared between threads, treat them as read-only.
+        """
+        expected_args = 1 if with_observer else 0
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(name, *args, **kwargs):
+                if len(args) != expected_args or kwargs or not isinstance(name, str):
+                    return func(name, *args, **kwargs)
+                key = self.key(kind, name, args[0] if with_observer else None)
+                hit, value = self.get(key)
+                if hit:
+                    return value
+                value = func(name, *args)
+                self.put(key, value, expires=with_observer)
+                return value
+            return wrapper
+        return decorator
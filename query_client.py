@@ -0,0 +1,119 @@
+"""
+Client for query_service.py.
+
+Keeps one persistent HTTP/1.1 connection per thread (so concurrent Streamlit
+sessions don't serialize on a socket) and reconnects once if the service
+closed an idle connection.
+"""
+import http.client
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+import tracing
+
+DEFAULT_URL = os.getenv("STARGAZER_QUERY_SERVICE", "http://127.0.0.1:8765")
+
+
+class QueryServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"query service returned {status}: {message}")
+        self.status = status
+
+
+class QueryClient:
+    def __init__(self, url=DEFAULT_URL, timeout=30.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def _request(self, method, path, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if data is not None else {}
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                return conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # the service dropped an idle keep-alive connection; retry once on a fresh one
+                self._reset()
+                if attempt:
+                    raise
+
+    def _json(self, method, path, body=None):
+        trace = tracing.current()
+        if trace is not None and body is not None:
+            body = dict(body, trace=True)  # ask the service for its spans of this request
+        with tracing.span('service.request', path=path):
+            offset = trace.elapsed() if trace is not None else 0.0
+            response = self._request(method, path, body)
+            raw = response.read()
+        with tracing.span('service.deserialize', bytes=len(raw)):
+            payload = json.loads(raw or b'{}')
+        if response.status != 200:
+            raise QueryServiceError(response.status, payload.get('error'))
+        if trace is not None:
+            trace.merge(payload.pop('spans', []), parent='service.request', offset=offset)
+        return payload
+
+    def health(self):
+        return self._json('GET', '/health')
+
+    def query(self, intent, observer):
+        """Answer one intent for a UserInfo."""
+        return self._json('POST', '/query', {'intent': intent, 'observer': observer.to_dict()})['result']
+
+    def batch(self, intents, observer):
+        """Answer every intent of a message for a UserInfo, in intent order (like star_calc.run_queries)."""
+        return self._json('POST', '/batch', {'intents': intents, 'observer': observer.to_dict()})['results']
+
+    def visibility(self, latitudes, longitudes, times, **options):
+        """Rows of batch visibility (see batch_visibility.iter_visibility), streamed as they arrive."""
+        body = dict(options, latitudes=list(latitudes), longitudes=list(longitudes),
+                    times=[t.isoformat() if hasattr(t, 'isoformat') else t for t in times])
+        response = self._request('POST', '/visibility', body)
+        if response.status != 200:
+            raise QueryServiceError(response.status, json.loads(response.read() or b'{}').get('error'))
+        for line in response:
+            if line.strip():
+                row = json.loads(line)
+                if 'error' in row:  # the service failed after it had started streaming
+                    self._reset()
+                    raise QueryServiceError(500, row['error'])
+                yield row
+
+    def chart(self, observer, stars=(), constellations=(), planets=(), size=None):
+        """PNG bytes of the sky chart for a UserInfo, with the named objects highlighted (see sky_chart.py)."""
+        body = {'observer': observer.to_dict(), 'stars': list(stars), 'constellations': list(constellations),
+                'planets': list(planets)}
+        if size is not None:
+            body['size'] = size
+        with tracing.span('service.request', path='/chart'):
+            response = self._request('POST', '/chart', body)
+            data = response.read()
+        if response.status != 200:
+            raise QueryServiceError(response.status, json.loads(data or b'{}').get('error'))
+        return data
+
+    def close(self):
+        self._reset()
+
+
+# shared by the app and other tools in this process
+client = QueryClient()
@@ -0,0 +1,305 @@
+"""
+Headless query service: the star_calc engine over local HTTP/1.1, as JSON.
+
+    python query_service.py [--host 127.0.0.1] [--port 8765] [--workers 4]
+
+The catalog is loaded once in the parent process. The parent then forks
+`--workers` processes that accept on the same listening socket. The catalog is
+an mmap plus read-only indexes, so the workers share it through the page cache
+and copy-on-write instead of each loading their own. Each worker serves its
+connections on threads. Connections are kept alive, and pipelined requests on
+one connection are answered in order. Where fork isn't available (Windows) it
+runs as a single threaded process.
+
+Endpoints (all responses but /chart are JSON):
+
+    GET  /health       catalog size, worker pid, cache stats
+    POST /query        {"intent": {...}, "observer": {...}}    -> {"result": ...}
+    POST /batch        {"intents": [...], "observer": {...}}   -> {"results": [...]}
+    POST /visibility   {"latitudes": [...], "longitudes": [...], "times": [...],
+                        "stars": [...], "constellations": [...], ...}
+                       -> JSON lines, one per (observer, star), streamed chunked
+    POST /chart        {"observer": {...}, "stars": [...], "constellations": [...],
+                        "planets": [...], "size": 560}
+                       -> image/png sky chart (see sky_chart.py)
+
+With `"trace": true` in a /query or /batch body, the response also carries
+"spans": the tracing spans (see tracing.py) of answering it.
+
+An intent is the llm_to_json intent object (Constellation, Star, ASK* flags,
+optional start/end). An observer is UserInfo.to_dict(). /query and /batch
+answer the query types star_calc supports: star and constellation visibility,
+parent constellation, member stars, rise/set times, best season, the Sun, Moon
+and planets, and stars in a region of the sky or nearest to a point (ASKCONE /
+ASKNEAR, with Altitude/Azimuth, Ra/Dec, Radius and Count fields).
+"""
+import argparse
+import json
+import os
+import signal
+import socketserver
+import sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import numpy as np
+from star_calc import Query, run_queries, initialize_catalog, query_cache
+from batch_visibility import iter_visibility
+from catalog import catalog
+from user_info import UserInfo
+import sky_chart
+import tracing
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = int(os.getenv("STARGAZER_QUERY_PORT", "8765"))
+DEFAULT_WORKERS = int(os.getenv("STARGAZER_QUERY_PROCESSES", "4"))
+MAX_BODY = 1 << 20
+MAX_CHART_SIZE = 2048
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _json_default(value):
+    # numpy scalars that slipped into a result
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(value):
+    return json.dumps(value, default=_json_default, ensure_ascii=False).encode('utf-8')
+
+
+def _observer(body):
+    data = body.get('observer') or {}
+    if not isinstance(data, dict):
+        raise BadRequest("observer must be an object")
+    try:
+        return UserInfo.from_dict(data)
+    except (TypeError, ValueError) as e:
+        raise BadRequest(f"bad observer: {e}")
+
+
+def handle_query(body):
+    intent = body.get('intent')
+    if not isinstance(intent, dict):
+        raise BadRequest("intent must be an object")
+    query = Query(_observer(body))
+    query.update_from_json(intent)
+    return {'result': query.handle_query()}
+
+
+def handle_batch(body):
+    intents = body.get('intents')
+    if not isinstance(intents, list) or not all(isinstance(i, dict) for i in intents):
+        raise BadRequest("intents must be a list of objects")
+    return {'results': run_queries(intents, _observer(body))}
+
+
+def health(_body=None):
+    return {'status': 'ok', 'pid': os.getpid(), 'catalog': catalog.stats(), 'query_cache': query_cache.stats()}
+
+
+ROUTES = {
+    ('GET', '/health'): health,
+    ('POST', '/query'): handle_query,
+    ('POST', '/batch'): handle_batch,
+}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive; pipelined requests are read and answered in order
+    disable_nagle_algorithm = True  # small responses must not wait for the client's delayed ACK
+    server_version = "StargazerQuery/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY:
+            raise BadRequest("request body too large")
+        raw = self.rfile.read(length) if length else b''
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            raise BadRequest("body is not valid JSON")
+        if not isinstance(body, dict):
+            raise BadRequest("body must be a JSON object")
+        return body
+
+    def _send(self, status, payload):
+        data = dumps(payload)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self, method):
+        path = self.path.split('?', 1)[0]
+        try:
+            body = self._body()
+            if (method, path) == ('POST', '/visibility'):
+                return self._stream_visibility(body)
+            if (method, path) == ('POST', '/chart'):
+                return self._send_chart(body)
+            route = ROUTES.get((method, path))
+            if route is None:
+                return self._send(404, {'error': f"no route {method} {path}"})
+            if body.get('trace'):
+                # the caller is tracing its turn: send our spans back with the answer
+                with tracing.turn('query_service', export=False) as trace:
+                    initialize_catalog()
+                    payload = route(body)
+                payload['spans'] = trace.spans
+            else:
+                initialize_catalog()
+                payload = route(body)
+            self._send(200, payload)
+        except BadRequest as e:
+            self._send(400, {'error': str(e)})
+        except Exception as e:
+            self.log_error("%s %s failed: %r", method, path, e)
+            self._send(500, {'error': str(e)})
+
+    def _stream_visibility(self, body):
+        try:
+            rows = iter_visibility(
+                body['latitudes'], body['longitudes'], body['times'],
+                stars=body.get('stars'), constellations=body.get('constellations'), ids=body.get('ids'),
+                min_altitude=float(body.get('min_altitude', 0.0)),
+                limiting_magnitude=body.get('limiting_magnitude'),
+                only_visible=bool(body.get('only_visible', True)))
+            first = next(rows, None)  # surface bad input as a 400 before the 200 goes out
+        except (KeyError, TypeError, ValueError) as e:
+            raise BadRequest(f"bad visibility request: {e}")
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        batch = []
+        try:
+            for row in (rows if first is None else _prepend(first, rows)):
+                batch.append(dumps(row) + b'\n')
+                if len(batch) == 500:
+                    self._chunk(b''.join(batch))
+                    batch = []
+        except ConnectionError:
+            self.close_connection = True  # the client went away
+            return
+        except Exception as e:
+            # the 200 is already out: end the stream with an error record instead, and drop the
+            # connection so the client can't take a cut-short stream for a complete one
+            self.log_error("POST /visibility failed mid-stream: %r", e)
+            self.close_connection = True
+            batch.append(dumps({'error': str(e)}) + b'\n')
+        if batch:
+            self._chunk(b''.join(batch))
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _send_chart(self, body):
+        names = {}
+        for field in ('stars', 'constellations', 'planets'):
+            value = body.get(field) or []
+            if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                raise BadRequest(f"{field} must be a list of names")
+            names[field] = value
+        try:
+            size = int(body.get('size', sky_chart.SIZE))
+        except (TypeError, ValueError):
+            raise BadRequest("size must be a number of pixels")
+        if not 2 * sky_chart.MARGIN < size <= MAX_CHART_SIZE:
+            raise BadRequest(f"size must be between {2 * sky_chart.MARGIN + 1} and {MAX_CHART_SIZE}")
+        initialize_catalog()
+        data = sky_chart.chart(_observer(body), size=size, **names)
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
+
+
+class QueryServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+    verbose = False
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS, verbose=False):
+    # load (and if needed compile) the catalog once, before forking, so every worker shares it
+    initialize_catalog()
+    server = QueryServer((host, port), QueryHandler)
+    server.verbose = verbose
+    print(f"Stargazer query service on http://{host}:{server.server_address[1]} "
+          f"({len(catalog.compiled)} stars, {workers if hasattr(os, 'fork') else 1} worker(s))")
+
+    if workers <= 1 or not hasattr(os, 'fork'):
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    children = set()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(workers):
+        spawn()
+    # restart workers that die, so one crash doesn't shrink the pool
+    while True:
+        pid, status = os.wait()
+        children.discard(pid)
+        print(f"worker {pid} exited ({status}), restarting", file=sys.stderr)
+        spawn()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the star query engine over local HTTP.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers, args.verbose)
+
+
+if __name__ == '__main__':
+    main()
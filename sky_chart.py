@@ -0,0 +1,245 @@
+"""
+Sky charts: the sky above the observer as a PNG, to show answers in the chat.
+
+The chart is a stereographic projection about the zenith. The horizon is the rim,
+with north up and east on the left, as when the chart is held overhead. Every star
+at least as bright as the sky allows is projected in one vectorized pass over the
+apparent places of date. Stars are drawn as disks sized by magnitude; all stars of
+one size are stamped at once with numpy, and the image is PNG-encoded with zlib,
+so no drawing library is needed. The stars and constellation members being asked
+about are drawn in gold, and named stars are ringed. The Moon, the planets and (by
+day) the Sun are drawn when above the horizon.
+
+Rendered charts are cached by location (rounded to 0.1 degree), time (2 minute
+buckets), limiting magnitude, size and highlight set, so a repeated chart costs a
+dictionary lookup. A full-sky chart renders and encodes in 10-20 ms (see
+chart.full_sky in benchmarks/run_benchmarks.py).
+"""
+import os
+import struct
+import zlib
+from functools import lru_cache
+import numpy as np
+from catalog import catalog
+from query_cache import QueryCache
+from star_names import normalize
+from visibility import alt_az
+import ephemeris
+import tracing
+
+SIZE = int(os.getenv("STARGAZER_CHART_SIZE", "560"))
+MARGIN = 22  # room outside the horizon for the N/E/S/W labels
+# the same location, minute and question give the same chart
+chart_cache = QueryCache(maxsize=256, ttl=300, location_precision=0.1, time_bucket=120)
+
+SKY_COLORS = {'day': (64, 104, 160), 'civil twilight': (38, 56, 104), 'nautical twilight': (20, 28, 66),
+              'astronomical twilight': (10, 14, 40), ephemeris.NIGHT: (4, 6, 22)}
+OUTSIDE_COLOR = (0, 0, 0)
+GRID_COLOR = (52, 64, 96)
+HORIZON_COLOR = (120, 130, 150)
+# gray level per star radius: small disks dimmer, so the faint end fades instead of looking like noise
+STAR_SHADE = (0, 150, 200, 235, 255, 255)
+HIGHLIGHT_COLOR = (255, 196, 64)
+FAINT_HIGHLIGHT_COLOR = (150, 112, 40)  # members too faint for the sky, so the figure still reads
+BODY_STYLE = {'sun': ((255, 236, 120), 7), 'moon': ((226, 226, 208), 6), 'mercury': ((200, 190, 180), 2),
+              'venus': ((255, 250, 220), 3), 'mars': ((236, 110, 70), 3), 'jupiter': ((240, 220, 180), 3),
+              'saturn': ((220, 200, 140), 3)}
+
+# 5x7 bitmaps for the cardinal points
+LETTERS = {
+    'N': ('10001', '11001', '10101', '10011', '10001', '10001', '10001'),
+    'E': ('11111', '10000', '10000', '11110', '10000', '10000', '11111'),
+    'S': ('01111', '10000', '10000', '01110', '00001', '00001', '11110'),
+    'W': ('10001', '10001', '10001', '10101', '10101', '11011', '10001'),
+}
+LETTER_SCALE = 2
+
+
+def project(alt, az, radius, center):
+    """Pixel x, y of altitudes/azimuths (degrees): stereographic about the zenith, horizon at `radius`."""
+    r = radius * np.tan(np.radians(90.0 - np.asarray(alt, dtype=float)) / 2)
+    az = np.radians(az)
+    return center - r * np.sin(az), center - r * np.cos(az)
+
+
+def star_radius(magnitude):
+    """Disk radius in pixels (1..5) per magnitude; unknown magnitudes get the smallest."""
+    radius = np.clip(np.rint(4.5 - 0.6 * np.nan_to_num(magnitude, nan=6.0)), 1, 5)
+    return radius.astype(int)
+
+
+@lru_cache(maxsize=None)
+def _disk(radius):
+    # pixel offsets covering a disk; radius 1 is a single pixel
+    span = np.arange(-radius + 1, radius)
+    dy, dx = np.meshgrid(span, span, indexing='ij')
+    inside = dx * dx + dy * dy <= (radius - 0.5) ** 2
+    return dy[inside], dx[inside]
+
+
+@lru_cache(maxsize=None)
+def _ring(radius):
+    angles = np.linspace(0, 2 * np.pi, int(8 * radius), endpoint=False)
+    offsets = np.unique(np.rint(np.column_stack([np.sin(angles), np.cos(angles)]) * radius).astype(int), axis=0)
+    return offsets[:, 0], offsets[:, 1]
+
+
+def _stamp(image, x, y, offsets, color):
+    # paint `offsets` around every (x, y) at once; anything off the image is dropped
+    dy, dx = offsets
+    height, width, _ = image.shape
+    px = np.rint(x).astype(int)[:, None] + dx
+    py = np.rint(y).astype(int)[:, None] + dy
+    inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+    image.reshape(-1, 3)[py[inside] * width + px[inside]] = color
+
+
+def _stamp_disks(image, x, y, radius, color):
+    for r in np.unique(radius):
+        chosen = radius == r
+        _stamp(image, x[chosen], y[chosen], _disk(int(r)), color)
+
+
+@lru_cache(maxsize=4)
+def _layout(size):
+    """Palette index per pixel: 0 outside, 1 sky, 2 altitude circles every 30 degrees, 3 horizon rim and N/E/S/W."""
+    center = (size - 1) / 2
+    radius = size / 2 - MARGIN
+    offsets = np.arange(size, dtype=np.float32) - center
+    r = np.hypot(offsets[None, :], offsets[:, None])
+    index = (r <= radius).astype(np.uint8)
+    for alt in (30, 60):
+        index[np.abs(r - radius * np.tan(np.radians(90 - alt) / 2)) < 0.5] = 2
+    index[np.abs(r - radius) < 1.0] = 3
+
+    for letter, az in (('N', 0), ('E', 90), ('S', 180), ('W', 270)):
+        lx, ly = project(0.0, az, radius + MARGIN / 2, center)
+        bitmap = np.array([[c == '1' for c in row] for row in LETTERS[letter]])
+        bitmap = np.kron(bitmap, np.ones((LETTER_SCALE, LETTER_SCALE), dtype=bool))
+        top, left = int(round(ly)) - bitmap.shape[0] // 2, int(round(lx)) - bitmap.shape[1] // 2
+        index[top:top + bitmap.shape[0], left:left + bitmap.shape[1]][bitmap] = 3
+    return index
+
+
+def _background(size, darkness):
+    palette = np.array([OUTSIDE_COLOR, SKY_COLORS.get(darkness, SKY_COLORS[ephemeris.NIGHT]),
+                        GRID_COLOR, HORIZON_COLOR], dtype=np.uint8)
+    return palette[_layout(size)]
+
+
+def encode_png(pixels):
+    """PNG bytes of an (height, width, 3) uint8 RGB array."""
+    height, width, _ = pixels.shape
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)  # filter byte 0 (none) on every row
+    raw[:, 1:] = pixels.reshape(height, -1)
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 1))  # mostly flat color: level 1 is nearly as small
+            + chunk(b'IEND', b''))
+
+
+def _highlighted_rows(cat, stars, constellations):
+    members, named = [], []
+    if not stars and not constellations:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    for name in constellations:
+        found = cat.constellation_range(name)
+        if found is not None:
+            members.append(np.arange(*found))
+    for name in stars:
+        row = cat.resolve_star(name)
+        if row is not None:
+            named.append(row)
+    members = np.concatenate(members) if members else np.empty(0, dtype=np.intp)
+    return np.union1d(members, named).astype(np.intp), np.array(named, dtype=np.intp)
+
+
+@tracing.traced('chart.render')
+def render(observer, stars=(), constellations=(), planets=(), size=SIZE):
+    """
+    Chart of the sky for a UserInfo as an (size, size, 3) uint8 RGB array, with the
+    named stars, constellations and planets (or Sun/Moon) highlighted.
+    """
+    cat = catalog.snapshot()
+    seconds = observer.time.timestamp()
+    sky = ephemeris.sky(observer.longitude, observer.latitude, seconds, observer.limiting_magnitude)
+    image = _background(size, sky['darkness'])
+    center = (size - 1) / 2
+    radius = size / 2 - MARGIN
+
+    # brightness cut by binary search, then one trig pass over what is left
+    ra, dec = cat.apparent(observer.time)
+    rows = cat.brighter_than(sky['limiting_magnitude'])
+    # and the same daylight, twilight and Moon glare cuts as the answers
+    rows = rows[~ephemeris.washed_out(cat.magnitude[rows], sky, ra[rows], dec[rows])]
+    highlighted, named = _highlighted_rows(cat, stars, constellations)
+    if len(highlighted):
+        rows = rows[~np.isin(rows, highlighted)]
+
+    alt, az = alt_az(ra[rows], dec[rows], observer.longitude, observer.latitude, observer.time)
+    up = alt > 0
+    rows, alt, az = rows[up], alt[up], az[up]
+    x, y = project(alt, az, radius, center)
+    magnitude = cat.magnitude[rows]
+    size_px = star_radius(magnitude)
+    for r in np.unique(size_px):
+        chosen = size_px == r
+        _stamp(image, x[chosen], y[chosen], _disk(int(r)), (STAR_SHADE[r],) * 3)
+
+    if len(highlighted):
+        alt, az = alt_az(ra[highlighted], dec[highlighted], observer.longitude, observer.latitude, observer.time)
+        up = alt > 0
+        x, y = project(alt[up], az[up], radius, center)
+        magnitude = cat.magnitude[highlighted[up]]
+        limit = sky['limiting_magnitude']
+        faint = np.zeros(len(magnitude), dtype=bool) if limit is None else magnitude > limit
+        size_px = np.maximum(star_radius(magnitude), 2)
+        _stamp_disks(image, x[faint], y[faint], size_px[faint], FAINT_HIGHLIGHT_COLOR)
+        _stamp_disks(image, x[~faint], y[~faint], size_px[~faint], HIGHLIGHT_COLOR)
+        ringed = np.isin(highlighted[up], named)
+        _stamp(image, x[ringed], y[ringed], _ring(9), HIGHLIGHT_COLOR)
+
+    wanted = {normalize(p) for p in planets}
+    for body, (color, body_radius) in BODY_STYLE.items():
+        alt, az = ephemeris.alt_az(body, observer.longitude, observer.latitude, np.array([seconds]))
+        if alt[0] <= 0:
+            continue
+        x, y = project(alt, az, radius, center)
+        _stamp(image, x, y, _disk(body_radius), color)
+        if body in wanted:
+            _stamp(image, x, y, _ring(body_radius + 6), HIGHLIGHT_COLOR)
+    return image
+
+
+def chart(observer, stars=(), constellations=(), planets=(), size=SIZE):
+    """PNG bytes of render(), cached by quantized location and time and by the highlight set."""
+    cat = catalog.snapshot()
+    key = chart_cache.key('CHART', '', observer) + (
+        cat.compiled.source_hash, size,
+        tuple(sorted({normalize(s) for s in stars if s})),
+        tuple(sorted({normalize(c) for c in constellations if c})),
+        tuple(sorted({normalize(p) for p in planets if p})))
+    hit, png = chart_cache.get(key)
+    if hit:
+        return png
+    image = render(observer, [s for s in stars if s], [c for c in constellations if c], [p for p in planets if p], size)
+    with tracing.span('chart.encode') as attrs:
+        png = encode_png(image)
+        attrs['bytes'] = len(png)
+    chart_cache.put(key, png)
+    return png
+
+
+def highlights(intents):
+    """Stars, constellations and planets named by llm_to_json intents, for chart()."""
+    found = {'stars': [], 'constellations': [], 'planets': []}
+    for intent in intents:
+        for field, kind in (('Star', 'stars'), ('Constellation', 'constellations'), ('Planet', 'planets')):
+            value = intent.get(field)
+            if isinstance(value, str) and value.strip() and value.strip() not in found[kind]:
+                found[kind].append(value.strip())
+    return found
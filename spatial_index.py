@@ -0,0 +1,129 @@
+"""
+Spherical spatial index over the catalog's unit vectors, for cone searches and
+nearest-neighbour queries ("what's near the Moon", "what's overhead").
+
+The sphere is cut into equal-area cells. The scheme is HEALPix-like but simpler:
+`bands` zones of equal height in z = sin(dec), which have equal area (Archimedes),
+each split into 2 * bands equal RA slices. Rows are sorted by cell, so a cell is a
+contiguous slice of the index (CSR offsets), and the cell count is chosen for
+about STARS_PER_CELL stars per cell.
+
+A cone search visits only the cells that can overlap the cone: the z bands its
+declination range spans and, in each band, the RA slices within the cone's RA
+half-width. The candidates are then checked exactly, with one dot product each.
+The work is O(cells touched + stars near the cone), not O(catalog).
+
+Nearest-neighbour queries start with a cone expected to hold about 2k stars and
+double its radius until k are inside, then sort by distance.
+
+The index works in the frame of the coordinates it was built from; StarStore
+maps apparent places of date onto the catalog's J2000 index.
+"""
+import os
+import numpy as np
+
+STARS_PER_CELL = int(os.getenv("STARGAZER_STARS_PER_CELL", "16"))
+
+
+def unit_vectors(ra, dec):
+    """(N, 3) unit vectors for RA/Dec arrays in radians."""
+    ra, dec = np.asarray(ra, dtype=float), np.asarray(dec, dtype=float)
+    cos_dec = np.cos(dec)
+    return np.column_stack([cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)])
+
+
+def _expand(starts, stops):
+    # concatenation of arange(start, stop) for every pair, without a Python loop
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.intp)
+    shifts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return np.arange(total, dtype=np.intp) + shifts
+
+
+class SpatialIndex:
+    def __init__(self, ra, dec, stars_per_cell=STARS_PER_CELL):
+        n = len(ra)
+        self.bands = max(1, int(np.sqrt(n / stars_per_cell / 2)))
+        self.slices = 2 * self.bands
+        vectors = unit_vectors(ra, dec)
+        cells = self._band(vectors[:, 2]) * self.slices + self._slice(np.asarray(ra, dtype=float))
+        # rows grouped by cell; each cell's rows (and their vectors) are the slice offsets[c]:offsets[c + 1]
+        self.rows = np.argsort(cells, kind='stable').astype(np.intp)
+        self.offsets = np.searchsorted(cells[self.rows], np.arange(self.bands * self.slices + 1))
+        self.vectors = np.ascontiguousarray(vectors[self.rows])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _band(self, z):
+        return np.clip(np.floor((np.asarray(z) + 1) / 2 * self.bands).astype(np.intp), 0, self.bands - 1)
+
+    def _slice(self, ra):
+        return np.floor(np.asarray(ra) % (2 * np.pi) / (2 * np.pi) * self.slices).astype(np.intp) % self.slices
+
+    def _candidates(self, ra, dec, radius):
+        """
+        Positions (into self.rows) of every row in a cell the cone (radians) may touch:
+        a (start, stop) range when whole bands are covered, else an array.
+        """
+        low, high = dec - radius, dec + radius
+        first, last = int(self._band(np.sin(max(low, -np.pi / 2)))), int(self._band(np.sin(min(high, np.pi / 2))))
+        whole_bands = (int(self.offsets[first * self.slices]), int(self.offsets[(last + 1) * self.slices]))
+        if low <= -np.pi / 2 or high >= np.pi / 2 or np.sin(radius) >= np.cos(dec):
+            return whole_bands  # the cone holds a pole: every RA slice of its bands
+
+        half_width = np.arcsin(np.sin(radius) / np.cos(dec))
+        start = int(np.floor((ra - half_width) / (2 * np.pi) * self.slices))
+        stop = int(np.floor((ra + half_width) / (2 * np.pi) * self.slices))
+        if stop - start + 1 >= self.slices:
+            return whole_bands
+        bands = np.arange(first, last + 1)
+        # [start, stop] may wrap past RA 0: split it into at most two runs of slices per band
+        start %= self.slices
+        stop %= self.slices
+        runs = [(start, stop)] if start <= stop else [(start, self.slices - 1), (0, stop)]
+        starts = np.concatenate([self.offsets[bands * self.slices + a] for a, _ in runs])
+        stops = np.concatenate([self.offsets[bands * self.slices + b + 1] for _, b in runs])
+        return _expand(starts, stops)
+
+    def cone(self, ra, dec, radius):
+        """Rows within `radius` degrees of (ra, dec) in radians and their separations (degrees), in no particular order."""
+        radius = np.radians(min(max(radius, 0.0), 180.0))
+        center = unit_vectors([ra], [dec])[0]
+        found = self._candidates(float(ra), float(dec), radius)
+        if isinstance(found, tuple):
+            # contiguous: test the vectors in place instead of gathering them
+            cosines = self.vectors[found[0]:found[1]] @ center
+            positions = np.flatnonzero(cosines >= np.cos(radius))
+            cosines = cosines[positions]
+            positions += found[0]
+        else:
+            cosines = self.vectors[found] @ center
+            inside = cosines >= np.cos(radius)
+            positions, cosines = found[inside], cosines[inside]
+        return self.rows[positions], np.degrees(np.arccos(np.clip(cosines, -1.0, 1.0)))
+
+    def nearest(self, ra, dec, k, keep=None):
+        """
+        The k rows closest to (ra, dec) in radians and their separations (degrees),
+        nearest first. `keep` is an optional boolean mask over catalog rows; rows
+        outside it are skipped.
+        """
+        available = len(self) if keep is None else int(np.count_nonzero(keep))
+        k = min(int(k), available)
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        # cone expected to hold ~2k of the allowed stars if they were spread evenly
+        fraction = min(1.0, 2.0 * k / available)
+        radius = np.degrees(np.arccos(1 - 2 * fraction))
+        while True:
+            rows, separations = self.cone(ra, dec, radius)
+            if keep is not None:
+                wanted = keep[rows]
+                rows, separations = rows[wanted], separations[wanted]
+            if len(rows) >= k or radius >= 180.0:
+                order = np.argsort(separations, kind='stable')[:k]
+                return rows[order], separations[order]
+            radius = min(2 * radius, 180.0)
@@ -1,96 +1,129 @@
-import math
-from datetime import datetime
-import pytz
-from pyDatalog import pyDatalog
-from user_state import user
+import contextvars
 import os
-
-terms = 'X, Y, Z, Star, Constellation, constellation, star, is_in_constellation'
-exec(f"from pyDatalog import pyDatalog; pyDatalog.create_terms('{terms}')", globals())
-
-def initialize_datalog():
-
-    pyDatalog.clear()
-
-    # Load facts from external file
-    star_path = os.path.join(os.path.dirname(__file__), 'star_facts.dlpy')
-    with open(star_path, 'r') as f:
-        facts_code = f.read()
-        exec(facts_code, globals())
-
-    constellation_path = os.path.join(os.path.dirname(__file__), 'constellation_facts.dlpy')
-    with open(constellation_path, 'r') as f:
-        facts_code = f.read()
-        exec(facts_code, globals())
-
-    # + constellation('orion')
-    # + constellation('lyra')
-    # + constellation('centaurus')
-    # + constellation('carina')
-
-    # # common name, bayer designation, constellation, ra, dec
-    # + star('betelgeuse', '58Alp Ori', 'orion', '05 55 10.3', '+07 24 25')
-    # + star('rigel', '19Bet Ori', 'orion', '05 14 32.3', '-08 12 06')
-    # + star('bellatrix', '24Gam Ori', 'orion', '05 25 07.9', '+06 20 59')
-    # + star('mintaka', '34Del Ori', 'orion', '05 32 00.4', '-00 17 57')
-    # + star('alnilam', '46Eps Ori', 'orion', '05 36 12.8', '-01 12 06')
-    # + star('alnitak', '50Zet Ori', 'orion', '05 40 45.5', '-01 56 33')
-    # + star('saiph', '53Kap Ori', 'orion', '05 47 45.4', '-09 40 11')
-    # + star('meissa', '39Lam Ori', 'orion', '05 35 08.3', '+09 56 03')
-
-    # + star('vega', '3Alp Lyr', 'lyra', '18 36 56.3', '+38 47 01')
-    # + star('sheliak', '12Bet Lyr', 'lyra', '18 50 04.8', '+33 21 46')
-    # + star('sulafat', '14Gam Lyr', 'lyra', '18 58 56.6', '+32 41 22')
-    # + star('delta lyrae', '10Del1 Lyr', 'lyra', '18 53 24.6', '+36 58 45')
-    # + star('epsilon lyrae', '4Eps1 Lyr', 'lyra', '18 44 20.3', '+39 40 12')
-    # + star('zeta lyrae', '9Zet Lyr', 'lyra', '18 58 56.7', '+37 36 19')
-    # + star('eta lyrae', '8Eta Lyr', 'lyra', '18 54 36.7', '+39 40 12')
-
-    # + star('rigil kentaurus', '21Alp Cen', 'centaurus', '14 39 36.5', '-60 50 02')
-    # + star('toliman', '21Alp1 Cen', 'centaurus', '14 39 36.1', '-60 50 08')
-    # + star('proxima centauri', 'V645 Cen', 'centaurus', '14 29 42.9', '-62 40 46')
-    # + star('hadar', '17Bet Cen', 'centaurus', '14 03 49.4', '-60 22 23')
-    # + star('muhlifain', '34Gam Cen', 'centaurus', '14 43 03.6', '-48 57 45')
-    # + star('epsilon centauri', '35Eps Cen', 'centaurus', '14 45 14.6', '-53 28 26')
-    # + star('theta centauri', '3The Cen', 'centaurus', '13 55 32.4', '-48 13 00')
-    # + star('iota centauri', '1Iot Cen', 'centaurus', '13 50 41.8', '-36 16 36')
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from user_info import UserInfo
+from catalog import catalog
+import planner
+import ephemeris
+import apparent_place
+from query_cache import QueryCache
+import tracing
+from catalog_file import format_ra, format_dec
+from visibility import (alt_az, visible_mask, rise_transit_set, best_window, to_datetime,
+                        radec_from_alt_az)
+
+# how far ahead "when can I see X" looks when no end time is given, and at most
+DEFAULT_WINDOW_HOURS = 12
+MAX_WINDOW_HOURS = 72
+# best times are only picked once the sun is this far down (end of nautical twilight)
+DARK_SUN_ALTITUDE = -12.0
+# "what's near X" / "what's at this point of the sky" defaults and caps
+DEFAULT_REGION_RADIUS = 10.0
+MAX_REGION_RADIUS = 90.0
+DEFAULT_NEAREST_COUNT = 5
+MAX_NEAREST_COUNT = 50
+# region answers list at most this many stars, brightest first (the count covers them all)
+MAX_REGION_STARS = 50
+
+# repeated questions from (nearly) the same place within the same minute; keyed by catalog
+# generation too, as the catalog may be reloaded by any of its callers
+query_cache = QueryCache(maxsize=2048, ttl=300, location_precision=0.01, time_bucket=60,
+                         generation=lambda: catalog.generation)
+
+# shared by every session: the intents of one message run concurrently on it
+query_pool = ThreadPoolExecutor(max_workers=int(os.getenv("STARGAZER_QUERY_WORKERS", "4")),
+                                thread_name_prefix='query')
+
+def initialize_catalog():
+    # The facts are loaded once per process by the shared catalog engine and
+    # only reloaded when star_facts.dlpy / constellation_facts.dlpy change on disk.
+    # Cached answers are keyed by catalog generation; clearing just frees the old ones early.
+    reloaded = catalog.ensure_loaded()
+    if reloaded:
+        query_cache.clear()
+    return reloaded
 
 # utils for reading llm json input
 
 class Query:
-    def __init__(self, constellation=None, star=None, ASKCONVIS=0, ASKSTAVIS=0, ASKSTAPAR=0, ASKCONCHI=0):
+    def __init__(self, observer=None, constellation=None, star=None, planet=None, ASKCONVIS=0, ASKSTAVIS=0, ASKSTAPAR=0,
+                 ASKCONCHI=0, ASKSTATIM=0, ASKCONTIM=0, ASKCONSEA=0, ASKPLAVIS=0, ASKCONE=0, ASKNEAR=0, start=None, end=None,
+                 ra=None, dec=None, altitude=None, azimuth=None, radius=None, count=None):
+        # the session's UserInfo; time-dependent answers are computed for this observer
+        self.observer = observer or UserInfo()
         self.constellation = constellation
         self.star = star
+        # a planet, the Sun or the Moon
+        self.planet = planet
         self.ASKCONVIS = ASKCONVIS
         self.ASKSTAVIS = ASKSTAVIS
         self.ASKSTAPAR = ASKSTAPAR
         self.ASKCONCHI = ASKCONCHI
+        self.ASKSTATIM = ASKSTATIM
+        self.ASKCONTIM = ASKCONTIM
+        self.ASKCONSEA = ASKCONSEA
+        self.ASKPLAVIS = ASKPLAVIS
+        self.ASKCONE = ASKCONE
+        self.ASKNEAR = ASKNEAR
+        # optional ISO times bounding ASKSTATIM / ASKCONTIM (default: the next 12 hours)
+        self.start = start
+        self.end = end
+        # where ASKCONE / ASKNEAR look when no star or planet is given: J2000 RA/Dec or
+        # altitude/azimuth for the observer (degrees); the cone radius and how many neighbours
+        self.ra = ra
+        self.dec = dec
+        self.altitude = altitude
+        self.azimuth = azimuth
+        self.radius = radius
+        self.count = count
 
     def update_from_json(self, json_data):
         key_map = {
             'constellation': 'constellation',
             'star': 'star',
+            'planet': 'planet',
             'askconvis': 'ASKCONVIS',
             'askstavis': 'ASKSTAVIS',
             'askstapar': 'ASKSTAPAR',
-            'askconchi': 'ASKCONCHI'
+            'askconchi': 'ASKCONCHI',
+            'askstatim': 'ASKSTATIM',
+            'askcontim': 'ASKCONTIM',
+            'askconsea': 'ASKCONSEA',
+            'askplavis': 'ASKPLAVIS',
+            'askcone': 'ASKCONE',
+            'asknear': 'ASKNEAR',
+            'start': 'start',
+            'end': 'end',
+            'ra': 'ra',
+            'dec': 'dec',
+            'altitude': 'altitude',
+            'azimuth': 'azimuth',
+            'radius': 'radius',
+            'count': 'count'
         }
 
         for raw_key, raw_value in json_data.items():
-            key = raw_key.strip().lower()
-            if key == "constellation" or key == "star":
+            # the LLM's JSON isn't always well typed: a number where a name belongs mustn't break the query
+            key = str(raw_key).strip().lower()
+            if key in ("constellation", "star", "planet"):
                 if raw_value:
-                    value = raw_value.strip().capitalize()
+                    value = str(raw_value).strip().capitalize()
                     setattr(self, key_map[key], value)
                 
             elif key in key_map:
                 setattr(self, key_map[key], raw_value)
     
     def handle_query(self):
-        initialize_datalog()
+        with tracing.span('query', star=self.star, constellation=self.constellation, planet=self.planet):
+            initialize_catalog()
+            return self._answer()
+
+    def _answer(self):
         if self.ASKSTAVIS:
             if self.star is not None:
-                return is_star_visible(self.star)
+                return is_star_visible(self.star, self.observer)
         
         if self.ASKSTAPAR:
             if self.star is not None:
@@ -98,188 +131,487 @@ class Query:
             
         if self.ASKCONVIS:
             if self.constellation is not None:
-                return is_constellation_visible(self.constellation)
+                return is_constellation_visible(self.constellation, self.observer)
             
         if self.ASKCONCHI:
             if self.constellation is not None:
                 return get_constellation_stars(self.constellation)
 
-def calculate_lst(longitude, time):
-    # Julian date for the given time
-    jd = (time - datetime(2000, 1, 1, 12, tzinfo=pytz.UTC)).total_seconds() / 86400.0 + 2451545.0
-    t = (jd - 2451545.0) / 36525.0
-    gst = 280.46061837 + 360.98564736629 * (jd - 2451545.0) + 0.000387933 * t**2 - t**3 / 38710000.0
-    gst %= 360
-    lst = (gst + longitude) % 360
-    return lst
-
-def hms_to_degrees(ra_hms, dec_dms):
-    # Split the RA and Dec into components
-    ra_h, ra_m, ra_s = map(float, ra_hms.split())
-    dec_d, dec_m, dec_s = map(float, dec_dms.split())
-    
-    # Convert RA to decimal degrees
-    ra_deg = 15 * (ra_h + ra_m / 60 + ra_s / 3600)
-    
-    # Convert Dec to decimal degrees (accounting for negative values)
-    if dec_d < 0:
-        dec_deg = dec_d - dec_m / 60 - dec_s / 3600
-    else:
-        dec_deg = dec_d + dec_m / 60 + dec_s / 3600
-    
-    return ra_deg, dec_deg
+        if self.ASKSTATIM:
+            if self.star is not None:
+                return get_star_times(self.star, self.observer, self.start, self.end)
 
-def calculate_star_visibility(ra, dec, longitude, latitude, time):
-    # Convert to degrees
-    ra, dec = hms_to_degrees(ra, dec)
+        if self.ASKCONTIM:
+            if self.constellation is not None:
+                return get_constellation_times(self.constellation, self.observer, self.start, self.end)
 
-    # Calculate the LST for the given location and time
-    lst = calculate_lst(longitude, time)
-    
-    # Calculate the hour angle (HA)
-    ha = (lst - ra) % 360
-    if ha > 180:  # Ensure HA is in the range [-180, 180]
-        ha -= 360
-    
-    # Convert to radians for the altitude calculation
-    ha_rad = math.radians(ha)
-    dec_rad = math.radians(dec)
-    lat_rad = math.radians(latitude)
-    
-    # Calculate altitude
-    alt = math.degrees(math.asin(
-        math.sin(dec_rad) * math.sin(lat_rad) +
-        math.cos(dec_rad) * math.cos(lat_rad) * math.cos(ha_rad)
-    ))
-
-    alt_rad = math.asin(math.sin(dec_rad) * math.sin(lat_rad) +
-                        math.cos(dec_rad) * math.cos(lat_rad) * math.cos(ha_rad))
-    alt = math.degrees(alt_rad)
-
-    # Calculate Azimuth
-    sin_az = -math.cos(dec_rad) * math.sin(ha_rad) / math.cos(alt_rad)
-    cos_az = (math.sin(dec_rad) - math.sin(alt_rad) * math.sin(lat_rad)) / (math.cos(alt_rad) * math.cos(lat_rad))
-    
-    az = math.degrees(math.atan2(sin_az, cos_az))
-    az = (az + 360) % 360  # Ensure Azimuth is in the range [0, 360]
+        if self.ASKCONSEA:
+            if self.constellation is not None:
+                return get_constellation_season(self.constellation, self.observer)
+
+        if self.ASKPLAVIS:
+            if self.planet is not None:
+                return get_planet(self.planet, self.observer)
+
+        if self.ASKCONE or self.ASKNEAR:
+            center = {'star': self.star, 'planet': self.planet, 'ra': self.ra, 'dec': self.dec,
+                      'altitude': self.altitude, 'azimuth': self.azimuth}
+            if self.ASKNEAR:
+                return get_nearest_stars(self.observer, self.count, **center)
+            return get_region_stars(self.observer, self.radius, **center)
+
+def run_queries(intents, observer):
+    """
+    Run one Query per intent concurrently on the shared pool. Results come back
+    in intent order; intents that produce no answer are left out.
+    """
+    def run(intent):
+        query = Query(observer)
+        query.update_from_json(intent)
+        return query.handle_query()
+
+    # each task runs in a copy of the caller's context, so its spans land in the caller's trace
+    futures = [query_pool.submit(contextvars.copy_context().run, run, intent) for intent in intents]
+    return [result for result in (future.result() for future in futures) if result is not None]
+
+def _sky(observer):
+    # twilight and moonlight at the observer's place and time (see ephemeris.sky)
+    return ephemeris.sky(observer.longitude, observer.latitude, observer.time.timestamp(), observer.limiting_magnitude)
+
+def _sky_summary(sky):
+    return {
+        'sky': sky['darkness'],
+        'sun_altitude': round(sky['sun_altitude'], 1),
+        'moon_altitude': round(sky['moon_altitude'], 1),
+        'moon_illumination': round(sky['moon_illumination'], 2),
+        'limiting_magnitude': sky['limiting_magnitude'],
+    }
 
-    # Return true if the altitude is above the horizon
-    return alt > 0, alt, az
+def _dark(observer):
+    # grid times when the sun is down far enough for stargazing (for best_window)
+    return lambda seconds: ephemeris.sun_altitude(observer.longitude, observer.latitude, seconds) < DARK_SUN_ALTITUDE
 
-def is_star_visible(star_name):
-    # Query the database for the star by name
-    result = pyDatalog.ask(f"star('{star_name}', Bayer, Constellation, RA, Dec)")
-    
-    if not result:
-        print(f"Star '{star_name}' not found in the database.")
+@query_cache.cached('ASKSTAVIS', with_observer=True)
+def is_star_visible(star_name, observer):
+    cat = catalog.snapshot()
+
+    # Resolve the star by name, alias or designation
+    row = cat.resolve_star(star_name)
+
+    if row is None:
         return {'name': star_name,
         'visible': 'star not in database'
          }
 
-    # Extract the first (and should be only) result
-    bayer, constellation, ra, dec = result.answers[0]
+    bayer, constellation = cat.bayer[row], cat.constellations[row]
 
-    # Calculate visibility
-    is_visible, alt, az = calculate_star_visibility(ra, dec, user.longitude, user.latitude, user.time)
+    # Calculate visibility from the apparent place of date (radians; cached per day for the whole catalog)
+    ra, dec = cat.apparent(observer.time)
+    visible, alt, az = visible_mask(ra[row:row + 1], dec[row:row + 1], observer.longitude, observer.latitude, observer.time)
+    is_visible, alt, az = bool(visible[0]), float(alt[0]), float(az[0])
 
-    # Return result as a dictionary or tuple
-    dict = {'name': star_name,
-        'bayer': bayer,
-        'constellation': constellation,
-        'visible': is_visible,
-        'altitude': alt,
-        'azimuth': az
-    }
+    # above the horizon but fainter than the observer's sky (light pollution, twilight, moonlight) allows
+    sky = _sky(observer)
+    magnitude = cat.magnitude_of(row)
+    limit = sky['limiting_magnitude']
+    too_faint = ((limit is not None and magnitude is not None and magnitude > limit)
+                 or bool(ephemeris.washed_out(cat.magnitude[row:row + 1], sky, ra[row:row + 1], dec[row:row + 1])[0]))
 
-    print(dict)
-
-    return {
-        'name': star_name,
+    result = {
+        'name': cat.display_name(row),
         'bayer': bayer,
         'constellation': constellation,
-        'visible': is_visible,
+        'visible': is_visible and not too_faint,
+        'too_faint': too_faint,
+        'magnitude': magnitude,
+        # no magnitude to judge by: kept, and said so
+        'magnitude_unknown': magnitude is None,
+        'spectral_type': cat.spectral_types[row] or None,
         'altitude': alt,
         'azimuth': az
     }
+    result.update(_sky_summary(sky))
+    return result
 
-def is_constellation_visible(constellation_name):
-    result = pyDatalog.ask(f"star(Star, Bayer, '{constellation_name}', RA, Dec)")
+@query_cache.cached('ASKCONVIS', with_observer=True)
+def is_constellation_visible(constellation_name, observer):
+    cat = catalog.snapshot()
+    members = cat.constellation_range(constellation_name)
 
-    if not result or not result.answers:
-        print(f"Constellation '{constellation_name}' not found in the database.")
+    if members is None or members[0] == members[1]:
         return {'name': constellation_name,
         'visible': 'constellation not in database'
          }
-    
+
+    # binary-search cut to the members bright enough for the observer's sky, before any trig
+    sky = _sky(observer)
+    start, stop = cat.constellation_range(constellation_name, sky['limiting_magnitude'])
+    ra, dec = cat.apparent(observer.time)
+    visible, alt, az = visible_mask(ra[start:stop], dec[start:stop], observer.longitude, observer.latitude, observer.time)
+    washed_out = ephemeris.washed_out(cat.magnitude[start:stop], sky, ra[start:stop], dec[start:stop])
+    visible &= ~washed_out
+
     visible_stars = []
-    for star, bayer, ra, dec in result.answers:
-        is_visible, alt, az = calculate_star_visibility(ra, dec, user.longitude, user.latitude, user.time)
-        if is_visible:
-            visible_stars.append({
-                'name': star,
-                'bayer': bayer,
-                'altitude': alt,
-                'azimuth': az
-            })
+    for i in visible.nonzero()[0]:
+        visible_stars.append({
+            'name': cat.names[start + i],
+            'bayer': cat.bayer[start + i],
+            'magnitude': cat.magnitude_of(start + i),
+            'altitude': float(alt[i]),
+            'azimuth': float(az[i])
+        })
 
-    return {
-        'constellation': constellation_name,
+    result = {
+        'constellation': cat.constellations[members[0]],
         'visible': len(visible_stars) > 0,
         'stars_visible': visible_stars
     }
+    result.update(_sky_summary(sky))
+    result['stars_too_faint'] = int(members[1] - stop + washed_out.sum())
+    return result
 
+@query_cache.cached('ASKCONCHI')
 def get_constellation_stars(constellation_name):
-    result = pyDatalog.ask(f"star(Star, Bayer, '{constellation_name}', RA, Dec)")
+    cat = catalog.snapshot()
+    rows = cat.constellation_range(constellation_name)
 
-    if not result or not result.answers:
+    if rows is None or rows[0] == rows[1]:
         return {
             'constellation': constellation_name,
             'stars': 'constellation not in database'
         }
     
     stars = []
-    for star, bayer, ra, dec in result.answers:
+    for row in range(*rows):
         stars.append({
-            'name': star,
-            'bayer': bayer,
-            'ra': ra,
-            'dec': dec
+            'name': cat.names[row],
+            'bayer': cat.bayer[row],
+            'magnitude': cat.magnitude_of(row),
+            'spectral_type': cat.spectral_types[row] or None,
+            'ra': format_ra(cat.ra[row]),
+            'dec': format_dec(cat.dec[row])
         })
 
-    dict = {
-        'constellation': constellation_name,
-        'stars': stars
-    }
-
-    print(dict)
-
     return {
-        'constellation': constellation_name,
+        'constellation': cat.constellations[rows[0]],
         'stars': stars
     }
 
+@query_cache.cached('ASKSTAPAR')
 def get_star_constellation(star_name):
-    result = pyDatalog.ask(f"star('{star_name}', Bayer, Constellation, RA, Dec)")
+    cat = catalog.snapshot()
+    row = cat.resolve_star(star_name)
 
-    if not result or not result.answers:
+    if row is None:
         return {
             'star': star_name,
             'visible': 'star not in database'
         }
     
-    constellation = result.answers[0]
+    constellation = cat.constellations[row]
 
-    dict = {
-        'star': star_name,
+    return {
+        'star': cat.display_name(row),
         'constellation': constellation
     }
 
-    print(dict)
+def _as_time(observer, value):
+    # an ISO string or datetime, naive ones taken in the observer's time zone; None if it isn't a time
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip())
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    zone = observer.time.tzinfo
+    if value.tzinfo is None and zone is not None:
+        value = zone.localize(value) if hasattr(zone, 'localize') else value.replace(tzinfo=zone)
+    return value
+
+def _time_window(observer, start, end):
+    # unix seconds for the [start, end] window of a rise/set query; anything unparseable
+    # (or an end before the start) falls back to observer.time and DEFAULT_WINDOW_HOURS.
+    # The window comes from the LLM or the HTTP body, so it is cut to MAX_WINDOW_HOURS
+    # (the answer's window_end says where it ended)
+    start = _as_time(observer, start) or observer.time
+    end = _as_time(observer, end)
+    if end is None or end <= start:
+        end = start + timedelta(hours=DEFAULT_WINDOW_HOURS)
+    end = min(end, start + timedelta(hours=MAX_WINDOW_HOURS))
+    return start.timestamp(), end.timestamp()
+
+def _iso(seconds, start=None, end=None):
+    # ISO time, or None if the event doesn't happen (inside the window)
+    if seconds is None or np.isnan(seconds):
+        return None
+    if start is not None and not start <= seconds <= end:
+        return None
+    return to_datetime(seconds).isoformat(timespec='minutes')
+
+def _times_summary(ra, dec, observer, start, end):
+    events = rise_transit_set(ra, dec, observer.longitude, observer.latitude, start)
+    summary = {
+        'window_start': _iso(start),
+        'window_end': _iso(end),
+        'rise': _iso(events['rise'][0], start, end),
+        'transit': _iso(events['transit'][0], start, end),
+        'set': _iso(events['set'][0], start, end),
+        'transit_altitude': float(events['transit_altitude'][0]),
+        'circumpolar': bool(events['circumpolar'][0]),
+        'never_rises': bool(events['never_rises'][0])
+    }
+    return summary
+
+def get_star_times(star_name, observer, start=None, end=None):
+    cat = catalog.snapshot()
+    row = cat.resolve_star(star_name)
+
+    if row is None:
+        return {'name': star_name,
+        'times': 'star not in database'
+         }
+
+    start, end = _time_window(observer, start, end)
+    ra, dec = cat.apparent(start)
+    ra, dec = ra[row:row + 1], dec[row:row + 1]
+
+    result = {'name': cat.display_name(row)}
+    result.update(_times_summary(ra, dec, observer, start, end))
+
+    window = best_window(ra, dec, observer.longitude, observer.latitude, start, end, times_ok=_dark(observer))
+    result['best_time'] = _iso(window['best_time']) if window else None
+    result['peak_altitude'] = window['mean_altitude_at_best'] if window else None
+    result['visible_from'] = _iso(window['window_start']) if window else None
+    result['visible_until'] = _iso(window['window_end']) if window else None
+    return result
+
+def get_constellation_times(constellation_name, observer, start=None, end=None):
+    cat = catalog.snapshot()
+    rows = cat.constellation_range(constellation_name)
+
+    if rows is None or rows[0] == rows[1]:
+        return {'constellation': constellation_name,
+        'times': 'constellation not in database'
+         }
+
+    start, end = _time_window(observer, start, end)
+    places = cat.apparent(start)
+    ra, dec = places[0][rows[0]:rows[1]], places[1][rows[0]:rows[1]]
+
+    # rise/transit/set of the constellation's center (mean of the members' unit vectors)
+    x, y, z = (np.cos(dec) * np.cos(ra)).sum(), (np.cos(dec) * np.sin(ra)).sum(), np.sin(dec).sum()
+    center_ra = np.array([np.arctan2(y, x) % (2 * np.pi)])
+    center_dec = np.array([np.arctan2(z, np.hypot(x, y))])
+
+    result = {'constellation': cat.constellations[rows[0]]}
+    result.update(_times_summary(center_ra, center_dec, observer, start, end))
+
+    # best time to look: when the most member stars (bright enough to see) are up after dark, from one time x star grid
+    bright = cat.constellation_range(constellation_name, observer.limiting_magnitude)
+    ra, dec = places[0][bright[0]:bright[1]], places[1][bright[0]:bright[1]]
+    window = best_window(ra, dec, observer.longitude, observer.latitude, start, end,
+                         times_ok=_dark(observer)) if len(ra) else None
+    result['best_time'] = _iso(window['best_time']) if window else None
+    result['stars_up_at_best'] = window['stars_up_at_best'] if window else 0
+    result['total_stars'] = bright[1] - bright[0]
+    result['best_window_start'] = _iso(window['window_start']) if window else None
+    result['best_window_end'] = _iso(window['window_end']) if window else None
+    return result
+
+def get_constellation_season(constellation_name, observer, min_altitude=planner.DEFAULT_MIN_ALTITUDE):
+    # served from the per-location year table, built once per (quantized) location
+    table = planner.year_table(observer.latitude, observer.longitude, observer.time.year, min_altitude)
+    monthly = table.monthly(constellation_name)
+
+    if monthly is None:
+        return {'constellation': constellation_name,
+        'season': 'constellation not in database'
+         }
+
+    months = [{'month': month, 'fraction_up_at_midnight': round(fraction, 2), 'hours_per_night': round(hours, 1)}
+              for month, fraction, hours in monthly]
+    best = [month['month'] for month in sorted(months, key=lambda m: (-m['fraction_up_at_midnight'], -m['hours_per_night']))
+            if month['fraction_up_at_midnight'] > 0][:3]
 
     return {
-        'star': star_name,
-        'constellation': constellation
+        'constellation': table.store.constellation(constellation_name),
+        'min_altitude': min_altitude,
+        'best_months': best,
+        'months': months
+    }
+
+@query_cache.cached('ASKPLAVIS', with_observer=True)
+def get_planet(planet_name, observer):
+    body = planet_name.strip().lower()
+    if body not in ephemeris.BODIES:
+        return {'name': planet_name,
+        'visible': 'not a naked-eye planet, the Sun or the Moon'
+         }
+
+    seconds = observer.time.timestamp()
+    ra, dec, distance = ephemeris.radec(body, seconds)
+    alt, az = ephemeris.alt_az(body, observer.longitude, observer.latitude, seconds)
+    alt, az = float(alt[0]), float(az[0])
+    magnitude = float(ephemeris.magnitude(body, seconds)[0])
+    sky = _sky(observer)
+
+    # planets are bright, so the cut is just twilight / moonlight / light pollution against their magnitude
+    up = alt > ephemeris.horizon(body)
+    limit = sky['limiting_magnitude']
+    too_faint = body != 'sun' and limit is not None and magnitude > limit
+    events = ephemeris.rise_transit_set(body, observer.longitude, observer.latitude, seconds)
+
+    result = {
+        'name': body.capitalize(),
+        'visible': up and not too_faint,
+        'too_faint': too_faint,
+        'magnitude': round(magnitude, 1),
+        'altitude': alt,
+        'azimuth': az,
+        'ra': format_ra(ra[0]),
+        'dec': format_dec(dec[0]),
+        'rise': _iso(events['rise']),
+        'transit': _iso(events['transit']),
+        'set': _iso(events['set']),
+        'max_altitude_next_24h': events['max_altitude'],
     }
+    if body == 'moon':
+        result['distance_km'] = round(float(distance[0]) * 149597870.7)
+        result['phase'] = ephemeris.moon_phase(seconds)
+        result['illumination'] = round(sky['moon_illumination'], 2)
+    else:
+        result['distance_au'] = round(float(distance[0]), 3)
+    if body in ephemeris.PLANETS:
+        result['elongation_from_sun'] = round(float(ephemeris.elongation(body, seconds)[0]), 1)
+    result.update(_sky_summary(sky))
+    return result
+
+def _number(value):
+    # numeric intent fields arrive as numbers, strings or ""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if np.isnan(value) else value
+
+def _region_center(cat, observer, star=None, planet=None, ra=None, dec=None, altitude=None, azimuth=None):
+    """
+    Apparent RA/Dec of date (radians) of the point a region query is about, a description
+    of it, and the catalog row to leave out of the answer (the star itself), or None.
+    A star or planet wins over J2000 RA/Dec, which wins over altitude/azimuth.
+    """
+    if star:
+        row = cat.resolve_star(star)
+        if row is None:
+            return None
+        apparent_ra, apparent_dec = cat.apparent_rows([row], observer.time)
+        return float(apparent_ra[0]), float(apparent_dec[0]), {'star': cat.display_name(row)}, row
+    if planet:
+        body = planet.strip().lower()
+        if body not in ephemeris.BODIES:
+            return None
+        body_ra, body_dec, _ = ephemeris.radec(body, observer.time.timestamp())
+        return float(body_ra[0]), float(body_dec[0]), {'planet': body.capitalize()}, None
+    ra, dec = _number(ra), _number(dec)
+    if ra is not None and dec is not None:
+        apparent_ra, apparent_dec = apparent_place.apparent(np.radians([ra]), np.radians([dec]), 0.0, 0.0, observer.time)
+        return float(apparent_ra[0]), float(apparent_dec[0]), {'ra': format_ra(np.radians(ra)), 'dec': format_dec(np.radians(dec))}, None
+    altitude, azimuth = _number(altitude), _number(azimuth)
+    if altitude is not None:
+        azimuth = (azimuth or 0.0) % 360  # no azimuth: only meaningful near the zenith
+        center_ra, center_dec = radec_from_alt_az(altitude, azimuth, observer.longitude, observer.latitude, observer.time)
+        return float(center_ra), float(center_dec), {'altitude': altitude, 'azimuth': azimuth}, None
+    return None
+
+def _nearby_bodies(ra, dec, seconds, within, skip=None):
+    # the Moon and planets (and the Sun) within `within` degrees: often the "bright star" people mean
+    bodies = []
+    for body in ephemeris.BODIES:
+        if body == skip:
+            continue
+        body_ra, body_dec, _ = ephemeris.radec(body, seconds)
+        distance = float(ephemeris.separation(body_ra[0], body_dec[0], ra, dec))
+        if distance <= within:
+            bodies.append({'name': body.capitalize(), 'separation': round(distance, 2),
+                           'magnitude': round(float(ephemeris.magnitude(body, seconds)[0]), 1)})
+    return sorted(bodies, key=lambda b: b['separation'])
+
+def _region_result(cat, observer, sky, center, rows, separations):
+    # shared by the cone and nearest-neighbour answers; only these rows' apparent places are needed
+    ra, dec = cat.apparent_rows(rows, observer.time)
+    alt, az = alt_az(ra, dec, observer.longitude, observer.latitude, observer.time)
+    up = (alt > 0) & ~ephemeris.washed_out(cat.magnitude[rows], sky, ra, dec)
+    stars = []
+    for i, row in enumerate(rows):
+        stars.append({
+            # the designation stands in for a missing name: "the star nearest X" is an answer even unnamed
+            'name': cat.display_name(row),
+            'bayer': cat.bayer[row],
+            'constellation': cat.constellations[row],
+            'magnitude': cat.magnitude_of(row),
+            'separation': round(float(separations[i]), 2),
+            'altitude': float(alt[i]),
+            'azimuth': float(az[i]),
+            'visible': bool(up[i])
+        })
+    center_ra, center_dec, described, _ = center
+    center_alt, center_az = alt_az([center_ra], [center_dec], observer.longitude, observer.latitude, observer.time)
+    result = {'center': dict(described, altitude=float(center_alt[0]), azimuth=float(center_az[0])), 'stars': stars}
+    result.update(_sky_summary(sky))
+    return result
+
+def get_region_stars(observer, radius=None, **center):
+    """Stars within `radius` degrees of a star, planet, J2000 RA/Dec or altitude/azimuth, brightest first."""
+    cat = catalog.snapshot()
+    radius = min(_number(radius) or DEFAULT_REGION_RADIUS, MAX_REGION_RADIUS)
+    found = _region_center(cat, observer, **center)
+    if found is None:
+        return {'region': {k: v for k, v in center.items() if v not in (None, '')},
+                'stars': 'position not understood or object not in database'}
+
+    # spatial index lookup, then only the stars bright enough for the observer's sky
+    sky = _sky(observer)
+    rows, separations = cat.cone(found[0], found[1], radius, observer.time)
+    if found[3] is not None:
+        rows, separations = rows[rows != found[3]], separations[rows != found[3]]
+    limit = sky['limiting_magnitude']
+    faint = cat.magnitude[rows] > limit if limit is not None else np.zeros(len(rows), dtype=bool)
+    rows, separations = rows[~faint], separations[~faint]
+    # brightest first (unknown magnitudes last), nearest first among equals
+    order = np.argsort(np.nan_to_num(cat.magnitude[rows], nan=np.inf), kind='stable')[:MAX_REGION_STARS]
+
+    result = _region_result(cat, observer, sky, found, rows[order], separations[order])
+    result['radius'] = radius
+    result['stars_count'] = len(rows)
+    result['stars_too_faint'] = int(faint.sum())
+    result['planets_nearby'] = _nearby_bodies(found[0], found[1], observer.time.timestamp(), radius,
+                                              skip=(center.get('planet') or '').strip().lower())
+    return result
+
+def get_nearest_stars(observer, count=None, **center):
+    """The `count` stars closest to a star, planet, J2000 RA/Dec or altitude/azimuth that the observer's sky allows."""
+    cat = catalog.snapshot()
+    count = int(min(max(_number(count) or DEFAULT_NEAREST_COUNT, 1), MAX_NEAREST_COUNT))
+    found = _region_center(cat, observer, **center)
+    if found is None:
+        return {'near': {k: v for k, v in center.items() if v not in (None, '')},
+                'stars': 'position not understood or object not in database'}
+
+    sky = _sky(observer)
+    limit = sky['limiting_magnitude']
+    keep = None
+    if limit is not None or found[3] is not None:
+        keep = ~(cat.magnitude > limit) if limit is not None else np.ones(len(cat), dtype=bool)
+        if found[3] is not None:
+            keep[found[3]] = False
+    rows, separations = cat.nearest(found[0], found[1], count, observer.time, keep)
+
+    result = _region_result(cat, observer, sky, found, rows, separations)
+    within = float(separations[-1]) if len(separations) else DEFAULT_REGION_RADIUS
+    result['planets_nearby'] = _nearby_bodies(found[0], found[1], observer.time.timestamp(), within,
+                                              skip=(center.get('planet') or '').strip().lower())
+    return result
 
 '''
 Questions that can be answered:
@@ -287,4 +619,10 @@ Questions that can be answered:
 - is ____ constellation visible?
 - what stars are in ____ constellation?
 - what constellation does ____ star belong to?
+- when does ____ star rise/set, and when is it best seen?
+- when is ____ constellation best seen tonight?
+- which months are best to see ____ constellation?
+- is ____ planet (or the sun / moon) up, how bright, when does it rise/set?
+- what stars are near ____ (a star, planet, the moon, a point in the sky)?
+- what is overhead / 10 degrees above the eastern horizon?
 '''
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""
+Name resolution for catalog stars.
+
+Every star is indexed under its normalized primary name, its Bayer/Flamsteed
+designation (with and without the Flamsteed number, Greek letters abbreviated
+or spelled out, constellation abbreviated or spelled out) and the SIMBAD-style
+alias the ingestion stored for unnamed stars ('* lam Cet', 'V* MU Lyr').
+Exact lookups are a dict hit; misspellings fall back to a trigram index and a
+bounded edit distance, so sloppy LLM output still resolves locally.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+
+GREEK = {
+    'alp': 'alpha', 'bet': 'beta', 'gam': 'gamma', 'del': 'delta', 'eps': 'epsilon', 'zet': 'zeta',
+    'eta': 'eta', 'the': 'theta', 'iot': 'iota', 'kap': 'kappa', 'lam': 'lambda', 'mu': 'mu',
+    'nu': 'nu', 'xi': 'xi', 'omi': 'omicron', 'pi': 'pi', 'rho': 'rho', 'sig': 'sigma', 'tau': 'tau',
+    'ups': 'upsilon', 'phi': 'phi', 'chi': 'chi', 'psi': 'psi', 'ome': 'omega',
+}
+
+# SIMBAD spells a few Greek letters differently ('* alf01 Cru', '* tet Aur', '* ksi Pup')
+SIMBAD_GREEK = {'alf': 'alp', 'tet': 'the', 'ksi': 'xi'}
+SIMBAD_SPELLING = {ours: theirs for theirs, ours in SIMBAD_GREEK.items()}
+
+# household names that SIMBAD lists after another NAME entry, so the ingestion
+# stored the other one ('Dog Star', 'Lodestar') or none at all
+WELL_KNOWN = {
+    'Sirius': '9Alp CMa',
+    'Polaris': '1Alp UMi',
+    'North Star': '1Alp UMi',
+    'Hadar': 'Bet Cen',
+    'Acrux': 'Alp1Cru',
+    'Albireo': '6Bet1Cyg',
+    'Alcor': '80    UMa',
+}
+
+_BAYER_RE = re.compile(r"^(\d*)\s*([A-Za-z]{2,3})?\s*(\d?)\s*([A-Za-z]{3})$")
+_SIMBAD_PREFIX_RE = re.compile(r"^(?:V\*|\*\*|\*)\s+")
+_SIMBAD_LETTER_RE = re.compile(r"^([a-z]+)\.?0*(\d*)$")
+
+
+def normalize(name):
+    """Fold case, accents, punctuation and whitespace: 'Rigil  Kentaurus' -> 'rigilkentaurus'."""
+    name = unicodedata.normalize('NFKD', str(name))
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    return re.sub(r'[^0-9a-z]', '', name.lower())
+
+
+def parse_bayer(bayer):
+    """'91Lam Cet' -> ('91', 'lam', '', 'Cet'); '12Del2Lyr' -> ('12', 'del', '2', 'Lyr')."""
+    match = _BAYER_RE.match(bayer.strip())
+    if not match:
+        return None
+    flamsteed, greek, number, abbr = match.groups()
+    return flamsteed, (greek or '').lower(), number, abbr
+
+
+def bayer_aliases(bayer, constellation):
+    parsed = parse_bayer(bayer)
+    if parsed is None:
+        return {normalize(bayer)}
+    flamsteed, greek, number, abbr = parsed
+
+    constellation_forms = {abbr, constellation}
+    greek_forms = {greek, GREEK.get(greek, greek), SIMBAD_SPELLING.get(greek, greek)} if greek else set()
+
+    aliases = {normalize(bayer)}
+    for con in constellation_forms:
+        if flamsteed:
+            aliases.add(normalize(f"{flamsteed} {con}"))
+        for letter in greek_forms:
+            aliases.add(normalize(f"{letter} {number} {con}"))
+            if number:
+                # 'eps lyr' also finds eps1/eps2 lyr
+                aliases.add(normalize(f"{letter} {con}"))
+    return aliases
+
+
+def simbad_aliases(name):
+    """'* lam Cet' -> {'lamcet', 'lambdacet'}; '* alf01 Cru' -> {'alf01cru', 'alp1cru', 'alpha1cru'}"""
+    stripped = _SIMBAD_PREFIX_RE.sub('', name.strip())
+    aliases = {normalize(stripped)}
+    parts = stripped.split()
+    match = _SIMBAD_LETTER_RE.match(parts[0].lower()) if parts else None
+    if match:
+        letter, number = match.groups()
+        letter = SIMBAD_GREEK.get(letter, letter)
+        if letter in GREEK:
+            for form in (letter, GREEK[letter]):
+                aliases.add(normalize(' '.join([form + number] + parts[1:])))
+    return aliases
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_edit_distance(a, b, limit):
+    """Levenshtein distance, or limit + 1 as soon as it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class NameIndex:
+    def __init__(self, names, bayer, constellations, max_distance=2, max_candidates=20):
+        self.max_distance = max_distance
+        self.max_candidates = max_candidates
+        self._rows = defaultdict(list)        # normalized key -> star rows
+        self._primary = set()                 # keys that are a star's proper name
+        self._trigrams = defaultdict(set)     # trigram -> keys
+        well_known = defaultdict(set)
+        for name, designation in WELL_KNOWN.items():
+            well_known[normalize(designation)].add(normalize(name))
+
+        for row, (name, designation, constellation) in enumerate(zip(names, bayer, constellations)):
+            keys = bayer_aliases(designation, constellation)
+            for primary in well_known.get(normalize(designation), ()):
+                keys.add(primary)
+                self._primary.add(primary)
+            if name and name != 'None':
+                if name.startswith(('*', 'V*')):
+                    keys |= simbad_aliases(name)
+                else:
+                    primary = normalize(name)
+                    keys.add(primary)
+                    self._primary.add(primary)
+            for key in keys:
+                if key:
+                    self._rows[key].append(row)
+
+        for key in self._rows:
+            for gram in trigrams(key):
+                self._trigrams[gram].add(key)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def lookup(self, name):
+        """Exact (normalized) lookup. Returns the list of matching rows."""
+        return self._rows.get(normalize(name), [])
+
+    def fuzzy(self, name):
+        """Closest key within the edit-distance bound, or None."""
+        key = normalize(name)
+        if not key or key == 'none':
+            return None
+        limit = 1 if len(key) <= 5 else self.max_distance
+
+        shared = defaultdict(int)
+        for gram in trigrams(key):
+            for candidate in self._trigrams.get(gram, ()):
+                shared[candidate] += 1
+        ranked = sorted(shared.items(), key=lambda item: -item[1])[:self.max_candidates]
+
+        best, best_distance = None, limit + 1
+        for candidate, _ in ranked:
+            distance = bounded_edit_distance(key, candidate, limit)
+            # prefer proper names when two keys are equally close
+            if distance < best_distance or (distance == best_distance and candidate in self._primary
+                                            and best not in self._primary):
+                best, best_distance = candidate, distance
+        return best
+
+    def resolve(self, name):
+        """Row of the star called `name`, trying exact then fuzzy matching. None if nothing is close."""
+        rows = self.lookup(name)
+        if not rows:
+            key = self.fuzzy(name)
+            rows = self._rows.get(key, []) if key else []
+        return rows[0] if rows else None
@@ -0,0 +1,194 @@
+"""
+In-memory relational store for the star(Name, Bayer, Constellation, RA, Dec) and
+constellation(Name) predicates.
+
+Built once per catalog load on top of the compiled catalog's columns:
+- hash indexes for constellation names here and for star names, aliases and
+  designations in star_names.NameIndex, so lookups never unify against the
+  whole relation
+- each constellation's members are the contiguous slice [start, stop) of the
+  catalog rows, so "stars in X" is an index range, not a scan
+- members are sorted by magnitude, so a limiting-magnitude cut is a binary
+  search that shortens the slice before any trig runs (same for the whole
+  catalog through the global brightness order)
+- queries take their arguments as parameters; nothing is built from f-strings,
+  so quotes in names are just data
+- a spherical cell index (spatial_index.py) over the J2000 positions answers
+  "stars near this point of the sky" without touching the rest of the catalog
+"""
+import numpy as np
+from catalog_file import magnitude_key
+from star_names import NameIndex, normalize, bounded_edit_distance
+import tracing
+from apparent_place import apparent_places, mean_place, julian_centuries, ABERRATION
+from spatial_index import SpatialIndex, unit_vectors
+
+
+class StarStore:
+    def __init__(self, compiled):
+        self.compiled = compiled
+        names, bayer = list(compiled.names), list(compiled.bayer)
+        constellations = list(compiled.constellations)
+
+        self.constellation_names = list(compiled.constellation_names)
+        self._constellation_ids = {}
+        for cid, name in enumerate(self.constellation_names):
+            self._constellation_ids[name] = cid
+            self._constellation_ids[normalize(name)] = cid
+
+        # fuzzy/alias matching for star names
+        self.star_names = NameIndex(names, bayer, constellations)
+
+        # binary search keys: magnitudes with unknown ones as -inf (always kept), in row
+        # order (sorted within each constellation) and in global brightness order
+        self._magnitude_key = magnitude_key(compiled.magnitude)
+        self._global_magnitude_key = self._magnitude_key[compiled.by_magnitude]
+
+        # cone / nearest-neighbour searches; the fastest proper motion bounds how far
+        # a star's place of date can drift from where the J2000 index has it
+        self.spatial = SpatialIndex(compiled.ra, compiled.dec)
+        proper_motion = np.hypot(compiled.pm_ra, compiled.pm_dec)
+        self._max_proper_motion = float(proper_motion.max()) if len(proper_motion) else 0.0
+
+    def __len__(self):
+        return len(self.compiled)
+
+    # columns of the catalog this store was built from
+    @property
+    def names(self):
+        return self.compiled.names
+
+    @property
+    def bayer(self):
+        return self.compiled.bayer
+
+    @property
+    def constellations(self):
+        return self.compiled.constellations
+
+    @property
+    def ra(self):
+        return self.compiled.ra
+
+    @property
+    def dec(self):
+        return self.compiled.dec
+
+    @property
+    def magnitude(self):
+        return self.compiled.magnitude
+
+    def apparent(self, when):
+        """RA/Dec (radians) of every row at the epoch of `when` (datetime or unix seconds), cached per day."""
+        return apparent_places.get(self.compiled, when)
+
+    def apparent_rows(self, rows, when):
+        """RA/Dec (radians) of some rows at the epoch of `when`; doesn't build the whole day's table."""
+        return apparent_places.get_rows(self.compiled, when, rows)
+
+    def _index_margin(self, when):
+        # degrees between a star's apparent place and its J2000 place once precession and nutation are undone
+        years = abs(float(julian_centuries(when.timestamp() if hasattr(when, 'timestamp') else when))) * 100
+        return np.degrees(ABERRATION) + (self._max_proper_motion * years + 1.0) / 3600
+
+    def _separations(self, rows, ra, dec, when):
+        apparent_ra, apparent_dec = self.apparent_rows(rows, when)
+        cosines = unit_vectors(apparent_ra, apparent_dec) @ unit_vectors([ra], [dec])[0]
+        return np.degrees(np.arccos(np.clip(cosines, -1.0, 1.0)))
+
+    def cone(self, ra, dec, radius, when):
+        """
+        Rows within `radius` degrees of an apparent RA/Dec of date (radians) at `when`,
+        and their separations (degrees), nearest first.
+        """
+        mean_ra, mean_dec = mean_place(ra, dec, when)
+        rows, _ = self.spatial.cone(mean_ra, mean_dec, radius + self._index_margin(when))
+        separations = self._separations(rows, ra, dec, when)
+        inside = separations <= radius
+        rows, separations = rows[inside], separations[inside]
+        order = np.argsort(separations, kind='stable')
+        return rows[order], separations[order]
+
+    def nearest(self, ra, dec, k, when, keep=None):
+        """
+        The k rows nearest an apparent RA/Dec of date (radians) at `when`, and their
+        separations (degrees), nearest first. `keep` optionally masks the rows allowed.
+        """
+        mean_ra, mean_dec = mean_place(ra, dec, when)
+        rows, separations = self.spatial.nearest(mean_ra, mean_dec, k, keep)
+        if not len(rows):
+            return rows, separations
+        # ranked by J2000 distance; anything that could be nearer in the apparent places is within the margin
+        rows, separations = self.cone(ra, dec, float(separations[-1]) + 2 * self._index_margin(when), when)
+        if keep is not None:
+            wanted = keep[rows]
+            rows, separations = rows[wanted], separations[wanted]
+        return rows[:k], separations[:k]
+
+    @property
+    def spectral_types(self):
+        return self.compiled.spectral_types
+
+    def magnitude_of(self, row):
+        """Visual magnitude of a row, or None if unknown."""
+        magnitude = float(self.magnitude[row])
+        return None if np.isnan(magnitude) else round(magnitude, 2)
+
+    def display_name(self, row):
+        name = self.names[row]
+        return self.bayer[row] if name == 'None' else name
+
+    # constellation(Name)
+
+    def constellation_id(self, name, fuzzy=True):
+        """Id of a constellation by exact, case/accent-insensitive or (if fuzzy) closely misspelled name."""
+        if name is None:
+            return None
+        cid = self._constellation_ids.get(name)
+        if cid is None:
+            key = normalize(name)
+            cid = self._constellation_ids.get(key)
+            if cid is None and fuzzy and len(key) > 3:
+                distances = [(bounded_edit_distance(key, normalize(candidate), 2), i)
+                             for i, candidate in enumerate(self.constellation_names)]
+                distance, i = min(distances)
+                if distance <= 2:
+                    cid = i
+        return cid
+
+    def constellation(self, name):
+        """Canonical constellation name, or None if there is no such constellation."""
+        cid = self.constellation_id(name)
+        return None if cid is None else self.constellation_names[cid]
+
+    @tracing.traced('catalog.lookup')
+    def constellation_range(self, name, limiting_magnitude=None):
+        """
+        Rows of a constellation's member stars as a (start, stop) slice, or None.
+        With a limiting magnitude the slice only covers the members at least that bright
+        (plus those of unknown magnitude).
+        """
+        cid = self.constellation_id(name)
+        if cid is None:
+            return None
+        slices = self.compiled.constellation_slices
+        start, stop = int(slices[cid]), int(slices[cid + 1])
+        if limiting_magnitude is not None:
+            stop = start + int(np.searchsorted(self._magnitude_key[start:stop], limiting_magnitude, side='right'))
+        return start, stop
+
+    def brighter_than(self, limiting_magnitude=None):
+        """Rows of every star at least as bright as the limit (unknown magnitudes included), brightest first."""
+        order = self.compiled.by_magnitude
+        if limiting_magnitude is None:
+            return order
+        return order[:int(np.searchsorted(self._global_magnitude_key, limiting_magnitude, side='right'))]
+
+    # star(Name, Bayer, Constellation, RA, Dec)
+
+    @tracing.traced('catalog.lookup')
+    def star_row(self, name):
+        """Row of a star by name, alias or designation (fuzzy-matched), or None."""
+        return self.star_names.resolve(name)
+
+    resolve_star = star_row
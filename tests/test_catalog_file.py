@@ -0,0 +1,114 @@
+import math
+import struct
+import numpy as np
+import pytest
+from catalog_file import (CompiledCatalog, compile_catalog, open_catalog, read_facts, source_hash,
+                          format_ra, format_dec, HEADER)
+
+STARS = """\
++ star('Vega', '3Alp Lyr', 'Lyra', '18 36 56.3', '+38 47 01.0', '0.03', 'A0Va', '+0.201', '+0.287')
++ star('Sheliak', '10Bet Lyr', 'Lyra', '18 50 04.8', '+33 21 46.0', '3.45', 'B7Vpe')
++ star('None', '12Del2Lyr', 'Lyra', '18 54 30.3', '+36 53 55.0')
++ star('Rigel', '19Bet Ori', 'Orion', '05 14 32.3', '-08 12 06.0', '0.13', 'B8Ia')
++ star('Betelgeuse', '58Alp Ori', 'Orion', '05 55 10.3', '+07 24 25.0', '0.50', 'M2Iab')
++ star('Betelgeuse', '58Alp Ori', 'Orion', '05 55 10.3', '+07 24 25.0', '0.50', 'M2Iab')
++ star('Al Nair\\'s', '1Tst Gru', 'Grus', '22 08 14.0', '-46 57 40.0', '1.7')
+"""
+CONSTELLATIONS = """\
++ constellation('Orion')
++ constellation('Lyra')
++ constellation('Grus')
++ constellation('Empty')
+"""
+
+
+@pytest.fixture
+def sources(tmp_path):
+    stars, constellations = tmp_path / 'stars.dlpy', tmp_path / 'constellations.dlpy'
+    stars.write_text(STARS, encoding='utf-8')
+    constellations.write_text(CONSTELLATIONS, encoding='utf-8')
+    return str(stars), str(constellations), str(tmp_path / 'catalog.bin')
+
+
+def members(compiled, name):
+    cid = list(compiled.constellation_names).index(name)
+    start, stop = compiled.constellation_slices[cid:cid + 2]
+    return range(int(start), int(stop))
+
+
+def test_read_facts_pads_optional_arguments(sources):
+    stars, constellations = read_facts(sources[0], sources[1])
+    assert constellations == ['Orion', 'Lyra', 'Grus', 'Empty']
+    assert all(len(row) == 9 for row in stars)
+    assert stars[2] == ('None', '12Del2Lyr', 'Lyra', '18 54 30.3', '+36 53 55.0', '', '', '', '')
+    assert stars[-1][0] == "Al Nair's"
+
+
+def test_round_trip(sources):
+    compiled = CompiledCatalog(compile_catalog(*sources))
+
+    # the duplicate Betelgeuse fact collapses to one row
+    assert len(compiled) == 6
+    assert compiled.source_hash == source_hash(sources[:2])
+    assert list(compiled.constellation_names) == ['Orion', 'Lyra', 'Grus', 'Empty']
+    assert len(members(compiled, 'Empty')) == 0
+
+    # members are contiguous, unknown magnitude first, then brightest first
+    lyra = members(compiled, 'Lyra')
+    assert [compiled.names[row] for row in lyra] == ['None', 'Vega', 'Sheliak']
+    assert math.isnan(compiled.magnitude[lyra[0]])
+    assert all(compiled.constellations[row] == 'Lyra' for row in lyra)
+    assert [compiled.names[row] for row in members(compiled, 'Orion')] == ['Rigel', 'Betelgeuse']
+
+    vega = lyra[1]
+    assert compiled.bayer[vega] == '3Alp Lyr'
+    assert compiled.spectral_types[vega] == 'A0Va'
+    assert compiled.magnitude[vega] == pytest.approx(0.03)
+    assert compiled.pm_ra[vega] == pytest.approx(0.201)
+    assert compiled.pm_dec[vega] == pytest.approx(0.287)
+    assert format_ra(compiled.ra[vega]) == '18 36 56.3'
+    assert format_dec(compiled.dec[vega]) == '+38 47 01.0'
+    assert format_dec(compiled.dec[members(compiled, 'Orion')[0]]) == '-08 12 06.0'
+
+    # unknown spectral type and proper motion read back as '' and 0
+    assert compiled.spectral_types[lyra[0]] == ''
+    assert compiled.pm_ra[lyra[0]] == 0.0
+    assert "Al Nair's" in list(compiled.names)
+
+
+def test_by_magnitude_is_global_brightness_order(sources):
+    compiled = CompiledCatalog(compile_catalog(*sources))
+    order = np.asarray(compiled.by_magnitude)
+    assert sorted(order.tolist()) == list(range(len(compiled)))
+    magnitudes = np.asarray(compiled.magnitude)[order]
+    assert np.isnan(magnitudes[0])
+    assert np.all(np.diff(magnitudes[1:]) >= 0)
+
+
+def test_sections_are_aligned(sources):
+    path = compile_catalog(*sources)
+    with open(path, 'rb') as f:
+        fields = HEADER.unpack(f.read(HEADER.size))
+    assert all(offset % 8 == 0 for offset in fields[6:-1])
+
+
+def test_open_catalog_rebuilds_when_sources_change(sources):
+    star_path, constellation_path, path = sources
+    first = open_catalog(path, star_path, constellation_path)
+    assert len(first) == 6
+
+    with open(star_path, 'a', encoding='utf-8') as f:
+        f.write("+ star('Deneb', '50Alp Cyg', 'Cygnus', '20 41 25.9', '+45 16 49.0', '1.25')\n")
+    second = open_catalog(path, star_path, constellation_path)
+    assert len(second) == 7
+    assert second.source_hash != first.source_hash
+    assert 'Cygnus' in list(second.constellation_names)
+
+
+def test_open_catalog_rebuilds_a_corrupt_file(sources):
+    star_path, constellation_path, path = sources
+    with open(path, 'wb') as f:
+        f.write(b'not a catalog at all')
+    with pytest.raises((ValueError, struct.error)):
+        CompiledCatalog(path)
+    assert len(open_catalog(path, star_path, constellation_path)) == 6
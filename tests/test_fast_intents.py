@@ -0,0 +1,71 @@
+import pytest
+import fast_intents
+from fast_intents import FLAGS, parse_intents
+
+# uses the catalog shipped with the repo (star_facts.dlpy / constellation_facts.dlpy)
+
+
+def flags(intent):
+    return {flag for flag in FLAGS if intent[flag]}
+
+
+@pytest.mark.parametrize('question, kind, name, expected', [
+    ("Is Vega visible?", 'Star', 'vega', {'ASKSTAVIS'}),
+    ("Where is Betelgeuse?", 'Star', 'betelgeuse', {'ASKSTAVIS', 'ASKSTAPAR'}),
+    ("What constellation is Rigel in?", 'Star', 'rigel', {'ASKSTAPAR'}),
+    ("When does Vega rise?", 'Star', 'vega', {'ASKSTATIM'}),
+    ("Is Orion visible tonight?", 'Constellation', 'orion', {'ASKCONVIS'}),
+    ("What stars are in Lyra?", 'Constellation', 'lyra', {'ASKCONCHI'}),
+    ("What stars make up Orion?", 'Constellation', 'orion', {'ASKCONCHI'}),
+    ("Which stars are visible in Orion?", 'Constellation', 'orion', {'ASKCONVIS'}),
+    ("Can I see the stars of Cassiopeia?", 'Constellation', 'cassiopeia', {'ASKCONVIS'}),
+    ("When does Orion rise?", 'Constellation', 'orion', {'ASKCONTIM'}),
+    ("What months is Scorpius best seen?", 'Constellation', 'scorpius', {'ASKCONSEA'}),
+    ("Is Mars up?", 'Planet', 'mars', {'ASKPLAVIS'}),
+    ("What's near the Moon?", 'Planet', 'moon', {'ASKNEAR'}),
+    ("Which star is closest to Sirius?", 'Star', 'sirius', {'ASKNEAR'}),
+])
+def test_single_question_shapes(question, kind, name, expected):
+    data, confidence = parse_intents(question)
+    assert confidence == 1.0
+    [intent] = data['intents']
+    assert intent[kind] == name
+    assert flags(intent) == expected
+    # the same schema llm_to_json returns
+    assert set(intent) == {'Constellation', 'Star', 'Planet'} | set(FLAGS)
+
+
+def test_overhead_needs_no_object():
+    data, confidence = parse_intents("What's overhead right now?")
+    assert confidence == 1.0
+    [intent] = data['intents']
+    assert flags(intent) == {'ASKCONE'} and intent['Altitude'] == 90
+
+
+def test_several_questions_in_order():
+    data, confidence = parse_intents("Thanks! Is Vega visible and what stars are in Lyra?")
+    assert confidence == 1.0
+    assert [(i['Star'] or i['Constellation'], flags(i)) for i in data['intents']] == [
+        ('vega', {'ASKSTAVIS'}), ('lyra', {'ASKCONCHI'})]
+
+
+@pytest.mark.parametrize('question', [
+    "Is Uranus visible?",                 # not in the ephemeris
+    "Where are the planets tonight?",     # the LLM expands "the planets"
+    "What is the meaning of life?",       # no object, no shape
+])
+def test_falls_back_to_the_llm(question):
+    assert fast_intents.fast_intents(question) is None
+
+
+def test_partly_understood_message_falls_back():
+    _, confidence = parse_intents("Is Vega visible? Also, tell me a story about dragons")
+    assert 0 < confidence < 1
+
+
+def test_stats_count_hits_and_fallbacks():
+    stats = fast_intents.FastPathStats()
+    stats.record(True)
+    stats.record(True)
+    stats.record(False)
+    assert stats.report() == {'fast_path': 2, 'llm_fallback': 1, 'fast_path_fraction': 2 / 3}
@@ -0,0 +1,110 @@
+from datetime import datetime, timezone
+import pytest
+import query_cache
+from query_cache import QueryCache
+from user_info import UserInfo
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, 'monotonic', clock)
+    return clock
+
+
+def observer(latitude=51.5, longitude=-0.1, seconds=0, limiting_magnitude=None):
+    time = datetime(2026, 10, 18, 22, 0, tzinfo=timezone.utc).timestamp() + seconds
+    return UserInfo(longitude=longitude, latitude=latitude, time=datetime.fromtimestamp(time, timezone.utc),
+                    limiting_magnitude=limiting_magnitude)
+
+
+def test_key_normalizes_the_name():
+    cache = QueryCache()
+    assert cache.key('ASKCONCHI', 'Orion') == cache.key('ASKCONCHI', '  orion ')
+    assert cache.key('ASKCONCHI', 'Orion') != cache.key('ASKCONVIS', 'Orion')
+
+
+def test_key_quantizes_location_and_time():
+    cache = QueryCache(location_precision=0.01, time_bucket=60)
+    base = cache.key('ASKSTAVIS', 'vega', observer())
+    assert cache.key('ASKSTAVIS', 'vega', observer(latitude=51.501, seconds=30)) == base
+    assert cache.key('ASKSTAVIS', 'vega', observer(latitude=51.52)) != base
+    assert cache.key('ASKSTAVIS', 'vega', observer(seconds=90)) != base
+    assert cache.key('ASKSTAVIS', 'vega', observer(limiting_magnitude=4.6)) != base
+
+
+def test_key_includes_the_generation():
+    generation = [1]
+    cache = QueryCache(generation=lambda: generation[0])
+    before = cache.key('ASKSTAPAR', 'vega')
+    generation[0] += 1
+    assert cache.key('ASKSTAPAR', 'vega') != before
+
+
+def test_time_dependent_entries_expire(clock):
+    cache = QueryCache(ttl=300)
+    cache.put('key', 'value')
+    clock.now += 299
+    assert cache.get('key') == (True, 'value')
+    clock.now += 2
+    assert cache.get('key') == (False, None)
+    assert cache.stats()['size'] == 0
+
+
+def test_static_entries_never_expire(clock):
+    cache = QueryCache(ttl=300)
+    cache.put('key', 'value', expires=False)
+    clock.now += 10 ** 6
+    assert cache.get('key') == (True, 'value')
+
+
+def test_least_recently_used_is_evicted():
+    cache = QueryCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.get('c') == (True, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_cached_decorator(clock):
+    cache = QueryCache(ttl=300)
+    calls = []
+
+    @cache.cached('ASKCONCHI')
+    def members(name):
+        calls.append(name)
+        return [name]
+
+    @cache.cached('ASKCONVIS', with_observer=True)
+    def visible(name, who):
+        calls.append((name, who.latitude))
+        return True
+
+    assert members('Orion') == ['Orion']
+    assert members('orion') == ['Orion']  # same normalized key
+    assert calls == ['Orion']
+
+    visible('Orion', observer())
+    visible('Orion', observer(seconds=10))
+    assert len(calls) == 2
+    clock.now += 301
+    visible('Orion', observer(seconds=10))
+    assert len(calls) == 3
+    # the static entry outlives the TTL
+    members('Orion')
+    assert len(calls) == 3
+    # anything but (name, [observer]) bypasses the cache
+    members(None)
+    assert calls[-1] is None
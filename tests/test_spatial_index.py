@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from spatial_index import SpatialIndex, unit_vectors
+
+
+def random_sky(n, seed):
+    rng = np.random.default_rng(seed)
+    ra = rng.uniform(0, 2 * np.pi, n)
+    dec = np.arcsin(rng.uniform(-1, 1, n))  # uniform over the sphere
+    return ra, dec
+
+
+def separations(ra, dec, center_ra, center_dec):
+    cosines = unit_vectors(ra, dec) @ unit_vectors([center_ra], [center_dec])[0]
+    return np.degrees(np.arccos(np.clip(cosines, -1.0, 1.0)))
+
+
+@pytest.fixture(scope='module')
+def sky():
+    ra, dec = random_sky(20_000, seed=1)
+    return ra, dec, SpatialIndex(ra, dec)
+
+
+def centers(count, seed):
+    ra, dec = random_sky(count, seed)
+    # the awkward places too: the poles and both sides of RA 0
+    return list(zip(ra, dec)) + [(0.0, np.pi / 2), (1.0, -np.pi / 2), (0.001, 0.2), (2 * np.pi - 0.001, -0.3)]
+
+
+def test_every_row_is_indexed_once(sky):
+    ra, _, index = sky
+    assert len(index) == len(ra)
+    assert sorted(index.rows.tolist()) == list(range(len(ra)))
+
+
+@pytest.mark.parametrize('radius', [0.5, 5.0, 30.0, 95.0, 180.0])
+def test_cone_matches_brute_force(sky, radius):
+    ra, dec, index = sky
+    for center_ra, center_dec in centers(50, seed=int(radius * 10)):
+        rows, found = index.cone(center_ra, center_dec, radius)
+        expected = separations(ra, dec, center_ra, center_dec)
+        assert sorted(rows.tolist()) == np.flatnonzero(expected <= radius).tolist()
+        np.testing.assert_allclose(found, expected[rows], atol=1e-9)
+
+
+@pytest.mark.parametrize('k', [1, 5, 50])
+def test_nearest_matches_brute_force(sky, k):
+    ra, dec, index = sky
+    for center_ra, center_dec in centers(50, seed=k):
+        rows, found = index.nearest(center_ra, center_dec, k)
+        expected = separations(ra, dec, center_ra, center_dec)
+        assert len(rows) == k
+        np.testing.assert_allclose(found, np.sort(expected)[:k], atol=1e-9)
+        np.testing.assert_allclose(expected[rows], found, atol=1e-9)
+        assert np.all(np.diff(found) >= 0)
+
+
+def test_nearest_skips_rows_outside_keep(sky):
+    ra, dec, index = sky
+    keep = np.zeros(len(ra), dtype=bool)
+    keep[::97] = True
+    rows, found = index.nearest(1.0, 0.5, 10, keep=keep)
+    expected = separations(ra, dec, 1.0, 0.5)
+    assert keep[rows].all()
+    np.testing.assert_allclose(found, np.sort(expected[keep])[:10], atol=1e-9)
+
+
+def test_nearest_with_fewer_rows_than_asked():
+    ra, dec = random_sky(3, seed=2)
+    rows, found = SpatialIndex(ra, dec).nearest(0.0, 0.0, 10)
+    assert sorted(rows.tolist()) == [0, 1, 2]
+    assert np.all(np.diff(found) >= 0)
+    empty, _ = SpatialIndex(ra, dec).nearest(0.0, 0.0, 5, keep=np.zeros(3, dtype=bool))
+    assert len(empty) == 0
@@ -0,0 +1,57 @@
+from datetime import datetime, timezone, timedelta
+import pytest
+from user_info import UserInfo
+from query_service import BadRequest, _observer
+
+
+def test_round_trip():
+    observer = UserInfo(longitude=-120.66, latitude=35.28,
+                        time=datetime(2026, 10, 18, 22, 0, tzinfo=timezone.utc), limiting_magnitude=5.6)
+    again = UserInfo.from_dict(observer.to_dict())
+    assert (again.longitude, again.latitude, again.time, again.limiting_magnitude) == (
+        observer.longitude, observer.latitude, observer.time, observer.limiting_magnitude)
+
+
+def test_defaults():
+    observer = UserInfo.from_dict({})
+    assert (observer.longitude, observer.latitude, observer.limiting_magnitude) == (0.0, 0.0, None)
+    assert observer.time.tzinfo is not None
+
+
+def test_naive_time_is_utc():
+    observer = UserInfo.from_dict({'time': '2026-10-18T22:00:00'})
+    assert observer.time == datetime(2026, 10, 18, 22, 0, tzinfo=timezone.utc)
+
+
+def test_offset_is_kept():
+    observer = UserInfo.from_dict({'time': '2026-10-18T15:00:00-07:00'})
+    assert observer.time.utcoffset() == timedelta(hours=-7)
+    assert observer.time == datetime(2026, 10, 18, 22, 0, tzinfo=timezone.utc)
+
+
+def test_numbers_may_come_as_strings():
+    observer = UserInfo.from_dict({'longitude': '-0.1', 'latitude': '51.5', 'limiting_magnitude': '5.5'})
+    assert (observer.longitude, observer.latitude, observer.limiting_magnitude) == (-0.1, 51.5, 5.5)
+
+
+@pytest.mark.parametrize('data', [
+    {'time': 'tomorrow evening'},
+    {'time': 1760824800},
+    {'latitude': 'north'},
+    {'longitude': None},
+    {'limiting_magnitude': 'dark'},
+    {'limiting_magnitude': [5]},
+])
+def test_bad_input_raises(data):
+    with pytest.raises((TypeError, ValueError)):
+        UserInfo.from_dict(data)
+
+
+@pytest.mark.parametrize('body', [
+    {'observer': {'time': 'not a time'}},
+    {'observer': {'limiting_magnitude': 'dark'}},
+    {'observer': ['not', 'an', 'object']},
+])
+def test_service_turns_bad_observers_into_400s(body):
+    with pytest.raises(BadRequest):
+        _observer(body)
@@ -0,0 +1,263 @@
+"""
+Lightweight tracing for the chat pipeline.
+
+A chat turn is one Trace (`with tracing.turn() as trace:`). Code inside it marks
+stages with `with tracing.span('name'):` or `@tracing.traced('name')`. Spans nest,
+and they follow the turn into query-pool threads and the LLM client's event loop
+through contextvars. Token usage from the API responses is added with
+`record_usage`. Outside a turn, span() and record_usage() do nothing beyond a
+contextvar lookup, so library code can be instrumented freely.
+
+When a turn ends it goes to the sinks chosen by STARGAZER_TRACE_SINK:
+
+    jsonl        one JSON line per turn in STARGAZER_TRACE_FILE (.cache/traces.jsonl),
+                 rotated to traces.jsonl.1 at STARGAZER_TRACE_MAX_BYTES (10 MB)
+    prometheus   running totals in Prometheus text format in STARGAZER_METRICS_FILE
+                 (.cache/metrics.prom), for a node_exporter textfile collector or similar
+    both / off
+
+Span names in use:
+
+    intents, intents.fast, intents.cache   turning the message into intents
+    llm.rate_limit_wait, llm.network, llm.backoff   one LLM API call
+    service.request, service.deserialize   the query service round trip (app side)
+    query, catalog.load, catalog.lookup, trig   answering one intent (service side)
+    compact, answer, answer.first_token    prompt compaction and the streamed reply
+    chart, chart.render, chart.encode      the sky chart shown with the reply
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SINKS = os.getenv("STARGAZER_TRACE_SINK", "jsonl").lower()
+TRACE_FILE = os.getenv("STARGAZER_TRACE_FILE", os.path.join(BASE_DIR, ".cache", "traces.jsonl"))
+METRICS_FILE = os.getenv("STARGAZER_METRICS_FILE", os.path.join(BASE_DIR, ".cache", "metrics.prom"))
+# the trace file is rotated to <file>.1 once it would grow past this (0: never)
+TRACE_MAX_BYTES = int(os.getenv("STARGAZER_TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+# histogram buckets (seconds) for the Prometheus sink
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_trace = contextvars.ContextVar('stargazer_trace', default=None)
+_parent = contextvars.ContextVar('stargazer_span', default=None)
+
+
+class Trace:
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.seconds = None
+        self.error = None
+        self.spans = []  # {'name', 'parent', 'start', 'seconds', 'thread', **attrs}; start is relative to the turn
+        self.usage = {}  # stage -> {'prompt_tokens', 'completion_tokens', 'total_tokens'}
+        self._lock = threading.Lock()
+
+    def add_span(self, name, start, seconds, parent=None, **attrs):
+        span = dict(attrs, name=name, parent=parent, start=round(start - self._start, 6),
+                    seconds=round(seconds, 6), thread=threading.current_thread().name)
+        with self._lock:
+            self.spans.append(span)
+
+    def add_usage(self, stage, usage):
+        counts = {}
+        for field in ('prompt_tokens', 'completion_tokens', 'total_tokens'):
+            value = usage.get(field) if isinstance(usage, dict) else getattr(usage, field, None)
+            counts[field] = int(value or 0)
+        with self._lock:
+            totals = self.usage.setdefault(stage, dict.fromkeys(counts, 0))
+            for field, value in counts.items():
+                totals[field] += value
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def merge(self, spans, parent=None, offset=0.0):
+        """Add spans recorded elsewhere (e.g. by the query service); top-level ones go under `parent`."""
+        with self._lock:
+            for span in spans:
+                span = dict(span, start=round(span.get('start', 0.0) + offset, 6))
+                if span.get('parent') is None:
+                    span['parent'] = parent
+                self.spans.append(span)
+
+    def breakdown(self):
+        """Total seconds and count per span name, in order of first appearance."""
+        totals = {}
+        for span in sorted(self.spans, key=lambda s: s['start']):
+            entry = totals.setdefault(span['name'], {'seconds': 0.0, 'count': 0})
+            entry['seconds'] += span['seconds']
+            entry['count'] += 1
+        return totals
+
+    def to_dict(self):
+        return {'name': self.name, 'started_at': self.started_at, 'seconds': self.seconds,
+                'error': self.error, 'attrs': self.attrs, 'usage': self.usage, 'spans': self.spans}
+
+
+def current():
+    """The Trace of the turn being handled in this context, or None."""
+    return _trace.get()
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time the block as a span of the current turn. Yields the span's attrs, which the block may add to."""
+    trace = _trace.get()
+    if trace is None:
+        yield attrs
+        return
+    parent = _parent.set(name)
+    start = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        seconds = time.perf_counter() - start
+        _parent.reset(parent)
+        trace.add_span(name, start, seconds, _parent.get(), **attrs)
+
+
+def traced(name):
+    """Decorator form of span()."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _trace.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(name, seconds, **attrs):
+    """Add a span that was timed by hand (ending now)."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_span(name, time.perf_counter() - seconds, seconds, _parent.get(), **attrs)
+
+
+def record_usage(stage, usage):
+    """Add the token counts of an API response's `usage` (None for cached/local answers)."""
+    trace = _trace.get()
+    if trace is not None and usage is not None:
+        trace.add_usage(stage, usage)
+
+
+@contextmanager
+def turn(name='chat_turn', export=True, **attrs):
+    """Trace everything in the block as one turn, then hand it to the sinks."""
+    trace = Trace(name, **attrs)
+    token = _trace.set(trace)
+    parent = _parent.set(None)
+    try:
+        yield trace
+    except BaseException as e:
+        trace.error = type(e).__name__
+        raise
+    finally:
+        trace.seconds = round(time.perf_counter() - trace._start, 6)
+        _parent.reset(parent)
+        _trace.reset(token)
+        if export:
+            for sink in _sinks:
+                try:
+                    sink.export(trace)
+                except OSError:
+                    pass  # metrics are best effort; never fail a turn over them
+
+
+class JSONLSink:
+    def __init__(self, path=TRACE_FILE, max_bytes=TRACE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _rotate(self, incoming):
+        # keep one previous file, so the traces never take more than about 2 * max_bytes
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size and size + incoming > self.max_bytes:
+            os.replace(self.path, self.path + '.1')
+
+    def export(self, trace):
+        line = json.dumps(trace.to_dict(), default=str) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if self.max_bytes:
+                self._rotate(len(line.encode('utf-8')))
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+
+class PrometheusSink:
+    """Keeps running totals for this process and rewrites the text-format file after every turn."""
+
+    def __init__(self, path=METRICS_FILE, buckets=BUCKETS):
+        self.path = path
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.turns = {}      # (name, status) -> count
+        self.histograms = {}  # span name -> [bucket counts..., count, sum]
+        self.tokens = {}     # (stage, kind) -> count
+
+    def _observe(self, name, seconds):
+        histogram = self.histograms.setdefault(name, [0] * (len(self.buckets) + 2))
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-2] += 1
+        histogram[-1] += seconds
+
+    def export(self, trace):
+        with self._lock:
+            key = (trace.name, 'error' if trace.error else 'ok')
+            self.turns[key] = self.turns.get(key, 0) + 1
+            self._observe(trace.name, trace.seconds)
+            for s in trace.spans:
+                self._observe(s['name'], s['seconds'])
+            for stage, usage in trace.usage.items():
+                for kind in ('prompt_tokens', 'completion_tokens'):
+                    self.tokens[(stage, kind)] = self.tokens.get((stage, kind), 0) + usage[kind]
+            text = self.render()
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(self.path + '.tmp', self.path)
+
+    def render(self):
+        lines = ["# HELP stargazer_turns_total Chat turns handled.", "# TYPE stargazer_turns_total counter"]
+        for (name, status), count in sorted(self.turns.items()):
+            lines.append(f'stargazer_turns_total{{turn="{name}",status="{status}"}} {count}')
+        lines += ["# HELP stargazer_span_seconds Time spent per pipeline stage.",
+                  "# TYPE stargazer_span_seconds histogram"]
+        for name, histogram in sorted(self.histograms.items()):
+            for bound, count in zip(self.buckets, histogram):
+                lines.append(f'stargazer_span_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+            lines.append(f'stargazer_span_seconds_bucket{{span="{name}",le="+Inf"}} {histogram[-2]}')
+            lines.append(f'stargazer_span_seconds_count{{span="{name}"}} {histogram[-2]}')
+            lines.append(f'stargazer_span_seconds_sum{{span="{name}"}} {histogram[-1]:.6f}')
+        lines += ["# HELP stargazer_llm_tokens_total LLM tokens used.", "# TYPE stargazer_llm_tokens_total counter"]
+        for (stage, kind), count in sorted(self.tokens.items()):
+            lines.append(f'stargazer_llm_tokens_total{{stage="{stage}",kind="{kind.split("_")[0]}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def sinks_from_env(setting=SINKS):
+    chosen = {'both': ('jsonl', 'prometheus'), 'off': (), 'none': ()}.get(setting, (setting,))
+    sinks = []
+    if 'jsonl' in chosen:
+        sinks.append(JSONLSink())
+    if 'prometheus' in chosen:
+        sinks.append(PrometheusSink())
+    return sinks
+
+
+_sinks = sinks_from_env()
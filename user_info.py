@@ -1,14 +1,38 @@
 from datetime import datetime
 import pytz
 
+# naked-eye limiting magnitude for each Bortle dark-sky class (1 = pristine, 9 = inner city)
+BORTLE_LIMITING_MAGNITUDE = {1: 7.6, 2: 7.1, 3: 6.6, 4: 6.1, 5: 5.6, 6: 5.1, 7: 4.6, 8: 4.1, 9: 3.6}
+
 class UserInfo:
-    def __init__(self, longitude=0, latitude=0, time=None):
+    def __init__(self, longitude=0, latitude=0, time=None, limiting_magnitude=None):
         self.longitude = longitude
         self.latitude = latitude
         self.time = time or datetime.now(pytz.UTC)
+        # faintest magnitude the observer can see; None means no cut
+        self.limiting_magnitude = limiting_magnitude
 
-    def set_info(self, user_long, user_lat, user_time):
+    def set_info(self, user_long, user_lat, user_time, limiting_magnitude=None):
         self.longitude = float(user_long)
         self.latitude = float(user_lat)
         if user_time:
-            self.time = datetime.fromisoformat(user_time)
\ No newline at end of file
+            self.time = datetime.fromisoformat(user_time)
+        self.limiting_magnitude = None if limiting_magnitude is None else float(limiting_magnitude)
+
+    def to_dict(self):
+        # JSON-friendly form, for sending the observer to the query service
+        return {'longitude': self.longitude, 'latitude': self.latitude,
+                'time': self.time.isoformat(), 'limiting_magnitude': self.limiting_magnitude}
+
+    @classmethod
+    def from_dict(cls, data):
+        # raises ValueError/TypeError on bad input, which the query service turns into a 400
+        time = data.get('time')
+        if time:
+            time = datetime.fromisoformat(time)
+            if time.tzinfo is None:
+                time = pytz.UTC.localize(time)  # a time without an offset is taken as UTC
+        limiting_magnitude = data.get('limiting_magnitude')
+        return cls(longitude=float(data.get('longitude', 0)), latitude=float(data.get('latitude', 0)),
+                   time=time or None,
+                   limiting_magnitude=None if limiting_magnitude is None else float(limiting_magnitude))
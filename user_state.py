@@ -1,2 +0,0 @@
-from user_info import UserInfo
-user = UserInfo()
\ No newline at end of file
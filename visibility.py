@@ -0,0 +1,188 @@
+import numpy as np
+from datetime import datetime, timezone
+import pytz
+import tracing
+from apparent_place import equation_of_equinoxes
+
+J2000 = datetime(2000, 1, 1, 12, tzinfo=pytz.UTC)
+UNIX_EPOCH_JD = 2440587.5
+SIDEREAL_DAY = 86164.0905  # seconds
+SIDEREAL_RATE = 2 * np.pi / SIDEREAL_DAY  # radians of hour angle per second
+# best_window's time x star grid stays within this many samples and cells, whatever the window;
+# longer windows or bigger groups get a coarser time step
+MAX_GRID_SAMPLES = 1000
+MAX_GRID_CELLS = 2_000_000
+
+def calculate_lst(longitude, time):
+    # Julian date for the given time
+    jd = (time - J2000).total_seconds() / 86400.0 + 2451545.0
+    t = (jd - 2451545.0) / 36525.0
+    gst = 280.46061837 + 360.98564736629 * (jd - 2451545.0) + 0.000387933 * t**2 - t**3 / 38710000.0
+    # apparent sidereal time, to go with apparent (true equinox of date) coordinates
+    gst += equation_of_equinoxes(time.timestamp())
+    gst %= 360
+    lst = (gst + longitude) % 360
+    return lst
+
+def calculate_lst_array(longitude, seconds):
+    # same as calculate_lst, for an array of unix timestamps
+    jd = np.asarray(seconds, dtype=float) / 86400.0 + UNIX_EPOCH_JD
+    t = (jd - 2451545.0) / 36525.0
+    gst = 280.46061837 + 360.98564736629 * (jd - 2451545.0) + 0.000387933 * t**2 - t**3 / 38710000.0
+    gst = gst + equation_of_equinoxes(seconds)
+    return (gst + longitude) % 360
+
+def to_datetime(seconds):
+    return datetime.fromtimestamp(float(seconds), tz=timezone.utc)
+
+def sexagesimal_to_radians(ra_hms, dec_dms):
+    """
+    Convert sequences of 'HH MM SS.s' / '+DD MM SS.s' strings to RA/Dec arrays in radians.
+    Done once per catalog load, not per query.
+    """
+    ra = np.array([s.split() for s in ra_hms], dtype=float).reshape(-1, 3)
+    dec_parts = [s.split() for s in dec_dms]
+    dec = np.array(dec_parts, dtype=float).reshape(-1, 3)
+    # the sign lives on the degrees field, which is '-00' for stars just south of the equator
+    sign = np.array([-1.0 if s[0].startswith('-') else 1.0 for s in dec_parts])
+
+    ra_deg = 15 * (ra[:, 0] + ra[:, 1] / 60 + ra[:, 2] / 3600)
+    dec_deg = sign * (np.abs(dec[:, 0]) + dec[:, 1] / 60 + dec[:, 2] / 3600)
+    return np.radians(ra_deg), np.radians(dec_deg)
+
+def _alt_az_from_lst(ra, dec, lst, latitude):
+    # lst (radians) broadcasts against ra/dec, e.g. lst[:, None] for a time x star grid
+    ha = lst - ra
+    lat = np.radians(latitude)
+
+    sin_dec, cos_dec = np.sin(dec), np.cos(dec)
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+    cos_ha = np.cos(ha)
+
+    sin_alt = np.clip(sin_dec * sin_lat + cos_dec * cos_lat * cos_ha, -1.0, 1.0)
+    alt = np.degrees(np.arcsin(sin_alt))
+
+    # same azimuth as the scalar formula, with cos(alt) cancelled out of the atan2
+    az = np.degrees(np.arctan2(-cos_dec * np.sin(ha), sin_dec * cos_lat - cos_dec * sin_lat * cos_ha))
+    az %= 360
+
+    return alt, az
+
+def alt_az(ra, dec, longitude, latitude, time):
+    """
+    Altitude and azimuth (degrees) for arrays of RA/Dec in radians, in one vectorized pass.
+    LST is computed once per call.
+    """
+    ra = np.asarray(ra, dtype=float)
+    dec = np.asarray(dec, dtype=float)
+    lst = np.radians(calculate_lst(longitude, time))
+    return _alt_az_from_lst(ra, dec, lst, latitude)
+
+def radec_from_alt_az(alt, az, longitude, latitude, time):
+    """Apparent RA/Dec (radians) of the point at altitude/azimuth (degrees) for an observer: the inverse of alt_az."""
+    alt, az, lat = np.radians(alt), np.radians(az), np.radians(latitude)
+    sin_dec = np.sin(alt) * np.sin(lat) + np.cos(alt) * np.cos(lat) * np.cos(az)
+    ha = np.arctan2(-np.sin(az) * np.cos(alt), np.sin(alt) * np.cos(lat) - np.cos(alt) * np.sin(lat) * np.cos(az))
+    ra = (np.radians(calculate_lst(longitude, time)) - ha) % (2 * np.pi)
+    return ra, np.arcsin(np.clip(sin_dec, -1.0, 1.0))
+
+def alt_az_grid(ra, dec, longitude, latitude, seconds):
+    """Altitude and azimuth for every (time, star) pair: arrays of shape (len(seconds), len(ra))."""
+    ra = np.asarray(ra, dtype=float)
+    dec = np.asarray(dec, dtype=float)
+    lst = np.radians(calculate_lst_array(longitude, seconds))
+    return _alt_az_from_lst(ra[None, :], dec[None, :], lst[:, None], latitude)
+
+def alt_az_observers(ra, dec, longitudes, latitudes, seconds):
+    """
+    Altitude and azimuth for every (observer, star) pair: arrays of shape (len(longitudes), len(ra)).
+    Observers are parallel arrays of longitude, latitude (degrees) and unix time.
+    """
+    ra = np.asarray(ra, dtype=float)
+    dec = np.asarray(dec, dtype=float)
+    lst = np.radians(calculate_lst_array(np.asarray(longitudes, dtype=float), seconds))
+    latitudes = np.asarray(latitudes, dtype=float)
+    return _alt_az_from_lst(ra[None, :], dec[None, :], lst[:, None], latitudes[:, None])
+
+@tracing.traced('trig')
+def visible_mask(ra, dec, longitude, latitude, time, min_altitude=0.0):
+    alt, az = alt_az(ra, dec, longitude, latitude, time)
+    return alt > min_altitude, alt, az
+
+@tracing.traced('trig')
+def rise_transit_set(ra, dec, longitude, latitude, start, altitude=0.0):
+    """
+    Next rise, transit and set after `start` (unix seconds) for every star, solved
+    analytically from the hour angle at which the star crosses `altitude` degrees.
+    Rise/set are NaN for circumpolar stars and for stars that never rise.
+    """
+    ra = np.asarray(ra, dtype=float)
+    dec = np.asarray(dec, dtype=float)
+    lat = np.radians(latitude)
+
+    # transit: the hour angle reaches zero
+    lst = np.radians(calculate_lst(longitude, to_datetime(start)))
+    transit = start + ((ra - lst) % (2 * np.pi)) / SIDEREAL_RATE
+
+    # hour angle of the altitude crossing: cos(H0) = (sin h0 - sin(lat) sin(dec)) / (cos(lat) cos(dec))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_h0 = (np.sin(np.radians(altitude)) - np.sin(lat) * np.sin(dec)) / (np.cos(lat) * np.cos(dec))
+    circumpolar = cos_h0 < -1
+    never_rises = cos_h0 > 1
+    h0 = np.arccos(np.clip(cos_h0, -1.0, 1.0)) / SIDEREAL_RATE
+
+    # next occurrence of each crossing at or after start
+    rise = start + (transit - h0 - start) % SIDEREAL_DAY
+    set_ = start + (transit + h0 - start) % SIDEREAL_DAY
+    rise[circumpolar | never_rises] = np.nan
+    set_[circumpolar | never_rises] = np.nan
+
+    transit_altitude = 90 - np.degrees(np.abs(lat - dec))
+    return {
+        'rise': rise,
+        'transit': transit,
+        'set': set_,
+        'transit_altitude': transit_altitude,
+        'circumpolar': circumpolar,
+        'never_rises': never_rises,
+    }
+
+@tracing.traced('trig')
+def best_window(ra, dec, longitude, latitude, start, end, altitude=0.0, step=600.0, keep=0.9, times_ok=None):
+    """
+    Time grid search for the best time to look at a group of stars between start and end
+    (unix seconds). All time x star altitudes come from one broadcast computation.
+
+    Returns the grid time at which the most stars are above `altitude` (ties broken by
+    mean altitude) and the contiguous window around it where at least `keep` of that
+    peak count stays up. `times_ok(seconds)`, if given, masks the grid times that may
+    be used at all (e.g. only when the sky is dark). The step is widened as needed to
+    keep the grid within MAX_GRID_SAMPLES times and MAX_GRID_CELLS altitudes.
+    """
+    samples = max(2, min(MAX_GRID_SAMPLES, MAX_GRID_CELLS // max(1, len(ra))))
+    step = max(step, (end - start) / (samples - 1))
+    seconds = np.arange(start, end + step / 2, step)
+    alt, _ = alt_az_grid(ra, dec, longitude, latitude, seconds)
+
+    above = (alt > altitude).sum(axis=1)
+    if times_ok is not None:
+        above = np.where(times_ok(seconds), above, 0)
+    score = above * 1000.0 + alt.mean(axis=1)  # count first, mean altitude as tie-break
+    peak = int(np.argmax(score))
+    if above[peak] == 0:
+        return None
+
+    good = above >= max(1, keep * above[peak])
+    first = last = peak
+    while first > 0 and good[first - 1]:
+        first -= 1
+    while last < len(seconds) - 1 and good[last + 1]:
+        last += 1
+
+    return {
+        'best_time': seconds[peak],
+        'stars_up_at_best': int(above[peak]),
+        'mean_altitude_at_best': float(alt[peak].mean()),
+        'window_start': seconds[first],
+        'window_end': seconds[last],
+    }